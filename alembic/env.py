@@ -2,8 +2,7 @@
 
 import asyncio
 from logging.config import fileConfig
-from sqlalchemy.ext.asyncio import create_async_engine, AsyncEngine
-from sqlalchemy import pool
+from sqlalchemy.ext.asyncio import AsyncEngine
 from alembic import context
 
 import os
@@ -13,7 +12,7 @@ import sys
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
 
 #  Import settings and models
-from fastapi_auth_service.app.database import Base
+from fastapi_auth_service.app.database import Base, build_async_engine
 from fastapi_auth_service.app import models  # needed for Alembic
 from fastapi_auth_service.app.core.settings import settings  # variable source
 
@@ -32,12 +31,10 @@ DATABASE_URL = settings.db_url
 
 def get_async_engine() -> AsyncEngine:
     """
-    Creates an asynchronous SQLAlchemy engine for migrations.
+    Creates an asynchronous SQLAlchemy engine for migrations
+    (the app's engine profile, without a pool).
     """
-    return create_async_engine(
-        DATABASE_URL,
-        poolclass=pool.NullPool
-    )
+    return build_async_engine(settings, null_pool=True)
 
 def run_migrations_offline() -> None:
     """
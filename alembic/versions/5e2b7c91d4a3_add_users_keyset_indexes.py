@@ -0,0 +1,30 @@
+"""add users keyset indexes
+
+Revision ID: 5e2b7c91d4a3
+Revises: cba0f28fc244
+Create Date: 2026-10-17 09:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '5e2b7c91d4a3'
+down_revision: Union[str, None] = 'cba0f28fc244'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_index('ix_users_balance_id', 'users', ['balance', 'id'], unique=False)
+    op.create_index('ix_users_last_activity_at_id', 'users', ['last_activity_at', 'id'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_users_last_activity_at_id', table_name='users')
+    op.drop_index('ix_users_balance_id', table_name='users')
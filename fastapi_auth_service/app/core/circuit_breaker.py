@@ -0,0 +1,80 @@
+"""
+Circuit breaker for calls to an external dependency.
+
+closed    - calls go through; `failure_threshold` failures in a row open it
+open      - calls are rejected immediately for `reset_timeout` seconds
+half_open - one trial call is let through: success closes the breaker,
+            failure opens it again
+"""
+
+import logging
+import time
+
+from fastapi_auth_service.app.core.metrics import metrics
+
+
+logger = logging.getLogger(__name__)
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitBreaker:
+    """
+    :param name: Metrics prefix ("<name>.circuit_*")
+    :param failure_threshold: Consecutive failures that open the breaker
+    :param reset_timeout: Seconds to wait before a trial call
+    """
+
+    def __init__(self, name: str, failure_threshold: int, reset_timeout: float) -> None:
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self.trial_started_at = None
+
+        self.opened_counter = metrics.counter(f"{name}.circuit_opened")
+        self.rejected_counter = metrics.counter(f"{name}.circuit_rejected")
+        metrics.gauge(f"{name}.circuit_open", lambda: 0 if self.state == CLOSED else 1)
+
+    @property
+    def is_closed(self) -> bool:
+        return self.state == CLOSED
+
+    def allow(self) -> bool:
+        """Whether a call may be made now."""
+        if self.state == CLOSED:
+            return True
+
+        now = time.monotonic()
+        if self.state == OPEN and now - self.opened_at >= self.reset_timeout:
+            self.state = HALF_OPEN
+            self.trial_started_at = None
+
+        if self.state == HALF_OPEN:
+            # A trial that never reported back (e.g. cancelled) does not block forever
+            if self.trial_started_at is None or now - self.trial_started_at >= self.reset_timeout:
+                self.trial_started_at = now
+                return True
+
+        self.rejected_counter.inc()
+        return False
+
+    def record_success(self) -> None:
+        if self.state != CLOSED:
+            logger.info(f"Circuit '{self.name}' closed")
+        self.state = CLOSED
+        self.failures = 0
+        self.trial_started_at = None
+
+    def record_failure(self) -> None:
+        self.failures += 1
+        if self.state == HALF_OPEN or (self.state == CLOSED and self.failures >= self.failure_threshold):
+            self.state = OPEN
+            self.opened_at = time.monotonic()
+            self.trial_started_at = None
+            self.opened_counter.inc()
+            logger.warning(f"Circuit '{self.name}' opened after {self.failures} failures")
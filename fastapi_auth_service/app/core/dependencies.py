@@ -1,10 +1,12 @@
 from fastapi import Depends, HTTPException, status
-from fastapi_auth_service.app.models.user import User
-from fastapi_auth_service.app.utils.security import get_current_user
+from fastapi_auth_service.app.utils.security import get_token_principal, TokenPrincipal
+
+# Role checks use the claims of the verified token plus the epoch check,
+# so they never hit Postgres.
 
 
 # Проверка: пользователь - admin
-async def is_admin(current_user: User = Depends(get_current_user)) -> User:
+async def is_admin(current_user: TokenPrincipal = Depends(get_token_principal)) -> TokenPrincipal:
     if current_user.role != "admin":
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -13,7 +15,7 @@ async def is_admin(current_user: User = Depends(get_current_user)) -> User:
     return current_user
 
 # Проверка: пользователь - обычный user
-async def is_user(current_user: User = Depends(get_current_user)) -> User:
+async def is_user(current_user: TokenPrincipal = Depends(get_token_principal)) -> TokenPrincipal:
     if current_user.role != "user":
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
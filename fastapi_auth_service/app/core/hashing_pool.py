@@ -0,0 +1,129 @@
+"""
+Process pool for CPU-heavy password hashing.
+
+bcrypt takes tens to hundreds of milliseconds per call. Running it inline
+in an async handler blocks the event loop, so every other request on the
+worker waits. Here the work is sent to a process pool instead:
+
+- at most HASH_POOL_WORKERS jobs run at the same time;
+- at most HASH_POOL_MAX_QUEUE jobs wait for a free worker;
+- a job that waits longer than HASH_POOL_QUEUE_TIMEOUT is dropped;
+- when the queue is full new jobs are rejected immediately (load shedding).
+
+Rejected and timed out jobs raise HashingPoolSaturated.
+"""
+
+import asyncio
+import multiprocessing
+import time
+from concurrent.futures import Executor, ProcessPoolExecutor
+from typing import Any, Callable, Optional
+
+from fastapi_auth_service.app.core.metrics import metrics
+from fastapi_auth_service.app.core.settings import settings
+
+
+class HashingPoolSaturated(Exception):
+    """The pool cannot accept more work right now."""
+
+
+class HashingPool:
+    """
+    Bounded async front-end for a process pool executor.
+
+    :param workers: Number of worker processes (0 - use the loop's default thread pool)
+    :param max_queue: How many jobs may wait for a free worker
+    :param queue_timeout: Max seconds a job may wait in the queue
+    """
+
+    def __init__(self, workers: int, max_queue: int, queue_timeout: float) -> None:
+        self.workers = workers
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+
+        self._executor: Optional[Executor] = None
+        self._slots: Optional[asyncio.Semaphore] = None
+        self._slots_loop: Optional[asyncio.AbstractEventLoop] = None
+        self._pending = 0  # running + waiting jobs
+
+        # Metrics
+        self.queue_depth = metrics.gauge("hashing_pool.queue_depth")
+        self.in_flight = metrics.gauge("hashing_pool.in_flight")
+        self.wait_time = metrics.timer("hashing_pool.wait_time")
+        self.hash_time = metrics.timer("hashing_pool.hash_time")
+        self.rejected = metrics.counter("hashing_pool.rejected")
+        self.timed_out = metrics.counter("hashing_pool.timed_out")
+
+    @property
+    def capacity(self) -> int:
+        return max(self.workers, 1) + self.max_queue
+
+    def _get_executor(self) -> Optional[Executor]:
+        # Created lazily so that importing the module never forks processes
+        if self._executor is None and self.workers > 0:
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+        return self._executor
+
+    def _get_slots(self) -> asyncio.Semaphore:
+        # A semaphore is bound to one event loop (tests create a loop per test)
+        loop = asyncio.get_running_loop()
+        if self._slots is None or self._slots_loop is not loop:
+            self._slots = asyncio.Semaphore(max(self.workers, 1))
+            self._slots_loop = loop
+        return self._slots
+
+    async def run(self, fn: Callable[..., Any], *args: Any) -> Any:
+        """
+        Execute fn(*args) in the pool.
+
+        fn must be a picklable module-level function.
+        :raises HashingPoolSaturated: queue is full or the wait timed out
+        """
+        if self._pending >= self.capacity:
+            self.rejected.inc()
+            raise HashingPoolSaturated("Hashing queue is full")
+
+        self._pending += 1
+        slots = self._get_slots()
+        queued_at = time.perf_counter()
+        self.queue_depth.inc()
+        try:
+            try:
+                await asyncio.wait_for(slots.acquire(), timeout=self.queue_timeout)
+            except asyncio.TimeoutError:
+                self.timed_out.inc()
+                raise HashingPoolSaturated("Timed out waiting for a hashing worker")
+            finally:
+                self.queue_depth.dec()
+            self.wait_time.observe(time.perf_counter() - queued_at)
+
+            self.in_flight.inc()
+            started_at = time.perf_counter()
+            try:
+                loop = asyncio.get_running_loop()
+                return await loop.run_in_executor(self._get_executor(), fn, *args)
+            finally:
+                self.hash_time.observe(time.perf_counter() - started_at)
+                self.in_flight.dec()
+                slots.release()
+        finally:
+            self._pending -= 1
+
+    def shutdown(self) -> None:
+        """Stop worker processes (called on application shutdown)."""
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+        self._slots = None
+        self._slots_loop = None
+
+
+# Global pool, configured from settings
+hashing_pool = HashingPool(
+    workers=settings.HASH_POOL_WORKERS,
+    max_queue=settings.HASH_POOL_MAX_QUEUE,
+    queue_timeout=settings.HASH_POOL_QUEUE_TIMEOUT,
+)
@@ -0,0 +1,157 @@
+"""
+In-process metrics registry.
+
+Subsystems (hashing pool, throttling, caches, DB pool...) register their
+counters, gauges and timers here. The admin endpoint /admin/metrics
+returns a snapshot of everything that has been registered.
+
+Metrics are per worker process: every uvicorn worker keeps its own values.
+"""
+
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import Callable, Dict, Optional
+
+
+class Counter:
+    """Monotonically increasing counter."""
+
+    def __init__(self) -> None:
+        self._value = 0
+        self._lock = threading.Lock()
+
+    def inc(self, amount: int = 1) -> None:
+        with self._lock:
+            self._value += amount
+
+    @property
+    def value(self) -> int:
+        return self._value
+
+    def snapshot(self) -> int:
+        return self._value
+
+
+class Gauge:
+    """
+    Value that can go up and down.
+
+    If a callback is given, the value is read from it at snapshot time
+    (handy for values owned by another object, e.g. a connection pool).
+    """
+
+    def __init__(self, callback: Optional[Callable[[], float]] = None) -> None:
+        self._value = 0
+        self._callback = callback
+        self._lock = threading.Lock()
+
+    def set(self, value: float) -> None:
+        self._value = value
+
+    def inc(self, amount: float = 1) -> None:
+        with self._lock:
+            self._value += amount
+
+    def dec(self, amount: float = 1) -> None:
+        with self._lock:
+            self._value -= amount
+
+    @property
+    def value(self) -> float:
+        if self._callback is not None:
+            return self._callback()
+        return self._value
+
+    def snapshot(self) -> float:
+        return self.value
+
+
+class Timer:
+    """
+    Duration statistics in seconds.
+
+    Keeps totals plus a bounded window of recent samples for percentiles.
+    """
+
+    def __init__(self, window: int = 1024) -> None:
+        self._count = 0
+        self._total = 0.0
+        self._max = 0.0
+        self._samples = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def observe(self, seconds: float) -> None:
+        with self._lock:
+            self._count += 1
+            self._total += seconds
+            self._max = max(self._max, seconds)
+            self._samples.append(seconds)
+
+    @contextmanager
+    def time(self):
+        """Measure the duration of a `with` block."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start)
+
+    def percentile(self, q: float) -> float:
+        """Percentile (0..100) over the recent samples window."""
+        with self._lock:
+            samples = sorted(self._samples)
+        if not samples:
+            return 0.0
+        index = min(len(samples) - 1, int(round(q / 100 * (len(samples) - 1))))
+        return samples[index]
+
+    @property
+    def count(self) -> int:
+        return self._count
+
+    def snapshot(self) -> dict:
+        return {
+            "count": self._count,
+            "avg_ms": round(self._total / self._count * 1000, 3) if self._count else 0.0,
+            "p50_ms": round(self.percentile(50) * 1000, 3),
+            "p99_ms": round(self.percentile(99) * 1000, 3),
+            "max_ms": round(self._max * 1000, 3),
+        }
+
+
+class MetricsRegistry:
+    """Named collection of metrics. Registering the same name twice returns the same object."""
+
+    def __init__(self) -> None:
+        self._metrics: Dict[str, object] = {}
+        self._lock = threading.Lock()
+
+    def _get_or_create(self, name: str, factory: Callable[[], object]):
+        with self._lock:
+            if name not in self._metrics:
+                self._metrics[name] = factory()
+            return self._metrics[name]
+
+    def counter(self, name: str) -> Counter:
+        return self._get_or_create(name, Counter)
+
+    def gauge(self, name: str, callback: Optional[Callable[[], float]] = None) -> Gauge:
+        gauge = self._get_or_create(name, lambda: Gauge(callback))
+        if callback is not None:
+            # A re-created owner (e.g. a new engine) replaces the old callback
+            gauge._callback = callback
+        return gauge
+
+    def timer(self, name: str) -> Timer:
+        return self._get_or_create(name, Timer)
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            items = list(self._metrics.items())
+        return {name: metric.snapshot() for name, metric in sorted(items)}
+
+
+# Global registry, shared by the whole application
+metrics = MetricsRegistry()
@@ -3,15 +3,292 @@ Redis Connection Module.
 
 This module provides a function to connect to Redis asynchronously
 using settings from a central configuration file (Pydantic Settings).
+
+The global client (redis_cache) is built to survive Redis trouble:
+- a bounded connection pool (REDIS_MAX_CONNECTIONS); a request waits at most
+  REDIS_POOL_TIMEOUT for a free connection instead of queueing forever;
+- per-command socket and connect timeouts, periodic health checks and a
+  short retry with backoff (REDIS_RETRIES) for connection errors;
+- a circuit breaker: after REDIS_BREAKER_FAILURES connection errors or
+  timeouts in a row every command fails at once with CircuitOpenError for
+  REDIS_BREAKER_RESET_SECONDS, then a single trial command decides whether
+  Redis is back. No coroutine piles up behind a dead Redis.
+
+An empty pool (no free connection within REDIS_POOL_TIMEOUT) is local
+overload, not a Redis failure: it raises PoolExhaustedError, which neither
+counts towards the breaker nor switches token checks to degraded mode.
+
+Degraded mode (REDIS_DEGRADED_MODE=true, the default). While Redis is
+unavailable, token checks (get_current_user, /auth/me, /auth/introspect)
+fall back to signature + expiry. Logout and epoch revocations are not
+enforced until Redis is back. Operations that must write state (login,
+refresh, logout, ...) answer 503 with Retry-After (see main.py). With
+REDIS_DEGRADED_MODE=false token checks answer 503 as well.
+
+Pub/sub listeners use a separate client (redis_pubsub) without a read
+timeout, since they legitimately block waiting for messages.
+
+Topologies (REDIS_MODE):
+- standalone - REDIS_HOST:REDIS_PORT;
+- sentinel   - the master of REDIS_SENTINEL_MASTER, found through
+  REDIS_SENTINELS and re-discovered after a failover;
+- cluster    - REDIS_CLUSTER_NODES. Multi-key commands, pipelines and
+  scripts must stay within one slot, so every key of a user carries the
+  hash tag "{<user id>}" (see hash_tag()). Cluster pipelines have no
+  MULTI/EXEC: pipeline(transaction=True) still sends a user's commands
+  in one round trip, but not atomically - atomic steps use Lua scripts.
+  PUBLISH is broadcast by the cluster, so pub/sub uses a plain
+  connection to the first node.
 """
 
+import asyncio
+from typing import List, Tuple
+
 import redis.asyncio as redis  # Using an asynchronous Redis client
+from redis.asyncio.client import Pipeline
+from redis.asyncio.cluster import ClusterNode, ClusterPipeline, RedisCluster
+from redis.asyncio.retry import Retry
+from redis.asyncio.sentinel import Sentinel
+from redis.backoff import ExponentialBackoff
+from redis.exceptions import ConnectionError as RedisConnectionError
+from redis.exceptions import MaxConnectionsError, RedisError, TimeoutError as RedisTimeoutError
+
+from fastapi_auth_service.app.core.circuit_breaker import CircuitBreaker
+from fastapi_auth_service.app.core.metrics import metrics
 from fastapi_auth_service.app.core.settings import settings  # Import settings from Pydantic config
 
 
+# Errors that mean "Redis is unavailable" (as opposed to e.g. a wrong command)
+UNAVAILABLE_ERRORS = (RedisConnectionError, RedisTimeoutError)
+
+# Token checks answered by signature + expiry only
+degraded_counter = metrics.counter("redis.degraded_checks")
+# Commands that found no free connection in the pool
+pool_exhausted_counter = metrics.counter("redis.pool_exhausted")
+
+
+class CircuitOpenError(RedisConnectionError):
+    """Command rejected without a network call: the circuit breaker is open."""
+
+
+class PoolExhaustedError(RedisError):
+    """No free connection in the pool within REDIS_POOL_TIMEOUT (this worker is overloaded)."""
+
+
+def _pool_exhausted(error: RedisError) -> bool:
+    # BlockingConnectionPool: ConnectionError("No connection available.") from a
+    # wait timeout; ConnectionPool / cluster nodes: MaxConnectionsError
+    if isinstance(error, MaxConnectionsError):
+        return True
+    return (isinstance(error, RedisConnectionError)
+            and isinstance(error.__cause__, asyncio.TimeoutError)
+            and str(error).startswith("No connection available"))
+
+
+async def _guarded(breaker: CircuitBreaker, call, *args, **kwargs):
+    """Run call(*args, **kwargs) through the breaker."""
+    if not breaker.allow():
+        raise CircuitOpenError("Redis circuit breaker is open")
+    try:
+        result = await call(*args, **kwargs)
+    except RedisError as e:
+        if _pool_exhausted(e):
+            # Says nothing about Redis itself: the breaker is left as it is
+            pool_exhausted_counter.inc()
+            raise PoolExhaustedError(str(e)) from e
+        if isinstance(e, UNAVAILABLE_ERRORS):
+            breaker.record_failure()
+        else:
+            breaker.record_success()  # Redis answered, just not with a success
+        raise
+    breaker.record_success()
+    return result
+
+
+class ResilientPipeline(Pipeline):
+    """Pipeline whose execute() goes through the client's circuit breaker."""
+
+    breaker: CircuitBreaker
+
+    async def execute(self, raise_on_error: bool = True):
+        return await _guarded(self.breaker, super().execute, raise_on_error)
+
+
+class ResilientClusterPipeline(ClusterPipeline):
+    """Cluster pipeline whose execute() goes through the client's circuit breaker."""
+
+    breaker: CircuitBreaker
+
+    async def execute(self, raise_on_error: bool = True, allow_redirections: bool = True):
+        return await _guarded(self.breaker, super().execute, raise_on_error, allow_redirections)
+
+
+class ResilientRedis(redis.Redis):
+    """Redis client with every command (and pipeline) behind a circuit breaker."""
+
+    breaker: CircuitBreaker
+
+    async def execute_command(self, *args, **options):
+        return await _guarded(self.breaker, super().execute_command, *args, **options)
+
+    def pipeline(self, transaction: bool = True, shard_hint=None) -> ResilientPipeline:
+        pipe = ResilientPipeline(self.connection_pool, self.response_callbacks, transaction, shard_hint)
+        pipe.breaker = self.breaker
+        return pipe
+
+    async def mget_nonatomic(self, keys: List[str]) -> list:
+        """Same as RedisCluster.mget_nonatomic(): keys of any slots, one MGET here."""
+        return await self.mget(keys)
+
+
+class ResilientRedisCluster(RedisCluster):
+    """Redis Cluster client with every command (and pipeline) behind a circuit breaker."""
+
+    breaker: CircuitBreaker
+
+    async def execute_command(self, *args, **options):
+        return await _guarded(self.breaker, super().execute_command, *args, **options)
+
+    def pipeline(self, transaction=None, shard_hint=None) -> ResilientClusterPipeline:
+        # No MULTI/EXEC in cluster pipelines: `transaction` is accepted and ignored
+        pipe = ResilientClusterPipeline(self)
+        pipe.breaker = self.breaker
+        return pipe
+
+
+def hash_tag(value) -> str:
+    """
+    Redis Cluster hash tag: only the part in braces is hashed, so keys
+    sharing a tag map to one slot (and can be used in one pipeline/script).
+    """
+    return f"{{{value}}}"
+
+
+def cluster_mode() -> bool:
+    return settings.REDIS_MODE == "cluster"
+
+
+def legacy_keys_enabled() -> bool:
+    """
+    Whether keys of the older layouts are still read (TOKEN_LEGACY_KEYS_FALLBACK).
+    Never in cluster mode: they have no hash tag, and a cluster starts empty anyway.
+    """
+    return settings.TOKEN_LEGACY_KEYS_FALLBACK and not cluster_mode()
+
+
+def parse_nodes(nodes: str) -> List[Tuple[str, int]]:
+    """
+    "host1:6379,host2:6379" -> [("host1", 6379), ("host2", 6379)]
+    :raises ValueError: empty list or a node without a port
+    """
+    result = []
+    for node in nodes.split(","):
+        node = node.strip()
+        if not node:
+            continue
+        host, _, port = node.rpartition(":")
+        if not host or not port.isdigit():
+            raise ValueError(f"Invalid Redis node '{node}', expected host:port")
+        result.append((host, int(port)))
+    if not result:
+        raise ValueError("No Redis nodes configured")
+    return result
+
+
+def _breaker(config) -> CircuitBreaker:
+    return CircuitBreaker(
+        "redis",
+        failure_threshold=config.REDIS_BREAKER_FAILURES,
+        reset_timeout=config.REDIS_BREAKER_RESET_SECONDS,
+    )
+
+
+def _connection_options(config) -> dict:
+    return dict(
+        socket_timeout=config.REDIS_SOCKET_TIMEOUT,
+        socket_connect_timeout=config.REDIS_CONNECT_TIMEOUT,
+        socket_keepalive=True,
+        health_check_interval=config.REDIS_HEALTH_CHECK_INTERVAL,
+        retry=Retry(ExponentialBackoff(cap=0.2, base=0.02), config.REDIS_RETRIES),
+        decode_responses=True,  # Decodes bytes into strings automatically
+    )
+
+
+def build_redis_client(config):
+    """
+    Pooled client with timeouts, retries and a circuit breaker, from Settings.
+    :return: ResilientRedis (standalone, sentinel) or ResilientRedisCluster
+    :raises ValueError: unknown REDIS_MODE or bad node list
+    """
+    if config.REDIS_MODE == "cluster":
+        client = ResilientRedisCluster(
+            startup_nodes=[ClusterNode(host, port) for host, port in parse_nodes(config.REDIS_CLUSTER_NODES)],
+            max_connections=config.REDIS_MAX_CONNECTIONS,  # per node
+            **_connection_options(config),
+        )
+    elif config.REDIS_MODE == "sentinel":
+        sentinel = Sentinel(
+            parse_nodes(config.REDIS_SENTINELS),
+            socket_timeout=config.REDIS_SOCKET_TIMEOUT,
+            socket_connect_timeout=config.REDIS_CONNECT_TIMEOUT,
+        )
+        client = sentinel.master_for(
+            config.REDIS_SENTINEL_MASTER,
+            redis_class=ResilientRedis,
+            db=config.REDIS_DB,
+            max_connections=config.REDIS_MAX_CONNECTIONS,
+            **_connection_options(config),
+        )
+    elif config.REDIS_MODE == "standalone":
+        pool = redis.BlockingConnectionPool(
+            host=config.REDIS_HOST,  # Redis server address, for example "localhost"
+            port=config.REDIS_PORT,  # Redis server port, usually 6379
+            db=config.REDIS_DB,
+            max_connections=config.REDIS_MAX_CONNECTIONS,
+            timeout=config.REDIS_POOL_TIMEOUT,
+            **_connection_options(config),
+        )
+        client = ResilientRedis(connection_pool=pool)
+    else:
+        raise ValueError(f"Unknown REDIS_MODE '{config.REDIS_MODE}'")
+    client.breaker = _breaker(config)
+    return client
+
+
+def build_pubsub_client(config) -> redis.Redis:
+    """
+    Client for long-lived subscriptions: no read timeout, keepalive on.
+    """
+    options = dict(
+        socket_connect_timeout=config.REDIS_CONNECT_TIMEOUT,
+        socket_keepalive=True,
+        health_check_interval=config.REDIS_HEALTH_CHECK_INTERVAL,
+        decode_responses=True,
+    )
+    if config.REDIS_MODE == "sentinel":
+        sentinel = Sentinel(
+            parse_nodes(config.REDIS_SENTINELS), socket_connect_timeout=config.REDIS_CONNECT_TIMEOUT)
+        return sentinel.master_for(config.REDIS_SENTINEL_MASTER, db=config.REDIS_DB, **options)
+    if config.REDIS_MODE == "cluster":
+        # Messages published on any node reach subscribers on every node
+        host, port = parse_nodes(config.REDIS_CLUSTER_NODES)[0]
+        return redis.Redis(host=host, port=port, **options)
+    return redis.Redis(host=config.REDIS_HOST, port=config.REDIS_PORT, db=config.REDIS_DB, **options)
+
+
+def redis_degraded(error: Exception) -> bool:
+    """
+    Whether a token check that hit `error` may fall back to signature + expiry.
+    Counts the fallback; any other error should be re-raised by the caller.
+    """
+    if settings.REDIS_DEGRADED_MODE and isinstance(error, UNAVAILABLE_ERRORS):
+        degraded_counter.inc()
+        return True
+    return False
+
+
 # Redis cache is created once and is accessible as a variable
-redis_cache = redis.Redis(
-    host=settings.REDIS_HOST,  # Redis server address, for example "localhost"
-    port=settings.REDIS_PORT,  # Redis server port, usually 6379
-    decode_responses=True      # Decodes bytes into strings automatically
-)
+redis_cache = build_redis_client(settings)
+
+# Separate client for pub/sub listeners
+redis_pubsub = build_pubsub_client(settings)
@@ -0,0 +1,160 @@
+"""
+Read replicas for read-only endpoints.
+
+Endpoints that only read (admin user lists, balance) take their session
+from get_read_session() (see database.py); their queries go to a replica
+from DB_REPLICA_HOSTS. Every other session stays on the primary. Without
+replicas configured read sessions use the primary as well.
+
+- Lag: monitor_replicas() measures each replica's replay lag every
+  DB_REPLICA_CHECK_SECONDS. A replica that lags more than
+  DB_REPLICA_MAX_LAG_SECONDS, or did not answer the check, gets no reads
+  until it catches up; with no usable replica reads go to the primary.
+- Read-your-writes: for DB_READ_YOUR_WRITES_SECONDS after a write to a
+  user's row (user_changed()) the reads of that user, and of the user who
+  made the write (an admin blocking someone), go to the primary. The
+  worker that wrote marks them itself, other workers learn about the
+  write from the principal invalidation channel. The window is never
+  shorter than the allowed lag, so by the time it closes the replicas
+  serving reads have replayed the write.
+
+The user of the request is taken from request_user_id, set once the
+token is authenticated.
+"""
+
+import asyncio
+import itertools
+import logging
+import time
+from collections import OrderedDict
+from contextvars import ContextVar
+from typing import Callable, List, Optional
+
+from sqlalchemy import text
+from sqlalchemy.engine import Engine
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+from fastapi_auth_service.app.core.metrics import metrics
+
+
+logger = logging.getLogger(__name__)
+
+# Id of the authenticated user of the current request (None before authentication)
+request_user_id: ContextVar[Optional[int]] = ContextVar("request_user_id", default=None)
+
+# Seconds the replica is behind the primary; 0 when it has replayed all it received
+LAG_SQL = text(
+    "SELECT CASE"
+    " WHEN NOT pg_is_in_recovery() THEN 0"
+    " WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0"
+    " ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0)"
+    " END"
+)
+
+
+class RecentWrites:
+    """
+    Users whose row was written during the last `window` seconds.
+
+    :param window: Seconds a write keeps the user's reads on the primary
+    """
+
+    def __init__(self, window: float, clock: Callable[[], float] = time.monotonic) -> None:
+        self.window = window
+        self._clock = clock
+        # user id -> time of the write, oldest first
+        self._writes: "OrderedDict[int, float]" = OrderedDict()
+
+    def mark(self, user_id: int) -> None:
+        now = self._clock()
+        self._writes[user_id] = now
+        self._writes.move_to_end(user_id)
+        # Entries share one window, so the expired ones are at the front
+        while self._writes:
+            oldest_id, written_at = next(iter(self._writes.items()))
+            if now - written_at < self.window:
+                break
+            del self._writes[oldest_id]
+
+    def __contains__(self, user_id: int) -> bool:
+        written_at = self._writes.get(user_id)
+        return written_at is not None and self._clock() - written_at < self.window
+
+    def __len__(self) -> int:
+        return len(self._writes)
+
+
+class Replica:
+    """A replica engine and its last measured lag (None - unknown or unreachable)."""
+
+    def __init__(self, name: str, engine: AsyncEngine) -> None:
+        self.name = name
+        self.engine = engine
+        self.lag: Optional[float] = None
+        metrics.gauge(f"{name}.lag_seconds", lambda: -1 if self.lag is None else round(self.lag, 3))
+
+
+class ReplicaRouter:
+    """
+    Picks the engine of a read-only session.
+
+    :param replicas: Replicas to spread reads over (round robin)
+    :param max_lag: Seconds of lag after which a replica gets no reads
+    :param recent_writes: Users whose reads must see their own writes
+    """
+
+    def __init__(self, replicas: List[Replica], max_lag: float, recent_writes: RecentWrites) -> None:
+        self.replicas = replicas
+        self.max_lag = max_lag
+        self.recent_writes = recent_writes
+        self._turn = itertools.count()
+
+        self.replica_reads = metrics.counter("db_replica.reads")
+        self.primary_fallbacks = metrics.counter("db_replica.primary_fallbacks")
+        self.read_your_writes = metrics.counter("db_replica.read_your_writes")
+
+    def usable(self) -> List[Replica]:
+        return [replica for replica in self.replicas if replica.lag is not None and replica.lag <= self.max_lag]
+
+    def pick(self, user_id: Optional[int]) -> Optional[Engine]:
+        """
+        :return: Sync engine of the replica to read from, None - read from the primary
+        """
+        if not self.replicas:
+            return None
+        if user_id is not None and user_id in self.recent_writes:
+            self.read_your_writes.inc()
+            return None
+        usable = self.usable()
+        if not usable:
+            self.primary_fallbacks.inc()
+            return None
+        self.replica_reads.inc()
+        return usable[next(self._turn) % len(usable)].engine.sync_engine
+
+    async def check_lag(self, timeout: float) -> None:
+        """Measure the lag of every replica; a failed check takes the replica out of rotation."""
+        for replica in self.replicas:
+            try:
+                replica.lag = float(await asyncio.wait_for(self._measure(replica), timeout))
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                if replica.lag is not None:
+                    logger.warning(f"Replica {replica.name} is out of rotation: {e!r}")
+                replica.lag = None
+
+    @staticmethod
+    async def _measure(replica: Replica) -> float:
+        async with replica.engine.connect() as connection:
+            return (await connection.execute(LAG_SQL)).scalar()
+
+
+async def monitor_replicas(router: ReplicaRouter, interval: float) -> None:
+    """
+    Background task: keep the measured lag of the replicas fresh.
+    Runs until cancelled.
+    """
+    while True:
+        await router.check_lag(timeout=interval)
+        await asyncio.sleep(interval)
@@ -3,10 +3,25 @@ Project configuration via Pydantic Settings.
 
 Supports variables from .env:
 - POSTGRES_DB, POSTGRES_USER, POSTGRES_PASSWORD, POSTGRES_HOST, POSTGRES_PORT
-- REDIS_HOST, REDIS_PORT
+- DB_* (engine profile: pool, pre-ping, recycle, statement cache, echo, DB_POOLER)
+- DB_REPLICA_*, DB_READ_YOUR_WRITES_SECONDS (read replicas)
+- REDIS_HOST, REDIS_PORT, REDIS_* (pool, timeouts, circuit breaker, degraded mode)
+- REDIS_MODE, REDIS_CLUSTER_NODES, REDIS_SENTINEL* (Redis Cluster / Sentinel)
 - JWT_SECRET_KEY and others
+- JWT_BACKEND, JWT_VERIFY_CACHE_* (token codec and verified-token cache)
+- JWT_ALGORITHM, JWT_KEYS_*, JWT_KEY_ROTATION_DAYS, JWKS_* (asymmetric signing)
+- INTROSPECTION_* (batch token introspection)
+- TOKEN_STORE, TOKEN_FORMAT (token state backend, JWT or opaque tokens)
+- SESSION_SLIDING_* (sliding session expiry)
+- TOKEN_L1_*, TOKEN_REVOCATION_FILTER_* (local token validity cache)
+- HASH_POOL_* (password hashing process pool)
+- PASSWORD_SCHEMES, BCRYPT_ROUNDS, ARGON2_*, HASH_TARGET_MS (password hashing)
+- LOGIN_*, TRUSTED_PROXIES (login throttling)
+- PRINCIPAL_CACHE_* (cache of authenticated users)
 """
 
+from typing import List, Optional
+
 from pydantic import Field
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
@@ -21,17 +36,135 @@ class Settings(BaseSettings):
     POSTGRES_HOST: str = Field(..., env="POSTGRES_HOST")
     POSTGRES_PORT: int = Field(..., env="POSTGRES_PORT")
 
+    # 🏊 Database engine profile (see app/database.py)
+    # SQL echo of every statement; opt-in, e.g. DB_ECHO=true in a local .env
+    DB_ECHO: bool = Field(default=False, env="DB_ECHO")
+    DB_POOL_SIZE: int = Field(default=5, env="DB_POOL_SIZE")
+    DB_MAX_OVERFLOW: int = Field(default=10, env="DB_MAX_OVERFLOW")
+    # Seconds a request waits for a free connection
+    DB_POOL_TIMEOUT: float = Field(default=30.0, env="DB_POOL_TIMEOUT")
+    DB_POOL_PRE_PING: bool = Field(default=True, env="DB_POOL_PRE_PING")
+    # Seconds after which a connection is replaced; -1 - never
+    DB_POOL_RECYCLE: int = Field(default=1800, env="DB_POOL_RECYCLE")
+    # asyncpg prepared statements cached per connection; 0 - off
+    DB_STATEMENT_CACHE_SIZE: int = Field(default=100, env="DB_STATEMENT_CACHE_SIZE")
+    # Connection pooler in front of Postgres: "none" or "pgbouncer" (transaction pooling)
+    DB_POOLER: str = Field(default="none", env="DB_POOLER")
+
+    # 📚 Read replicas (see app/core/replicas.py)
+    # "host:port,host:port" with the primary's database and credentials; empty - no replicas
+    DB_REPLICA_HOSTS: str = Field(default="", env="DB_REPLICA_HOSTS")
+    DB_REPLICA_MAX_LAG_SECONDS: float = Field(default=2.0, env="DB_REPLICA_MAX_LAG_SECONDS")
+    DB_REPLICA_CHECK_SECONDS: float = Field(default=1.0, env="DB_REPLICA_CHECK_SECONDS")
+    # After a write to a user's row, that user reads from the primary this long
+    DB_READ_YOUR_WRITES_SECONDS: float = Field(default=5.0, env="DB_READ_YOUR_WRITES_SECONDS")
+
     #  JWT
     JWT_SECRET_KEY: str = Field(..., env="JWT_SECRET_KEY")
+    # Codec backend: "jose" or "pyjwt"
+    JWT_BACKEND: str = Field(default="jose", env="JWT_BACKEND")
+    # Verified-token cache size (0 disables it)
+    JWT_VERIFY_CACHE_SIZE: int = Field(default=10000, env="JWT_VERIFY_CACHE_SIZE")
+    # Max seconds a verified token stays cached, whatever its exp says
+    JWT_VERIFY_CACHE_TTL_SECONDS: int = Field(default=300, env="JWT_VERIFY_CACHE_TTL_SECONDS")
+    # Signing: "HS256" (shared secret) or "RS256" / "EdDSA" (key ring + JWKS)
+    JWT_ALGORITHM: str = Field(default="HS256", env="JWT_ALGORITHM")
+    JWT_KEYS_DIR: str = Field(default="keys", env="JWT_KEYS_DIR")
+    # Seconds between re-reads of JWT_KEYS_DIR; a removed key stops verifying within it
+    JWT_KEYS_RELOAD_SECONDS: int = Field(default=60, env="JWT_KEYS_RELOAD_SECONDS")
+    JWT_KEY_ROTATION_DAYS: int = Field(default=30, env="JWT_KEY_ROTATION_DAYS")
+    JWKS_MAX_AGE_SECONDS: int = Field(default=3600, env="JWKS_MAX_AGE_SECONDS")
+    # Keep accepting HS256 tokens without kid after switching to a key ring
+    # (only with SECRET_KEY set). Temporary: turn it off REFRESH_TOKEN_EXPIRE_DAYS
+    # after the switch, when no legacy token can be alive; the flag will be removed.
+    JWT_ACCEPT_HS256: bool = Field(default=False, env="JWT_ACCEPT_HS256")
+
+    # 🔎 Batch token introspection (POST /auth/introspect)
+    INTROSPECTION_MAX_TOKENS: int = Field(default=500, env="INTROSPECTION_MAX_TOKENS")
+    # Callers must send it in the X-API-Key header; unset - the endpoint is off (404)
+    INTROSPECTION_API_KEY: Optional[str] = Field(default=None, env="INTROSPECTION_API_KEY")
 
     #  Redis
     REDIS_HOST: str = Field(..., env="REDIS_HOST")
     REDIS_PORT: int = Field(..., env="REDIS_PORT")
     REDIS_DB: int = Field(default=0, env="REDIS_DB")
+    # Topology: "standalone" (REDIS_HOST:REDIS_PORT), "sentinel" or "cluster"
+    REDIS_MODE: str = Field(default="standalone", env="REDIS_MODE")
+    # Comma-separated "host:port" lists
+    REDIS_CLUSTER_NODES: str = Field(default="", env="REDIS_CLUSTER_NODES")
+    REDIS_SENTINELS: str = Field(default="", env="REDIS_SENTINELS")
+    REDIS_SENTINEL_MASTER: str = Field(default="mymaster", env="REDIS_SENTINEL_MASTER")
+    # Pool, timeouts (seconds) and retries
+    REDIS_MAX_CONNECTIONS: int = Field(default=100, env="REDIS_MAX_CONNECTIONS")
+    REDIS_POOL_TIMEOUT: float = Field(default=0.5, env="REDIS_POOL_TIMEOUT")
+    REDIS_SOCKET_TIMEOUT: float = Field(default=0.5, env="REDIS_SOCKET_TIMEOUT")
+    REDIS_CONNECT_TIMEOUT: float = Field(default=0.5, env="REDIS_CONNECT_TIMEOUT")
+    REDIS_HEALTH_CHECK_INTERVAL: int = Field(default=30, env="REDIS_HEALTH_CHECK_INTERVAL")
+    REDIS_RETRIES: int = Field(default=1, env="REDIS_RETRIES")
+    # Circuit breaker: open after N failures in a row, retry after M seconds
+    REDIS_BREAKER_FAILURES: int = Field(default=5, env="REDIS_BREAKER_FAILURES")
+    REDIS_BREAKER_RESET_SECONDS: float = Field(default=5.0, env="REDIS_BREAKER_RESET_SECONDS")
+    # Token checks fall back to signature + expiry while Redis is down (see core/redis.py)
+    REDIS_DEGRADED_MODE: bool = Field(default=True, env="REDIS_DEGRADED_MODE")
 
     # 🕒 Token lifetime
     ACCESS_TOKEN_EXPIRE_MINUTES: int = Field(default=15, env="ACCESS_TOKEN_EXPIRE_MINUTES")
     REFRESH_TOKEN_EXPIRE_DAYS: int = Field(default=7, env="REFRESH_TOKEN_EXPIRE_DAYS")
+    # Also read keys of the older layouts (see token_cache.py; ignored in cluster mode)
+    TOKEN_LEGACY_KEYS_FALLBACK: bool = Field(default=True, env="TOKEN_LEGACY_KEYS_FALLBACK")
+    # Token state backend: "redis" or "memory" (one process only, see token_store.py)
+    TOKEN_STORE: str = Field(default="redis", env="TOKEN_STORE")
+    # Tokens issued at login/refresh: "jwt" or "opaque" (see opaque_tokens.py); both are accepted
+    TOKEN_FORMAT: str = Field(default="jwt", env="TOKEN_FORMAT")
+
+    # 🕒 Sliding sessions (token_cache.py): the access token key is extended on use,
+    # so an active user is not sent to /auth/refresh every ACCESS_TOKEN_EXPIRE_MINUTES
+    SESSION_SLIDING_ENABLED: bool = Field(default=False, env="SESSION_SLIDING_ENABLED")
+    # Extend only when less than this fraction of ACCESS_TOKEN_EXPIRE_MINUTES is left
+    SESSION_SLIDING_EXTEND_FRACTION: float = Field(default=0.5, env="SESSION_SLIDING_EXTEND_FRACTION")
+    # Lifetime of the access JWT in sliding mode: the longest a session can slide
+    SESSION_SLIDING_MAX_MINUTES: int = Field(default=480, env="SESSION_SLIDING_MAX_MINUTES")
+
+    # ⚡ Local token validity cache + revocation filter (token_validity_cache.py)
+    TOKEN_L1_ENABLED: bool = Field(default=True, env="TOKEN_L1_ENABLED")
+    TOKEN_L1_SIZE: int = Field(default=50000, env="TOKEN_L1_SIZE")
+    TOKEN_L1_TTL_SECONDS: float = Field(default=5.0, env="TOKEN_L1_TTL_SECONDS")
+    TOKEN_REVOCATION_FILTER_CAPACITY: int = Field(default=100000, env="TOKEN_REVOCATION_FILTER_CAPACITY")
+    TOKEN_REVOCATION_FILTER_ERROR_RATE: float = Field(default=0.01, env="TOKEN_REVOCATION_FILTER_ERROR_RATE")
+
+    # 🔐 Password hashing pool (0 workers - run in the default thread pool)
+    HASH_POOL_WORKERS: int = Field(default=2, env="HASH_POOL_WORKERS")
+    HASH_POOL_MAX_QUEUE: int = Field(default=64, env="HASH_POOL_MAX_QUEUE")
+    HASH_POOL_QUEUE_TIMEOUT: float = Field(default=2.0, env="HASH_POOL_QUEUE_TIMEOUT")
+
+    # 🔐 Password schemes: first one hashes new passwords, the rest are
+    # verify-only and get migrated on login (e.g. "argon2,bcrypt")
+    PASSWORD_SCHEMES: str = Field(default="bcrypt", env="PASSWORD_SCHEMES")
+    HASH_TARGET_MS: int = Field(default=250, env="HASH_TARGET_MS")
+
+    # 🔐 bcrypt cost (pick it with `cli.py calibrate-hash`)
+    BCRYPT_ROUNDS: int = Field(default=12, env="BCRYPT_ROUNDS")
+
+    # 🔐 Argon2id parameters (pick them with `cli.py tune-argon2`)
+    ARGON2_MEMORY_COST: int = Field(default=19456, env="ARGON2_MEMORY_COST")  # KiB
+    ARGON2_TIME_COST: int = Field(default=2, env="ARGON2_TIME_COST")
+    ARGON2_PARALLELISM: int = Field(default=1, env="ARGON2_PARALLELISM")
+
+    # 🚦 Login throttling (per email and per client IP)
+    LOGIN_THROTTLE_ENABLED: bool = Field(default=True, env="LOGIN_THROTTLE_ENABLED")
+    LOGIN_WINDOW_SECONDS: int = Field(default=60, env="LOGIN_WINDOW_SECONDS")
+    LOGIN_MAX_ATTEMPTS_PER_EMAIL: int = Field(default=10, env="LOGIN_MAX_ATTEMPTS_PER_EMAIL")
+    LOGIN_MAX_ATTEMPTS_PER_IP: int = Field(default=100, env="LOGIN_MAX_ATTEMPTS_PER_IP")
+    LOGIN_BUCKET_CAPACITY: int = Field(default=20, env="LOGIN_BUCKET_CAPACITY")
+    LOGIN_BUCKET_REFILL_PER_SECOND: float = Field(default=2.0, env="LOGIN_BUCKET_REFILL_PER_SECOND")
+    # Load balancers / reverse proxies ("10.0.0.0/8,192.168.1.5") whose
+    # X-Forwarded-For is trusted for the client IP; empty - use the peer address
+    TRUSTED_PROXIES: str = Field(default="", env="TRUSTED_PROXIES")
+
+    # 👤 Cache of authenticated users (get_current_user)
+    PRINCIPAL_CACHE_ENABLED: bool = Field(default=True, env="PRINCIPAL_CACHE_ENABLED")
+    PRINCIPAL_CACHE_SIZE: int = Field(default=10000, env="PRINCIPAL_CACHE_SIZE")
+    PRINCIPAL_CACHE_TTL_SECONDS: float = Field(default=30.0, env="PRINCIPAL_CACHE_TTL_SECONDS")
 
     #  Generating URL for SQLAlchemy + asyncpg
     @property
@@ -41,6 +174,23 @@ class Settings(BaseSettings):
             f"@{self.POSTGRES_HOST}:{self.POSTGRES_PORT}/{self.POSTGRES_DB}"
         )
 
+    #  The same database for synchronous tools (CLI) via psycopg2
+    @property
+    def sync_db_url(self) -> str:
+        return self.db_url.replace("postgresql+asyncpg://", "postgresql+psycopg2://", 1)
+
+    #  URLs of the read replicas (DB_REPLICA_HOSTS, port defaults to POSTGRES_PORT)
+    @property
+    def replica_db_urls(self) -> List[str]:
+        urls = []
+        for node in filter(None, (node.strip() for node in self.DB_REPLICA_HOSTS.split(","))):
+            host, _, port = node.partition(":")
+            urls.append(
+                f"postgresql+asyncpg://{self.POSTGRES_USER}:{self.POSTGRES_PASSWORD}"
+                f"@{host}:{port or self.POSTGRES_PORT}/{self.POSTGRES_DB}"
+            )
+        return urls
+
 
 #  Config instance
 settings = Settings()
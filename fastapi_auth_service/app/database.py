@@ -1,30 +1,171 @@
 """
 Asynchronous connection initialization module to PostreSQL database
 using SQLAlchemy and Pydantic Settings.
+
+All engines (the app, cli.py, Alembic) are built here from Settings:
+- DB_POOL_SIZE, DB_MAX_OVERFLOW, DB_POOL_TIMEOUT - pool capacity and how
+  long a request waits for a connection before failing;
+- DB_POOL_PRE_PING, DB_POOL_RECYCLE - drop dead and old connections;
+- DB_STATEMENT_CACHE_SIZE - asyncpg prepared statement cache per connection;
+- DB_ECHO - SQL echo, off unless set (e.g. in a local .env);
+- DB_POOLER - "pgbouncer" when POSTGRES_HOST/PORT point at PgBouncer in
+  transaction mode. Every transaction may then run on a different server
+  connection, so:
+  * prepared statements are not cached (asyncpg's and SQLAlchemy's caches
+    are off) and get unique names, so they never clash with statements
+    another client left on the same server connection;
+  * session-level state (SET without LOCAL, LISTEN, temp tables,
+    session advisory locks, ...) is rejected with ValueError before it
+    reaches the server: it would leak to other clients or be lost.
+
+The app engine's pool reports to /admin/metrics: db_pool.checked_out,
+db_pool.overflow, db_pool.size, db_pool.checkout_time (wait for a
+connection, connecting included), db_pool.connect_time and
+db_pool.timeouts. Replicas (DB_REPLICA_HOSTS) get the same profile and
+report db_replica<N>.checked_out, ... (the timers cover all pools).
+
+get_async_session() is bound to the primary. get_read_session() is for
+endpoints that only read: its queries go to a replica picked by
+read_router (see core/replicas.py).
+
+Request sessions are lazy: a connection is checked out at the first
+statement and goes back to the pool when the unit of work commits. A
+transaction that has only read is ended with release_connection() before
+work that does not need the database (password hashing, Redis), so pool
+occupancy (db_pool.checked_out) reflects real DB work.
 """
 
+import re
+import uuid
+
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import Engine, make_url
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
 from sqlalchemy.ext.asyncio import (
     AsyncEngine,
     create_async_engine,
     async_sessionmaker,
     AsyncSession
 )
-from sqlalchemy.orm import DeclarativeBase
+from sqlalchemy.orm import DeclarativeBase, Session
+from sqlalchemy.pool import AsyncAdaptedQueuePool, NullPool
 from contextlib import asynccontextmanager
+from typing import Optional
+from fastapi_auth_service.app.core.metrics import metrics
+from fastapi_auth_service.app.core.replicas import RecentWrites, Replica, ReplicaRouter, request_user_id
 from fastapi_auth_service.app.core.settings import settings
 
 
-# Forming a database connection string from environment variables
-DATABASE_URL = (
-    f"postgresql+asyncpg://{settings.POSTGRES_USER}:{settings.POSTGRES_PASSWORD}"
-    f"@{settings.POSTGRES_HOST}:{settings.POSTGRES_PORT}/{settings.POSTGRES_DB}"
+checkout_timer = metrics.timer("db_pool.checkout_time")
+connect_timer = metrics.timer("db_pool.connect_time")
+pool_timeouts = metrics.counter("db_pool.timeouts")
+
+
+class InstrumentedAsyncPool(AsyncAdaptedQueuePool):
+    """Queue pool that times checkouts and new connections."""
+
+    def connect(self):
+        try:
+            with checkout_timer.time():
+                return super().connect()
+        except PoolTimeoutError:
+            pool_timeouts.inc()
+            raise
+
+    def _create_connection(self):
+        with connect_timer.time():
+            return super()._create_connection()
+
+
+# Supported DB_POOLER values
+POOLERS = ("none", "pgbouncer")
+
+# Statements that change the state of the server session
+SESSION_STATE_SQL = re.compile(
+    r"^\s*(SET\s+(?!LOCAL\b|TRANSACTION\b|CONSTRAINTS\b)|RESET\b|LISTEN\b|UNLISTEN\b|PREPARE\b"
+    r"|DEALLOCATE\b|DISCARD\b|CREATE\s+(GLOBAL\s+|LOCAL\s+)?TEMP)"
+    r"|\bpg_advisory_lock(_shared)?\s*\(",
+    re.IGNORECASE,
 )
 
+
+def unique_statement_name() -> str:
+    return f"__asyncpg_{uuid.uuid4().hex}__"
+
+
+def reject_session_state(conn, cursor, statement, parameters, context, executemany) -> None:
+    """before_cursor_execute hook of engines behind a transaction pooler."""
+    if SESSION_STATE_SQL.search(statement):
+        raise ValueError(
+            "Session-level state does not survive PgBouncer transaction pooling "
+            f"(use SET LOCAL / transaction-scoped locks instead): {statement[:80]!r}")
+
+
+def statement_cache_size(config) -> int:
+    """Prepared statements cached per connection (none behind a transaction pooler)."""
+    if config.DB_POOLER not in POOLERS:
+        raise ValueError(f"Unknown DB_POOLER: {config.DB_POOLER}")
+    return 0 if config.DB_POOLER == "pgbouncer" else config.DB_STATEMENT_CACHE_SIZE
+
+
+def connect_args(config) -> dict:
+    """asyncpg connect() arguments of the engine profile."""
+    args = {"statement_cache_size": statement_cache_size(config)}
+    if config.DB_POOLER == "pgbouncer":
+        args["prepared_statement_name_func"] = unique_statement_name
+    return args
+
+
+def build_async_engine(
+        config, null_pool: bool = False, url: Optional[str] = None, name: str = "db_pool") -> AsyncEngine:
+    """
+    asyncpg engine from Settings.
+
+    :param null_pool: No pooling (one-off scripts such as migrations); pool settings and metrics are skipped
+    :param url: Database to connect to, the primary (config.db_url) by default
+    :param name: Prefix of the pool gauges
+    """
+    url = make_url(url or config.db_url).update_query_dict(
+        # SQLAlchemy's own cache of asyncpg prepared statements
+        {"prepared_statement_cache_size": str(statement_cache_size(config))})
+    options = dict(echo=config.DB_ECHO, connect_args=connect_args(config))
+    if null_pool:
+        engine = create_async_engine(url, poolclass=NullPool, **options)
+    else:
+        engine = _pooled_engine(config, url, name, options)
+    if config.DB_POOLER == "pgbouncer":
+        event.listen(engine.sync_engine, "before_cursor_execute", reject_session_state)
+    return engine
+
+
+def _pooled_engine(config, url, name: str, options: dict) -> AsyncEngine:
+    engine = create_async_engine(
+        url,
+        poolclass=InstrumentedAsyncPool,
+        pool_size=config.DB_POOL_SIZE,
+        max_overflow=config.DB_MAX_OVERFLOW,
+        pool_timeout=config.DB_POOL_TIMEOUT,
+        pool_pre_ping=config.DB_POOL_PRE_PING,
+        pool_recycle=config.DB_POOL_RECYCLE,
+        **options,
+    )
+    # The pool is replaced on dispose(), so always read the current one
+    metrics.gauge(f"{name}.checked_out", lambda: engine.sync_engine.pool.checkedout())
+    metrics.gauge(f"{name}.overflow", lambda: max(0, engine.sync_engine.pool.overflow()))
+    metrics.gauge(f"{name}.size", lambda: engine.sync_engine.pool.size())
+    return engine
+
+
+def build_sync_engine(config) -> Engine:
+    """psycopg2 engine for the CLI (short-lived, no pool tuning)."""
+    return create_engine(config.sync_db_url, echo=config.DB_ECHO, pool_pre_ping=True)
+
+
 # Building an Asynchronous Engine for SQLAlchemy
-engine: AsyncEngine = create_async_engine(
-    DATABASE_URL,  # connection line
-    echo=True,  # SQL query log (turn True if debugging)
-)
+engine: AsyncEngine = build_async_engine(settings)
+
+# Forming a database connection string from environment variables
+DATABASE_URL = settings.db_url
 
 # Create an asynchronous session factory
 async_session_factory = async_sessionmaker(
@@ -32,6 +173,72 @@ async_session_factory = async_sessionmaker(
     expire_on_commit=False  # objects will not be reset after commit
 )
 
+# Read replicas; a user's own writes keep their reads on the primary for a while
+recent_writes = RecentWrites(max(settings.DB_READ_YOUR_WRITES_SECONDS, settings.DB_REPLICA_MAX_LAG_SECONDS))
+read_router = ReplicaRouter(
+    [Replica(f"db_replica{i}", build_async_engine(settings, url=url, name=f"db_replica{i}"))
+     for i, url in enumerate(settings.replica_db_urls)],
+    max_lag=settings.DB_REPLICA_MAX_LAG_SECONDS,
+    recent_writes=recent_writes,
+)
+
+
+class RoutingSession(Session):
+    """
+    Session of read-only endpoints: queries go to the engine picked by
+    read_router, once per session (one connection per request). Flushes
+    (a write by mistake) still go to the primary.
+    """
+
+    def get_bind(self, mapper=None, **kw):
+        if not self._flushing:
+            if "replica" not in self.info:
+                self.info["replica"] = read_router.pick(request_user_id.get())
+            if self.info["replica"] is not None:
+                return self.info["replica"]
+        return super().get_bind(mapper, **kw)
+
+
+# Sessions for read-only endpoints (the primary when no replica can be used)
+read_session_factory = async_sessionmaker(
+    engine,
+    expire_on_commit=False,
+    sync_session_class=RoutingSession,
+)
+
+# A transaction that wrote (DML, a flush) must never be ended early by release_connection()
+@event.listens_for(Session, "do_orm_execute")
+def _mark_write(orm_execute_state) -> None:
+    if not orm_execute_state.is_select:
+        orm_execute_state.session.info["wrote"] = True
+
+
+@event.listens_for(Session, "after_flush")
+def _mark_flush(session, flush_context) -> None:
+    session.info["wrote"] = True
+
+
+@event.listens_for(Session, "after_transaction_end")
+def _forget_writes(session, transaction) -> None:
+    if transaction.parent is None:
+        session.info.pop("wrote", None)
+
+
+async def release_connection(session: AsyncSession) -> None:
+    """
+    Give the session's connection back to the pool if its transaction has
+    only read. Loaded objects stay usable (expire_on_commit=False) and the
+    next statement checks out a connection again. A transaction with
+    writes or pending changes is left alone.
+    """
+    sync_session = session.sync_session
+    if not session.in_transaction() or sync_session.info.get("wrote"):
+        return
+    if session.new or session.dirty or session.deleted:
+        return
+    await session.commit()
+
+
 # Base class for ORM models
 
 
@@ -45,6 +252,17 @@ async def get_async_session() -> AsyncSession:
     """
     Context manager for creating and closing a database session.
     Used as a dependency in endpoints and services.
+    No connection is held until the first statement (see release_connection()).
     """
     async with async_session_factory() as session:
         yield session
+
+
+async def get_read_session() -> AsyncSession:
+    """
+    Session for endpoints that only read: served by a replica when one is
+    usable. The engine is picked at the first query, after authentication,
+    so the user's own recent writes are seen.
+    """
+    async with read_session_factory() as session:
+        yield session
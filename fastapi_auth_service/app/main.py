@@ -1,9 +1,21 @@
-from fastapi import FastAPI
+import math
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
 from fastapi_auth_service.app.routers.auth_routers import router as auth_router
 from fastapi_auth_service.app.routers.user_routers import router as user_router
 from fastapi_auth_service.app.routers.admin_routes import router as admin_router
-
-from fastapi_auth_service.app.core.redis import redis_cache
+from fastapi_auth_service.app.routers.jwks_routes import router as jwks_router
+
+from fastapi_auth_service.app.core.redis import UNAVAILABLE_ERRORS, PoolExhaustedError, redis_cache
+from fastapi_auth_service.app.core.settings import settings
+from fastapi_auth_service.app.core.hashing_pool import hashing_pool
+from fastapi_auth_service.app.core.replicas import monitor_replicas
+from fastapi_auth_service.app.database import read_router
+from fastapi_auth_service.app.services.principal_cache import listen_for_invalidations
+from fastapi_auth_service.app.services.token_validity_cache import listen_for_revocations
+from fastapi_auth_service.app.utils.key_ring import rotate_keys_periodically
+from fastapi_auth_service.app.utils.security import key_ring
 import logging
 import uvloop
 import asyncio
@@ -30,6 +42,23 @@ app = FastAPI(
 app.include_router(auth_router, prefix="/auth", tags=["Authentication"])
 app.include_router(user_router, prefix="/users", tags=["Users"])
 app.include_router(admin_router, prefix="/admin", tags=["Admin"])
+app.include_router(jwks_router)
+
+
+# ⚙️ Redis unavailable (breaker open, timeouts) or no free pooled connection: fail fast with 503 instead of a 500
+async def redis_unavailable_handler(request: Request, exc: Exception) -> JSONResponse:
+    return JSONResponse(
+        status_code=503,
+        content={"detail": "Service temporarily unavailable, try again later"},
+        headers={"Retry-After": str(math.ceil(settings.REDIS_BREAKER_RESET_SECONDS))},
+    )
+
+
+for error_class in UNAVAILABLE_ERRORS + (PoolExhaustedError,):
+    app.add_exception_handler(error_class, redis_unavailable_handler)
+
+# Background tasks started with the application
+background_tasks = []
 
 # ⚙️ Initializing Redis on application startup
 
@@ -41,6 +70,31 @@ async def startup():
         logging.info("✅ Redis connected successfully")
     except Exception as e:
         logging.error(f"❌ Error connecting to Redis: {e}")
+        if settings.REDIS_DEGRADED_MODE:
+            logging.warning("⚠️ Starting in degraded mode: token checks use signature + expiry only")
+
+    # Drop cached users changed by other workers
+    background_tasks.append(asyncio.create_task(listen_for_invalidations()))
+    # Apply token revocations made by other workers to the local validity cache
+    background_tasks.append(asyncio.create_task(listen_for_revocations()))
+    # Keep the lag of the read replicas measured
+    if read_router.replicas:
+        background_tasks.append(asyncio.create_task(
+            monitor_replicas(read_router, settings.DB_REPLICA_CHECK_SECONDS)))
+
+    # Asymmetric signing: create/publish keys on schedule
+    if key_ring is not None:
+        await asyncio.to_thread(key_ring.rotate)
+        background_tasks.append(asyncio.create_task(rotate_keys_periodically(key_ring, settings.JWT_KEYS_RELOAD_SECONDS)))
+
+
+# ⚙️ Releasing resources on application shutdown
+@app.on_event("shutdown")
+async def shutdown():
+    for task in background_tasks:
+        task.cancel()
+    background_tasks.clear()
+    hashing_pool.shutdown()  # Stop password hashing workers
 
 # Root endpoint (for checking API operation)
 
@@ -1,6 +1,6 @@
 """User model for storage in PostgreSQL via SQLAlchemy ORM."""
 
-from sqlalchemy import Column, Integer, String, Boolean, DateTime, func, Enum
+from sqlalchemy import Column, Integer, String, Boolean, DateTime, func, Enum, Index
 from fastapi_auth_service.app.database import Base  # Base class for SQLAlchemy models
 from datetime import datetime
 import enum
@@ -19,7 +19,12 @@ Represents the 'users' table in the database.
     """
 
     __tablename__ = "users"  # Table name in the database
-    __table_args__ = {'extend_existing': True}  # Remove error from redefining table
+    __table_args__ = (
+        # Keyset pagination of the admin listing: (sort column, id)
+        Index("ix_users_balance_id", "balance", "id"),
+        Index("ix_users_last_activity_at_id", "last_activity_at", "id"),
+        {'extend_existing': True},  # Remove error from redefining table
+    )
 
     id = Column(Integer, primary_key=True, index=True)  # Unique user ID
     email = Column(String(255), unique=True, index=True, nullable=False)  # Email (unique)
@@ -3,21 +3,62 @@ CRUD functions for working with users in the database.
 
 The following are implemented here:
 - Getting a user by ID
-- Getting a list of users with filtering and sorting
+- Getting a list of users with filtering and sorting (keyset pages or a stream)
 - Updating a user profile
 - Getting the current user balance
 - Changing the user balance
+- Changing the user role
+
+Every function that writes a user row calls user_changed() after commit,
+so cached copies of the user are dropped in all workers. Block, delete and
+role change call user_security_changed() instead, which also revokes the
+user's tokens.
+
+Hot queries are prebuilt statements with bound parameters (USER_BY_ID,
+...). The same statement object is executed on every call, so its
+construction and SQL cache key are paid once per process and SQLAlchemy's
+compiled cache always hits. Compare with
+benchmarks/bench_repository_statements.py.
+
+Listings select plain columns, not ORM objects. They are read either as
+keyset pages (the rows after a cursor position (sort value, id); cost
+does not grow with the page number) or as a stream from a server-side
+cursor, so no call holds the whole users table in memory.
 """
 
-from sqlalchemy import select, asc, desc, update
+from sqlalchemy import bindparam, select, asc, desc, tuple_, update
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.exc import NoResultFound
-from typing import List, Optional
-from fastapi_auth_service.app.models.user import User
+from typing import AsyncIterator, Dict, List, Optional, Tuple
+from fastapi_auth_service.app.models.user import User, UserRoleEnum
+from fastapi_auth_service.app.services.user_events import user_changed, user_security_changed
 from datetime import datetime
 from fastapi import HTTPException
 
 
+# Prebuilt statements of the hot paths; execute with {"user_id": ...} / {"email": ...}
+USER_BY_ID = select(User).where(User.id == bindparam("user_id"))
+USER_BY_EMAIL = select(User).where(User.email == bindparam("email"))
+BALANCE_BY_ID = select(User.balance).where(User.id == bindparam("user_id"))
+
+# Columns of the admin listings
+LISTING_COLUMNS = (
+    User.id, User.first_name, User.last_name, User.created_at, User.updated_at,
+    User.last_activity_at, User.is_blocked, User.blocked_at, User.role, User.balance,
+)
+DELETED_COLUMNS = (
+    User.id, User.email, User.first_name, User.last_name, User.role, User.balance,
+    User.created_at, User.updated_at,
+)
+DELETED_USERS = select(*DELETED_COLUMNS).where(User.is_deleted == True).order_by(User.id)
+
+# sort_by options of the listing; id breaks ties, so the order is total
+SORT_COLUMNS = {"id": User.id, "balance": User.balance, "last_activity_at": User.last_activity_at}
+
+# Rows fetched per round trip when streaming
+STREAM_BATCH_SIZE = 500
+
+
 async def get_user_by_id(user_id: int, session: AsyncSession) -> Optional[User]:
     """
     Get user from database by ID.
@@ -27,27 +68,28 @@ async def get_user_by_id(user_id: int, session: AsyncSession) -> Optional[User]:
     :return: user object or None if not found
     """
 
-    query = select(User).where(User.id == user_id)  # Building an SQL query
-    result = await session.execute(query)  # We carry out
+    result = await session.execute(USER_BY_ID, {"user_id": user_id})  # We carry out
     user = result.scalar_one_or_none()  # We get one user
     return user
 
 
-async def get_users_filtered_sorted(
-        session: AsyncSession,
-        filters: dict,
-        sort_by: str = "id",
-        sort_order: str = "asc"
-) -> List[User]:
-    """
-    Get all users with filtering and sorting
-    :param session: Asynchronous SQLAlchemy session
-    :param filters: Filter dictionary (id, first_name, last_name, is_blocked)
-    :param sort_by: Sort field (id, balance, last_activity_at)
-    :param sort_order: Sort direction ("asc" or "desc")
-    :return: List of users as dictionaries
-    """
-    query = select(User)  # Let's start building a query
+def _listing_row(row) -> dict:
+    return {
+        "user_id": row.id,
+        "first_name": row.first_name,
+        "last_name": row.last_name,
+        "created_at": row.created_at,
+        "updated_at": row.updated_at,
+        "last_activity_at": row.last_activity_at,
+        "block": row.is_blocked,
+        "block_at": row.blocked_at,
+        "role": row.role,
+        "balance": row.balance
+    }
+
+
+def _listing_query(filters: dict, sort_by: str, sort_order: str):
+    query = select(*LISTING_COLUMNS)  # Let's start building a query
     # Applying filters
     if "id" in filters:
         query = query.where(User.id == filters["id"])
@@ -64,30 +106,93 @@ async def get_users_filtered_sorted(
 
     # Apply sorting
     # if an invalid field is passed - sort by id
-    sort_column = getattr(User, sort_by, User.id)
+    sort_column = SORT_COLUMNS.get(sort_by, User.id)
     sort_fn = asc if sort_order.lower() == "asc" else desc
-    query = query.order_by(sort_fn(sort_column))
+    return query.order_by(sort_fn(sort_column), sort_fn(User.id))
 
-    # We execute the request
-    result = await session.execute(query)
-    users = result.scalars().all()
 
-    # We form a list of users in dictionary format
-    return {
-        user.id: {
-            "user_id": user.id,
-            "first_name": user.first_name,
-            "last_name": user.last_name,
-            "created_at": user.created_at,
-            "updated_at": user.updated_at,
-            "last_activity_at": user.last_activity_at,
-            "block": user.is_blocked,
-            "block_at": user.blocked_at,
-            "role": user.role,
-            "balance": user.balance
-        }
-        for user in users
-    }
+async def get_users_filtered_sorted(
+        session: AsyncSession,
+        filters: dict,
+        sort_by: str = "id",
+        sort_order: str = "asc"
+) -> Dict[int, dict]:
+    """
+    Get all users with filtering and sorting
+    :param session: Asynchronous SQLAlchemy session
+    :param filters: Filter dictionary (id, first_name, last_name, is_blocked)
+    :param sort_by: Sort field (id, balance, last_activity_at)
+    :param sort_order: Sort direction ("asc" or "desc")
+    :return: Users as dictionaries by id
+    """
+    result = await session.execute(_listing_query(filters, sort_by, sort_order))
+    return {row.id: _listing_row(row) for row in result}
+
+
+def _position_value(sort_column, value):
+    """Sort value of a cursor position, checked against the column it was made for."""
+    if sort_column is User.id:
+        return None
+    if sort_column is User.balance and isinstance(value, int) and not isinstance(value, bool):
+        return value
+    if sort_column is User.last_activity_at and isinstance(value, str):
+        return datetime.fromisoformat(value)  # ValueError if malformed
+    raise ValueError("Invalid cursor")
+
+
+async def get_users_page(
+        session: AsyncSession,
+        filters: dict,
+        sort_by: str,
+        sort_order: str,
+        limit: int,
+        position: Optional[dict] = None
+) -> Tuple[Dict[int, dict], Optional[dict]]:
+    """
+    One keyset page of the filtered and sorted users.
+
+    :param limit: Max users in the page
+    :param position: Where the previous page ended (the second element returned by the previous call)
+    :return: (users as dictionaries by id, position after this page or None if it is the last one)
+    :raises ValueError: The position was made for another sort
+    """
+    sort = f"{sort_by}:{sort_order}"
+    sort_column = SORT_COLUMNS.get(sort_by, User.id)
+    query = _listing_query(filters, sort_by, sort_order)
+    if position is not None:
+        if position.get("sort") != sort or not isinstance(position.get("id"), int):
+            raise ValueError("Cursor does not match the sort order")
+        value = _position_value(sort_column, position.get("value"))
+        if sort_column is User.id:
+            key, after = User.id, position["id"]
+        else:
+            key, after = tuple_(sort_column, User.id), (value, position["id"])
+        query = query.where(key > after if sort_order.lower() == "asc" else key < after)
+
+    # One extra row tells whether there is a next page
+    rows = (await session.execute(query.limit(limit + 1))).all()
+    next_position = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        last = rows[-1]
+        next_position = {"sort": sort, "value": getattr(last, sort_column.key), "id": last.id}
+    return {row.id: _listing_row(row) for row in rows}, next_position
+
+
+async def stream_users(
+        session: AsyncSession,
+        filters: dict,
+        sort_by: str = "id",
+        sort_order: str = "asc"
+) -> AsyncIterator[Tuple[int, dict]]:
+    """
+    All filtered and sorted users, read from a server-side cursor in
+    batches of STREAM_BATCH_SIZE: (id, user as dictionary).
+    """
+    query = _listing_query(filters, sort_by, sort_order).execution_options(yield_per=STREAM_BATCH_SIZE)
+    result = await session.stream(query)
+    async for row in result:
+        yield row.id, _listing_row(row)
 
 
 async def update_user(user_id: int, updates: dict, session: AsyncSession) -> Optional[User]:
@@ -124,9 +229,10 @@ async def update_user(user_id: int, updates: dict, session: AsyncSession) -> Opt
 
     # Commit the changes
     await session.commit()
+    await user_changed(user_id)
 
     # We receive an updated user
-    result = await session.execute(select(User).where(User.id == user_id))
+    result = await session.execute(USER_BY_ID, {"user_id": user_id})
     user = result.scalar_one_or_none()
     return user
 
@@ -138,12 +244,8 @@ async def get_balance(user_id: int, session: AsyncSession) -> Optional[int]:
     :param session: SQLAlchemy asynchronous session
     :return: balance value or None if user not found
     """
-    result = await session.execute(select(User).where(User.id == user_id))
-    user = result.scalar_one_or_none()
-
-    if user:
-        return user.balance
-    return None
+    result = await session.execute(BALANCE_BY_ID, {"user_id": user_id})
+    return result.scalar_one_or_none()
 
 
 async def update_balance(user_id: int, amount: int, session: AsyncSession) -> Optional[int]:
@@ -161,7 +263,7 @@ async def update_balance(user_id: int, amount: int, session: AsyncSession) -> Op
     :return: New balance or None
     """
     # Getting the user
-    result = await session.execute(select(User).where(User.id == user_id))
+    result = await session.execute(USER_BY_ID, {"user_id": user_id})
     user = result.scalar_one_or_none()
 
     if user is None:
@@ -185,6 +287,7 @@ async def update_balance(user_id: int, amount: int, session: AsyncSession) -> Op
     user.balance = new_balance
     user.updated_at = datetime.utcnow()
     await session.commit()
+    await user_changed(user_id)
 
     return new_balance
 
@@ -197,7 +300,7 @@ async def set_block_status(user_id: int, block: bool, session: AsyncSession) ->
     :param session: session
     :return: True/False - whether the update was successful
     """
-    result = await session.execute(select(User).where(User.id == user_id))
+    result = await session.execute(USER_BY_ID, {"user_id": user_id})
     user = result.scalar_one_or_none()
 
     if not user:
@@ -206,6 +309,10 @@ async def set_block_status(user_id: int, block: bool, session: AsyncSession) ->
     user.is_blocked = block
     user.updated_at = datetime.utcnow()
     await session.commit()
+    if block:
+        await user_security_changed(user_id)
+    else:
+        await user_changed(user_id)
     return True
 
 
@@ -216,7 +323,7 @@ async def soft_delete_user(user_id: int, session: AsyncSession) -> bool:
     :param sesson: asynchronous session
     :return: True if user found and deleted; False if not found
     """
-    result = await session.execute(select(User).where(User.id == user_id))
+    result = await session.execute(USER_BY_ID, {"user_id": user_id})
     user = result.scalar_one_or_none()
 
     if not user:
@@ -225,10 +332,63 @@ async def soft_delete_user(user_id: int, session: AsyncSession) -> bool:
     user.is_deleted = True  # Mark as deleted
     user.updated_at = datetime.utcnow()
     await session.commit()
+    await user_security_changed(user_id)
+    return True
+
+
+async def set_user_role(user_id: int, role: UserRoleEnum, session: AsyncSession) -> bool:
+    """
+    Change user role (admin / user)
+    :param user_id: User ID
+    :param role: New role
+    :param session: asynchronous session
+    :return: True if user found and updated; False if not found
+    """
+    result = await session.execute(USER_BY_ID, {"user_id": user_id})
+    user = result.scalar_one_or_none()
+
+    if not user:
+        return False
+
+    user.role = role
+    user.updated_at = datetime.utcnow()
+    await session.commit()
+    await user_security_changed(user_id)
     return True
 
 
-async def get_deleted_users(session: AsyncSession):
-    query = select(User).where(User.is_deleted == True)
-    result = await session.execute(query)
-    return result.scalars().all()
+def _deleted_row(row) -> dict:
+    return dict(row._mapping)
+
+
+async def get_deleted_users(session: AsyncSession) -> List[dict]:
+    result = await session.execute(DELETED_USERS)
+    return [_deleted_row(row) for row in result]
+
+
+async def get_deleted_users_page(
+        session: AsyncSession, limit: int, position: Optional[dict] = None) -> Tuple[List[dict], Optional[dict]]:
+    """
+    One keyset page of deleted users, by id.
+
+    :return: (users, position after this page or None if it is the last one)
+    :raises ValueError: Malformed position
+    """
+    query = DELETED_USERS
+    if position is not None:
+        if position.get("sort") != "id:asc" or not isinstance(position.get("id"), int):
+            raise ValueError("Invalid cursor")
+        query = query.where(User.id > position["id"])
+    rows = (await session.execute(query.limit(limit + 1))).all()
+    next_position = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_position = {"sort": "id:asc", "id": rows[-1].id}
+    return [_deleted_row(row) for row in rows], next_position
+
+
+async def stream_deleted_users(session: AsyncSession) -> AsyncIterator[dict]:
+    """All deleted users from a server-side cursor."""
+    result = await session.stream(DELETED_USERS.execution_options(yield_per=STREAM_BATCH_SIZE))
+    async for row in result:
+        yield _deleted_row(row)
@@ -1,24 +1,25 @@
 from fastapi import APIRouter, Depends, HTTPException, status
-from fastapi_auth_service.app.models.user import User
+from fastapi_auth_service.app.utils.security import TokenPrincipal
 from fastapi_auth_service.app.core.dependencies import is_admin
 
 from sqlalchemy.ext.asyncio import AsyncSession
 from fastapi_auth_service.app.database import get_async_session
 from fastapi_auth_service.app.repositories import user as user_crud
+from fastapi_auth_service.app.core.metrics import metrics
 
 
 router = APIRouter(tags=["Admin Panel"])
 
 
 @router.get("/check", summary="Checking Administrator Access")
-async def check_admin_access(current_user: User = Depends(is_admin)):
+async def check_admin_access(current_user: TokenPrincipal = Depends(is_admin)):
     return {"message": f"Welcome, admin {current_user.email}!"}
 
 
 @router.post("/block/{user_id}")
 async def block_user(
         user_id: int,
-        current_user: User = Depends(is_admin),
+        current_user: TokenPrincipal = Depends(is_admin),
         session: AsyncSession = Depends(get_async_session)
 ):
     success = await user_crud.set_block_status(user_id, True, session)
@@ -30,10 +31,15 @@ async def block_user(
 @router.post("/unblock/{user_id}")
 async def unblock_user(
         user_id: int,
-        current_user: User = Depends(is_admin),
+        current_user: TokenPrincipal = Depends(is_admin),
         session: AsyncSession = Depends(get_async_session)
 ):
     success = await user_crud.set_block_status(user_id, False, session)
     if not success:
         raise HTTPException(status_code=404, detail="User not found")
     return {"message": f"User {user_id} has been unblocked."}
+
+
+@router.get("/metrics", summary="In-process metrics of this worker")
+async def get_metrics(current_user: TokenPrincipal = Depends(is_admin)):
+    return {"metrics": metrics.snapshot()}
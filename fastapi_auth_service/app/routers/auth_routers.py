@@ -1,26 +1,45 @@
-from fastapi import APIRouter, HTTPException, status, Depends
+import hmac
+from typing import List, Optional
+
+from fastapi import APIRouter, HTTPException, status, Depends, Header, Request
 from fastapi.security import OAuth2PasswordRequestForm
 from datetime import timedelta
 
 from fastapi_auth_service.app.schemas.user import UserCreate, PasswordChange, UserRegisterResponse
+from fastapi_auth_service.app.schemas.token import IntrospectionRequest, IntrospectionResponse, SessionOut
 from fastapi_auth_service.app.services.auth_service import (
     register_user,
     authenticate_user,
     change_user_password,
+    create_and_store_tokens,
+    issue_token_pair,
 )
-from fastapi_auth_service.app.services.token_cache import (
-    store_access_token,
-    store_refresh_token,
-    delete_access_token,
-    is_access_token_valid, is_refresh_token_valid,
+from fastapi_auth_service.app.services.token_cache import delete_access_token, lookup_opaque_token
+from fastapi_auth_service.app.services.login_throttle import (
+    client_ip,
+    enforce_login_throttle,
+    reset_login_attempts,
 )
 from fastapi_auth_service.app.utils.security import (
+    authenticate_token,
     decode_access_token,
     decode_refresh_token,
-    create_access_token,
-    create_refresh_token,
+    get_token_principal,
     oauth2_scheme,
+    TokenPrincipal,
+)
+from fastapi_auth_service.app.utils.opaque_tokens import is_opaque_token
+from fastapi_auth_service.app.services.user_sessions import (
+    end_session,
+    list_sessions,
+    new_session_id,
+    rotate_refresh_token,
+    REFRESH_OK,
+    REFRESH_REUSED,
+    REFRESH_REVOKED,
 )
+from fastapi_auth_service.app.services.user_events import user_security_changed
+from fastapi_auth_service.app.services.token_introspection import introspect_tokens
 
 from fastapi_auth_service.app.database import get_async_session
 from sqlalchemy.ext.asyncio import AsyncSession
@@ -42,13 +61,20 @@ async def register(user: UserCreate, session: AsyncSession = Depends(get_async_s
 # Login
 @router.post("/login")
 async def login(
+    request: Request,
     form_data: OAuth2PasswordRequestForm = Depends(),
     session: AsyncSession = Depends(get_async_session)
 ):
+    # Reject over-limit attempts before touching Postgres or bcrypt
+    ip = client_ip(request)
+    await enforce_login_throttle(form_data.username, ip)
+
     user = await authenticate_user(form_data.username, form_data.password, session=session)
     if not user:
         raise HTTPException(status_code=401, detail="Invalid credentials")
 
+    await reset_login_attempts(form_data.username)
+
     # Attempt to increase user balance
     try:
         await user_crud.update_balance(user.id, 100, session)
@@ -57,28 +83,39 @@ async def login(
         # We'll just log it or ignore it so that the login doesn't break.
         print(f"Failed to update balance for user {user.id}: {str(e)}")
 
-    # Generate a token only after all operations
-    access_token = create_access_token(data={"sub": str(user.id)})
-    refresh_token = create_refresh_token(data={"sub": str(user.id)})
+    # Generate tokens only after all operations and store them in Redis (one round trip)
+    return await create_and_store_tokens(
+        user, client_ip=ip, user_agent=request.headers.get("user-agent"))
 
-    # Storing tokens in Redis with their lifetime
-    await store_access_token(access_token, user.id)
-    await store_refresh_token(refresh_token, user.id)
 
-    return {
-        "access_token": access_token,
-        "refresh_token": refresh_token,
-        "token_type": "bearer"
-    }
-
-
-# Logout
+# Logout: ends the token's session (its refresh token too)
 @router.post("/logout")
 async def logout(token: str = Depends(oauth2_scheme)):
-    await delete_access_token(token)
+    payload = await lookup_opaque_token(token) if is_opaque_token(token) else decode_access_token(token)
+    if payload and payload.get("sub"):
+        await delete_access_token(token, int(payload["sub"]))
+        if payload.get("sid"):
+            await end_session(int(payload["sub"]), payload["sid"])
     return {"message": "Logged out"}
 
 
+# Logout everywhere: revokes every session and token of the user
+@router.post("/logout-all")
+async def logout_all(current_user: TokenPrincipal = Depends(get_token_principal)):
+    await user_security_changed(current_user.id)
+    return {"message": "Logged out from all sessions"}
+
+
+# Sessions of the current user
+@router.get("/sessions", response_model=List[SessionOut])
+async def get_sessions(current_user: TokenPrincipal = Depends(get_token_principal)):
+    sessions = await list_sessions(current_user.id)
+    return [
+        {**session, "current": session["sid"] == current_user.sid}
+        for session in sessions
+    ]
+
+
 # Change password
 @router.post("/change-password")
 async def change_password(data: PasswordChange, session: AsyncSession = Depends(get_async_session)):
@@ -89,18 +126,36 @@ async def change_password(data: PasswordChange, session: AsyncSession = Depends(
 # Token verification
 @router.get("/me")
 async def get_me(token: str = Depends(oauth2_scheme)):
-    # Check: Token must be in Redis
-    if not await is_access_token_valid(token):
+    if settings.SESSION_SLIDING_ENABLED:
+        # The same check as every other endpoint, so an active session slides here too
+        payload = await authenticate_token(token)
+        return {"user_id": payload["sub"]}
+
+    # Signature, Redis key (logout) and security epoch (revocation) in one round trip
+    result, = await introspect_tokens([token])
+    if not result["active"]:
         raise HTTPException(
             status_code=401, detail="Token is invalid or expired")
 
-    # Additionally, we check the validity of the token (decode)
-    payload = decode_access_token(token)
-    if not payload or "sub" not in payload:
+    return {"user_id": result["sub"]}
+
+
+# Batch token verification for gateways: one call and one Redis round trip per batch
+# (enabled by INTROSPECTION_API_KEY, callers send it in X-API-Key)
+@router.post("/introspect", response_model=IntrospectionResponse, response_model_exclude_none=True)
+async def introspect(
+    request: IntrospectionRequest,
+    x_api_key: Optional[str] = Header(default=None),
+):
+    expected = settings.INTROSPECTION_API_KEY
+    if not expected:
+        # Off unless a key is configured: it reveals sub, email and role of any token
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Not found")
+    if not hmac.compare_digest((x_api_key or "").encode(), expected.encode()):
         raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid token")
+            status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid API key")
 
-    return {"user_id": payload["sub"]}
+    return {"results": await introspect_tokens(request.tokens)}
 
 #  Pydantic Schema for Token Refresh Request
 
@@ -109,20 +164,35 @@ class TokenRefreshRequest(BaseModel):
     refresh_token: str
 
 
-#  Refresh access_token by refresh_token
+#  Refresh: a new access token and a new (rotated) refresh token
 @router.post("/refresh")
 async def refresh_token(request: TokenRefreshRequest):
-    payload = decode_refresh_token(request.refresh_token)
-    if not payload or "sub" not in payload:
+    if is_opaque_token(request.refresh_token):
+        payload = await lookup_opaque_token(request.refresh_token, refresh=True)
+    else:
+        payload = decode_refresh_token(request.refresh_token)
+    if not payload or "sub" not in payload or "exp" not in payload:
         raise HTTPException(status_code=401, detail="Invalid refresh token")
 
-    # Checking the validity of a refresh token in Redis
-    if not await is_refresh_token_valid(request.refresh_token):
+    # New pair (in the configured TOKEN_FORMAT) with the same claims; tokens from before sessions start one
+    claims = {key: payload[key] for key in ("sub", "role", "email", "epoch", "sid") if key in payload}
+    claims.setdefault("sid", new_session_id())
+    expires_at = int(payload["exp"])
+    new_access_token, new_refresh_token, record = issue_token_pair(claims, expires_at)
+
+    # One atomic Redis step: the refresh token must be the session's current one
+    # (a replayed older one revokes the session) and not issued before a
+    # block / delete / role or password change
+    result = await rotate_refresh_token(
+        int(payload["sub"]), claims["sid"], request.refresh_token, int(payload.get("epoch", 0)),
+        new_access_token, new_refresh_token, expires_at, new_session="sid" not in payload, record=record)
+    if result == REFRESH_REVOKED:
+        raise HTTPException(status_code=401, detail="Token has been revoked")
+    if result == REFRESH_REUSED:
+        raise HTTPException(
+            status_code=401, detail="Refresh token has already been used, session revoked")
+    if result != REFRESH_OK:
         raise HTTPException(
             status_code=401, detail="Refresh token is invalid or expired")
 
-    # Create a new access_token
-    new_access_token = create_access_token(data={"sub": payload["sub"]})
-    await store_access_token(new_access_token, int(payload["sub"]))
-
-    return {"access_token": new_access_token, "token_type": "bearer"}
+    return {"access_token": new_access_token, "refresh_token": new_refresh_token, "token_type": "bearer"}
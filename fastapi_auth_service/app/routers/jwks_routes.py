@@ -0,0 +1,18 @@
+from fastapi import APIRouter
+from fastapi.responses import JSONResponse
+
+from fastapi_auth_service.app.core.settings import settings
+from fastapi_auth_service.app.utils.security import key_ring
+
+
+router = APIRouter(tags=["Keys"])
+
+
+# Public keys for verifying tokens locally (empty with HS256 signing)
+@router.get("/.well-known/jwks.json", summary="JSON Web Key Set")
+async def jwks():
+    content = key_ring.jwks() if key_ring is not None else {"keys": []}
+    return JSONResponse(
+        content=content,
+        headers={"Cache-Control": f"public, max-age={settings.JWKS_MAX_AGE_SECONDS}"},
+    )
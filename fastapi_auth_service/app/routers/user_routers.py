@@ -3,11 +3,17 @@ from sqlalchemy.ext.asyncio import AsyncSession
 from typing import Optional, List, Literal
 
 from fastapi import Depends
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, StreamingResponse
 from fastapi_auth_service.app.repositories import user as user_crud
-from fastapi_auth_service.app.database import get_async_session
+from fastapi_auth_service.app.database import get_async_session, get_read_session, read_session_factory
+from fastapi_auth_service.app.utils.pagination import (
+    decode_cursor,
+    encode_cursor,
+    json_array_stream,
+    json_object_stream,
+)
 from fastapi_auth_service.app.schemas.user import UserOut, UserUpdate, BalanceUpdate
-from fastapi_auth_service.app.utils.security import get_current_user
+from fastapi_auth_service.app.utils.security import get_current_user, TokenPrincipal
 from fastapi_auth_service.app.models.user import User
 
 from fastapi_auth_service.app.core.dependencies import is_admin
@@ -17,6 +23,31 @@ from fastapi.encoders import jsonable_encoder
 # Route prefix /users
 router = APIRouter(tags=["Users"])
 
+# Max page size of the admin listings
+MAX_PAGE_SIZE = 1000
+
+
+async def _read_stream(stream, *args):
+    """
+    Items of a repository stream, read in a session of its own: the
+    response body is sent after the request's dependencies are closed.
+    """
+    async with read_session_factory() as session:
+        async for item in stream(session, *args):
+            yield item
+
+
+def _page_position(cursor: Optional[str]) -> Optional[dict]:
+    try:
+        return decode_cursor(cursor) if cursor else None
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+def _check_stream(stream: bool, limit: Optional[int], cursor: Optional[str]) -> None:
+    if stream and (limit is not None or cursor is not None):
+        raise HTTPException(status_code=400, detail="stream cannot be combined with limit/cursor")
+
 # GET endpoint at /users/
 
 
@@ -28,8 +59,10 @@ async def get_users(
     is_blocked: Optional[bool] = Query(None),
     sort_by: Literal["id", "balance", "last_activity_at"] = Query("id"),
     sort_order: Literal["asc", "desc"] = Query("asc"),
-    session: AsyncSession = Depends(get_async_session),
-    current_user: User = Depends(is_admin)
+    limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = Query(None),
+    stream: bool = Query(False),
+    current_user: TokenPrincipal = Depends(is_admin)
 ):
     """
     Get user dictionary:
@@ -39,7 +72,14 @@ async def get_users(
             "2": {user_data...}
         }
     }
+
+    With `limit`/`cursor` the response is one keyset page plus "next_cursor"
+    (null on the last page); pass it back as `cursor` with the same filters
+    and sort. `stream=true` sends all users as they are read from a
+    server-side cursor; a database error mid-way then truncates the body
+    after the 200 status, so clients must check that it parses.
     """
+    _check_stream(stream, limit, cursor)
 
     # Create a dictionary of filters to pass to the repositories function
     filters = {}
@@ -54,16 +94,35 @@ async def get_users(
     if is_blocked is not None:
         filters["is_blocked"] = is_blocked
 
-    # We receive filtered and sorted users from the database
-    users = await user_crud.get_users_filtered_sorted(session, filters, sort_by, sort_order)
+    if stream:
+        # Rows go to the response as they are read, nothing is materialized
+        rows = _read_stream(user_crud.stream_users, filters, sort_by, sort_order)
+        return StreamingResponse(json_object_stream("users", rows), media_type="application/json")
+
+    # Opened here, not injected: the stream=true path reads in a session of its own
+    async with read_session_factory() as session:
+        if limit is None and cursor is None:
+            # We receive filtered and sorted users from the database
+            users = await user_crud.get_users_filtered_sorted(session, filters, sort_by, sort_order)
+            return JSONResponse(content={"users": jsonable_encoder(users)})
+
+        # We receive one page of filtered and sorted users from the database
+        try:
+            users, next_position = await user_crud.get_users_page(
+                session, filters, sort_by, sort_order, limit or MAX_PAGE_SIZE, _page_position(cursor))
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
 
-    return JSONResponse(content={"users": jsonable_encoder(users)})
+    return JSONResponse(content={
+        "users": jsonable_encoder(users),
+        "next_cursor": encode_cursor(next_position) if next_position else None,
+    })
 
 
 @router.get("/balance")
 async def get_balance(
         current_user: User = Depends(get_current_user),
-        session: AsyncSession = Depends(get_async_session)
+        session: AsyncSession = Depends(get_read_session)
 ):
     """
     Get the user's current balance.
@@ -164,8 +223,30 @@ async def delete_my_account(
 
 @router.get("/deleted", summary="Get list of deleted users")
 async def get_deleted_users(
-        session: AsyncSession = Depends(get_async_session),
-        current_user: User = Depends(is_admin)
+        limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE),
+        cursor: Optional[str] = Query(None),
+        stream: bool = Query(False),
+        current_user: TokenPrincipal = Depends(is_admin)
 ):
-    users = await user_crud.get_deleted_users(session)
-    return {"deleted_users": jsonable_encoder(users)}
+    """
+    Like GET /users/: keyset pages by id with `limit`/`cursor`, `stream=true` to stream.
+    """
+    _check_stream(stream, limit, cursor)
+    if stream:
+        rows = _read_stream(user_crud.stream_deleted_users)
+        return StreamingResponse(json_array_stream("deleted_users", rows), media_type="application/json")
+
+    async with read_session_factory() as session:
+        if limit is None and cursor is None:
+            users = await user_crud.get_deleted_users(session)
+            return {"deleted_users": jsonable_encoder(users)}
+
+        try:
+            users, next_position = await user_crud.get_deleted_users_page(
+                session, limit or MAX_PAGE_SIZE, _page_position(cursor))
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+    return {
+        "deleted_users": jsonable_encoder(users),
+        "next_cursor": encode_cursor(next_position) if next_position else None,
+    }
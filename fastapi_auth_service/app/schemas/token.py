@@ -0,0 +1,38 @@
+"""
+📦 Pydantic schemas for token introspection (POST /auth/introspect)
+and the user's sessions (GET /auth/sessions)
+"""
+
+from typing import List, Optional
+
+from pydantic import BaseModel, Field
+
+from fastapi_auth_service.app.core.settings import settings
+
+
+# ✅ Scheme: Batch of tokens to check
+class IntrospectionRequest(BaseModel):
+    tokens: List[str] = Field(..., min_length=1, max_length=settings.INTROSPECTION_MAX_TOKENS)
+
+
+# ✅ Scheme: State of one token (same order as in the request)
+class TokenIntrospection(BaseModel):
+    active: bool
+    sub: Optional[str] = None
+    role: Optional[str] = None
+    email: Optional[str] = None
+    exp: Optional[int] = None
+
+
+class IntrospectionResponse(BaseModel):
+    results: List[TokenIntrospection]
+
+
+# ✅ Scheme: One login session of the current user
+class SessionOut(BaseModel):
+    sid: str
+    created_at: int
+    expires_at: int
+    ip: Optional[str] = None
+    user_agent: Optional[str] = None
+    current: bool = False
@@ -1,7 +1,11 @@
-from typing import Optional
+import asyncio
+import logging
+import time
+from datetime import datetime
+from typing import Optional, Tuple
 from fastapi import HTTPException
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select
+from sqlalchemy import update
 
 from fastapi_auth_service.app.schemas.user import (
     UserCreate,
@@ -10,27 +14,41 @@ from fastapi_auth_service.app.schemas.user import (
     UserRegisterResponse
 )
 from fastapi_auth_service.app.utils.security import (
-    hash_password,
-    verify_password,
+    hash_password_async,
+    verify_password_async,
     create_access_token,
-    create_refresh_token
+    create_refresh_token,
+    build_token_claims,
 )
+from fastapi_auth_service.app.utils.passwords import password_needs_rehash
+from fastapi_auth_service.app.utils.opaque_tokens import encode_record, new_opaque_token
+from fastapi_auth_service.app.core.settings import settings
+from fastapi_auth_service.app.database import async_session_factory, release_connection
 from fastapi_auth_service.app.models.user import User, UserRoleEnum
-from fastapi_auth_service.app.services.token_cache import (
-    store_access_token,
-    store_refresh_token,
-)
+from fastapi_auth_service.app.repositories.user import USER_BY_EMAIL
+from fastapi_auth_service.app.services.user_events import user_changed, user_security_changed
+from fastapi_auth_service.app.services.user_sessions import new_session_id, start_session
+from fastapi_auth_service.app.services.token_cache import REFRESH_TOKEN_EXPIRE_SECONDS
+from fastapi_auth_service.app.services.user_epoch import get_user_epoch
+
+
+logger = logging.getLogger(__name__)
+
+# Strong references to background rehash tasks (asyncio keeps only weak ones)
+_rehash_tasks = set()
 
 
 # ✅ User registration
 async def register_user(user: UserCreate, session: AsyncSession) -> UserRegisterResponse:
-    result = await session.execute(select(User).where(User.email == user.email))
+    result = await session.execute(USER_BY_EMAIL, {"email": user.email})
     existing_user = result.scalar_one_or_none()
+    # No connection is held while the password is hashed
+    await release_connection(session)
 
     if existing_user:
         if existing_user.is_deleted:
             # Recovering a deleted user
-            existing_user.hashed_password = hash_password(user.password)
+            existing_user.hashed_password = await hash_password_async(user.password)
             existing_user.is_deleted = False
             existing_user.first_name = None
             existing_user.last_name = None
@@ -39,13 +57,14 @@ async def register_user(user: UserCreate, session: AsyncSession) -> UserRegister
             existing_user.last_activity_at = None
             existing_user.blocked_at = None
             await session.commit()
+            await user_changed(existing_user.id)
             return UserRegisterResponse(email=existing_user.email)
 
         raise HTTPException(
             status_code=400, detail="A user with this email already exists")
 
     # New user registration
-    hashed_pw = hash_password(user.password)
+    hashed_pw = await hash_password_async(user.password)
     new_user = User(email=user.email, hashed_password=hashed_pw,
                     role=UserRoleEnum.user)
     session.add(new_user)
@@ -58,7 +77,7 @@ async def register_user(user: UserCreate, session: AsyncSession) -> UserRegister
 # ✅ User authentication
 async def authenticate_user(email: str, password: str, session: AsyncSession) -> Optional[UserOut]:
     async with session.begin():
-        result = await session.execute(select(User).where(User.email == email))
+        result = await session.execute(USER_BY_EMAIL, {"email": email})
         user = result.scalar_one_or_none()
 
     if not user:
@@ -73,9 +92,13 @@ async def authenticate_user(email: str, password: str, session: AsyncSession) ->
         raise HTTPException(
             status_code=403, detail="Your account has been deleted.")
 
-    if not verify_password(password, user.hashed_password):
+    if not await verify_password_async(password, user.hashed_password):
         return None
 
+    # Hash made with an old scheme or cost: upgrade it without delaying the login
+    if password_needs_rehash(user.hashed_password):
+        schedule_password_rehash(user.id, password, user.hashed_password)
+
     return UserOut(
         id=user.id,
         email=user.email,
@@ -89,16 +112,67 @@ async def authenticate_user(email: str, password: str, session: AsyncSession) ->
         role=user.role
     )
 
-# ✅ Generating and storing tokens
+# ✅ Lazy password rehash (off the request path)
+
 
+def schedule_password_rehash(user_id: int, password: str, old_hash: str) -> None:
+    task = asyncio.create_task(_rehash_password(user_id, password, old_hash))
+    _rehash_tasks.add(task)
+    task.add_done_callback(_rehash_tasks.discard)
 
-async def create_and_store_tokens(user_id: int) -> dict:
-    access_token = create_access_token(user_id)
-    refresh_token = create_refresh_token(user_id)
 
-    # Storing tokens in Redis with different lifetimes
-    await store_access_token(access_token, user_id)
-    await store_refresh_token(refresh_token, user_id)
+async def _rehash_password(user_id: int, password: str, old_hash: str) -> None:
+    """
+    Re-hash the password with the current parameters and store it.
+
+    The UPDATE only matches the old hash, so a password changed in the
+    meantime is never overwritten.
+    """
+    try:
+        new_hash = await hash_password_async(password)
+        async with async_session_factory() as session:
+            await session.execute(
+                update(User)
+                .where(User.id == user_id, User.hashed_password == old_hash)
+                .values(hashed_password=new_hash)
+            )
+            await session.commit()
+    except Exception as e:
+        # Not critical: the next login will try again
+        logger.warning(f"Password rehash failed for user {user_id}: {e}")
+
+# ✅ Generating and storing tokens
+
+
+def issue_token_pair(claims: dict, expires_at: int) -> Tuple[str, str, Optional[str]]:
+    """
+    Access + refresh token in the configured TOKEN_FORMAT.
+
+    :param expires_at: Expiry of the refresh token (unix time)
+    :return: (access token, refresh token, claims record to store for opaque tokens or None)
+    """
+    if settings.TOKEN_FORMAT == "opaque":
+        user_id = int(claims["sub"])
+        return new_opaque_token(user_id), new_opaque_token(user_id), encode_record(claims, expires_at)
+    access_token = create_access_token(data=claims)
+    refresh_token = create_refresh_token(
+        data=claims, expires_delta=datetime.utcfromtimestamp(expires_at) - datetime.utcnow())
+    return access_token, refresh_token, None
+
+
+async def create_and_store_tokens(
+    user: User, client_ip: Optional[str] = None, user_agent: Optional[str] = None
+) -> dict:
+    # Role and epoch claims let authorization skip the DB; sid ties both tokens to a session
+    epoch = await get_user_epoch(user.id)
+    sid = new_session_id()
+    claims = build_token_claims(user.id, user.role, user.email, epoch, sid=sid)
+    access_token, refresh_token, record = issue_token_pair(
+        claims, expires_at=int(time.time()) + REFRESH_TOKEN_EXPIRE_SECONDS)
+
+    # Both tokens and the session entry go to Redis in one round trip
+    await start_session(
+        user.id, sid, access_token, refresh_token, ip=client_ip, user_agent=user_agent, record=record)
 
     return {
         "access_token": access_token,
@@ -110,14 +184,20 @@ async def create_and_store_tokens(user_id: int) -> dict:
 # ✅ Change password
 async def change_user_password(data: PasswordChange, session: AsyncSession):
     async with session.begin():
-        result = await session.execute(select(User).where(User.email == data.email))
+        result = await session.execute(USER_BY_EMAIL, {"email": data.email})
         user = result.scalar_one_or_none()
 
-        if not user:
-            raise HTTPException(status_code=404, detail="User not found")
+    if not user:
+        raise HTTPException(status_code=404, detail="User not found")
+
+    # Both hashes run without holding a connection
+    if not await verify_password_async(data.old_password, user.hashed_password):
+        raise HTTPException(
+            status_code=401, detail="Old password is incorrect")
+    new_hash = await hash_password_async(data.new_password)
 
-        if not verify_password(data.old_password, user.hashed_password):
-            raise HTTPException(
-                status_code=401, detail="Old password is incorrect")
+    async with session.begin():
+        user.hashed_password = new_hash
 
-        user.hashed_password = hash_password(data.new_password)
+    # Old tokens must stop working after a password change
+    await user_security_changed(user.id)
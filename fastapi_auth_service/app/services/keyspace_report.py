@@ -0,0 +1,134 @@
+"""
+Memory report for token keys in Redis (`cli.py token-keyspace-report`).
+
+Random keys are sampled with RANDOMKEY, token keys among them are measured
+with MEMORY USAGE, and the counts are extrapolated from DBSIZE. Cheap enough
+to run against production: two pipelined batches of `samples` commands.
+In cluster mode every primary is sampled in proportion to its DBSIZE.
+
+A session costs its access and refresh keys, its field in the user's
+sessions hash and a share of the user's epoch key.
+"""
+
+import asyncio
+from typing import Dict, List, Optional, Tuple
+
+from fastapi_auth_service.app.services.token_cache import (
+    ACCESS_KEY_PREFIX,
+    REFRESH_KEY_PREFIX,
+    LEGACY_ACCESS_KEY_PREFIX,
+    LEGACY_REFRESH_KEY_PREFIX,
+)
+
+
+SESSIONS_KEY_PREFIX = "user_sessions:"
+EPOCH_KEY_PREFIX = "user_epoch:"
+
+# Longest prefixes first: "access_token:" must not be taken for another prefix
+TOKEN_KEY_PREFIXES = (
+    LEGACY_REFRESH_KEY_PREFIX,
+    LEGACY_ACCESS_KEY_PREFIX,
+    SESSIONS_KEY_PREFIX,
+    EPOCH_KEY_PREFIX,
+    REFRESH_KEY_PREFIX,
+    ACCESS_KEY_PREFIX,
+)
+
+# RANDOMKEY calls in flight per cluster node (cluster pipelines need a key)
+CLUSTER_BATCH = 16
+
+
+def _prefix_of(key: str) -> Optional[str]:
+    for prefix in TOKEN_KEY_PREFIXES:
+        if key.startswith(prefix):
+            return prefix
+    return None
+
+
+async def _random_keys(client, samples: int) -> Tuple[int, List[str]]:
+    """
+    :return: (total DBSIZE, sampled keys)
+    """
+    if not hasattr(client, "get_primaries"):
+        dbsize = await client.dbsize()
+        if not dbsize:
+            return 0, []
+        pipe = client.pipeline(transaction=False)
+        for _ in range(samples):
+            pipe.randomkey()
+        return dbsize, [key for key in await pipe.execute() if key is not None]
+
+    # Redis Cluster: DBSIZE and RANDOMKEY only see the node they are sent to
+    nodes = client.get_primaries()
+    sizes = await asyncio.gather(*(client.execute_command("DBSIZE", target_nodes=node) for node in nodes))
+    dbsize = sum(sizes)
+    keys = []
+    for node, size in zip(nodes, sizes):
+        remaining = round(samples * size / dbsize) if dbsize else 0
+        while remaining > 0:
+            batch = min(remaining, CLUSTER_BATCH)
+            keys += await asyncio.gather(
+                *(client.execute_command("RANDOMKEY", target_nodes=node) for _ in range(batch)))
+            remaining -= batch
+    return dbsize, [key for key in keys if key is not None]
+
+
+async def sample_token_keyspace(client, samples: int = 1000) -> Dict:
+    """
+    :param client: Client from build_redis_client() (any REDIS_MODE)
+    :param samples: Number of random keys to look at
+    :return: {"dbsize", "sampled", "prefixes": {prefix: {"sampled", "estimated_keys", "avg_bytes"}},
+              "bytes_per_session": {"current", "legacy"}}
+    """
+    dbsize, keys = await _random_keys(client, samples)
+
+    token_keys = [(key, _prefix_of(key)) for key in keys]
+    token_keys = [(key, prefix) for key, prefix in token_keys if prefix is not None]
+    session_hashes = [key for key, prefix in token_keys if prefix == SESSIONS_KEY_PREFIX]
+
+    pipe = client.pipeline(transaction=False)
+    for key, _ in token_keys:
+        pipe.memory_usage(key, samples=0)
+    for key in session_hashes:
+        pipe.hlen(key)
+    results = await pipe.execute() if token_keys else []
+    usages, fields = results[:len(token_keys)], results[len(token_keys):]
+
+    sizes = {prefix: [] for prefix in TOKEN_KEY_PREFIXES}
+    for (key, prefix), usage in zip(token_keys, usages):
+        if usage is not None:  # the key expired between the two batches
+            sizes[prefix].append(int(usage))
+
+    prefixes = {}
+    for prefix, values in sizes.items():
+        prefixes[prefix] = {
+            "sampled": len(values),
+            "estimated_keys": round(dbsize * len(values) / len(keys)) if keys else 0,
+            "avg_bytes": sum(values) / len(values) if values else None,
+        }
+
+    def _session_bytes(access_prefix: str, refresh_prefix: str) -> Optional[float]:
+        access, refresh = prefixes[access_prefix]["avg_bytes"], prefixes[refresh_prefix]["avg_bytes"]
+        if access is None and refresh is None:
+            return None
+        return (access or 0) + (refresh or 0)
+
+    current = _session_bytes(ACCESS_KEY_PREFIX, REFRESH_KEY_PREFIX)
+    session_fields = sum(fields)
+    if current is not None and session_fields:
+        # The sessions hash and the epoch key are per user: spread them over the user's sessions
+        current += sum(sizes[SESSIONS_KEY_PREFIX]) / session_fields
+        sessions = prefixes[SESSIONS_KEY_PREFIX]["estimated_keys"] * session_fields / len(session_hashes)
+        epoch = prefixes[EPOCH_KEY_PREFIX]
+        if epoch["avg_bytes"] is not None and sessions:
+            current += epoch["avg_bytes"] * epoch["estimated_keys"] / sessions
+
+    return {
+        "dbsize": dbsize,
+        "sampled": len(keys),
+        "prefixes": prefixes,
+        "bytes_per_session": {
+            "current": current,
+            "legacy": _session_bytes(LEGACY_ACCESS_KEY_PREFIX, LEGACY_REFRESH_KEY_PREFIX),
+        },
+    }
@@ -0,0 +1,269 @@
+"""
+Login throttling (credential-stuffing shield).
+
+Every /auth/login attempt costs a DB lookup plus a password hash check, so
+over-limit attempts are rejected before any of that happens. Two layers,
+both keyed per email and per client IP:
+
+1. In-process token bucket - a cheap front filter that absorbs bursts
+   without a network call.
+2. Redis sliding window (sorted set of attempt timestamps) - the shared
+   limit across all workers.
+
+An attempt is recorded only when both the email and the IP limit allow it,
+so spraying one email does not spend the IP's budget and the other way round.
+
+If Redis is unavailable only the local buckets apply (fail open): a Redis
+outage must not lock every user out.
+
+Behind a load balancer the peer address is the proxy's; client_ip() takes
+the client from X-Forwarded-For when the peer is in TRUSTED_PROXIES.
+"""
+
+import asyncio
+import ipaddress
+import logging
+import time
+import uuid
+from collections import OrderedDict
+from functools import lru_cache
+from typing import Optional, Tuple, Union
+
+from fastapi import HTTPException, Request, status
+
+from fastapi_auth_service.app.core.metrics import metrics
+from fastapi_auth_service.app.core.redis import cluster_mode, redis_cache
+from fastapi_auth_service.app.core.settings import settings
+
+
+logger = logging.getLogger(__name__)
+
+# Counters exported via /admin/metrics
+allowed_counter = metrics.counter("login_throttle.allowed")
+blocked_counter = metrics.counter("login_throttle.blocked")
+blocked_local_counter = metrics.counter("login_throttle.blocked_local")
+blocked_redis_counter = metrics.counter("login_throttle.blocked_redis")
+redis_error_counter = metrics.counter("login_throttle.redis_errors")
+
+
+class TokenBucket:
+    """
+    Classic token bucket: `capacity` attempts at once, refilled at `refill_rate` per second.
+    """
+
+    def __init__(self, capacity: float, refill_rate: float) -> None:
+        self.capacity = capacity
+        self.refill_rate = refill_rate
+        self.tokens = capacity
+        self.updated_at = time.monotonic()
+
+    def refill(self) -> None:
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.refill_rate)
+        self.updated_at = now
+
+    def take(self) -> bool:
+        self.refill()
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return True
+        return False
+
+    def retry_after(self) -> float:
+        """Seconds until the next token is available."""
+        if self.tokens >= 1 or self.refill_rate <= 0:
+            return 0.0
+        return (1 - self.tokens) / self.refill_rate
+
+
+class LocalBucketLimiter:
+    """
+    Token buckets per key, bounded in size (least recently used keys are dropped).
+    """
+
+    def __init__(self, capacity: float, refill_rate: float, max_keys: int = 10000) -> None:
+        self.capacity = capacity
+        self.refill_rate = refill_rate
+        self.max_keys = max_keys
+        self._buckets: "OrderedDict[str, TokenBucket]" = OrderedDict()
+
+    def _bucket(self, key: str) -> TokenBucket:
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            bucket = TokenBucket(self.capacity, self.refill_rate)
+            self._buckets[key] = bucket
+            if len(self._buckets) > self.max_keys:
+                self._buckets.popitem(last=False)
+        else:
+            self._buckets.move_to_end(key)
+        return bucket
+
+    def take(self, *keys: str) -> Optional[float]:
+        """
+        Take one token for each key, only if every key has one.
+
+        :return: None if allowed, otherwise seconds to wait
+        """
+        buckets = [self._bucket(key) for key in keys]
+        for bucket in buckets:
+            bucket.refill()
+        waits = [bucket.retry_after() for bucket in buckets if bucket.tokens < 1]
+        if waits:
+            return max(waits)
+        for bucket in buckets:
+            bucket.tokens -= 1
+        return None
+
+
+# Sliding windows in one round trip: drop old attempts from every key and
+# count them; only if all are under their limit (and ARGV[3] is "1") record
+# the attempt in all of them.
+# ARGV: now ms, window ms, record flag, attempt id, then one limit per key.
+# Returns {1, 0} when allowed or {0, ms until the blocking key frees a slot}.
+SLIDING_WINDOW_LUA = """
+local now = tonumber(ARGV[1])
+local window = tonumber(ARGV[2])
+local blocked, wait = false, 0
+for i, key in ipairs(KEYS) do
+    redis.call('ZREMRANGEBYSCORE', key, 0, now - window)
+    if redis.call('ZCARD', key) >= tonumber(ARGV[4 + i]) then
+        local oldest = redis.call('ZRANGE', key, 0, 0, 'WITHSCORES')
+        blocked = true
+        wait = math.max(wait, tonumber(oldest[2]) + window - now)
+    end
+end
+if blocked then
+    return {0, wait}
+end
+if ARGV[3] == '1' then
+    for _, key in ipairs(KEYS) do
+        redis.call('ZADD', key, now, ARGV[4])
+        redis.call('PEXPIRE', key, window)
+    end
+end
+return {1, 0}
+"""
+
+sliding_window_script = redis_cache.register_script(SLIDING_WINDOW_LUA)
+
+local_limiter = LocalBucketLimiter(
+    capacity=settings.LOGIN_BUCKET_CAPACITY,
+    refill_rate=settings.LOGIN_BUCKET_REFILL_PER_SECOND,
+)
+
+
+def _email_key(email: str) -> str:
+    return f"login_attempts:email:{email.strip().lower()}"
+
+
+def _ip_key(ip: str) -> str:
+    return f"login_attempts:ip:{ip}"
+
+
+@lru_cache(maxsize=8)
+def _trusted_networks(trusted_proxies: str) -> Tuple[Union[ipaddress.IPv4Network, ipaddress.IPv6Network], ...]:
+    return tuple(
+        ipaddress.ip_network(item.strip(), strict=False)
+        for item in trusted_proxies.split(",") if item.strip()
+    )
+
+
+def _is_trusted(address: str, networks) -> bool:
+    try:
+        ip = ipaddress.ip_address(address)
+    except ValueError:
+        return False
+    return any(ip in network for network in networks)
+
+
+def client_ip(request: Request) -> str:
+    """
+    Address of the client: the peer, or - if the peer is a trusted proxy - the
+    right-most X-Forwarded-For entry that is not a trusted proxy (the left part
+    of the header is whatever the client sent).
+    """
+    peer = request.client.host if request.client else "unknown"
+    networks = _trusted_networks(settings.TRUSTED_PROXIES)
+    if not networks or not _is_trusted(peer, networks):
+        return peer
+    hops = [hop.strip() for hop in request.headers.get("x-forwarded-for", "").split(",") if hop.strip()]
+    for hop in reversed(hops):
+        if not _is_trusted(hop, networks):
+            return hop
+    return hops[0] if hops else peer
+
+
+def _reject(retry_after: float) -> HTTPException:
+    blocked_counter.inc()
+    return HTTPException(
+        status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+        detail="Too many login attempts, please try again later",
+        headers={"Retry-After": str(max(1, int(retry_after + 0.999)))},
+    )
+
+
+async def enforce_login_throttle(email: str, client_ip: str) -> None:
+    """
+    Record a login attempt and reject it if the email or IP is over the limit.
+
+    Must be called before any DB or password hash work.
+    :raises HTTPException: 429 with Retry-After
+    """
+    if not settings.LOGIN_THROTTLE_ENABLED:
+        return
+
+    email_key = _email_key(email)
+    ip_key = _ip_key(client_ip)
+
+    # 1. Local front filter
+    wait = local_limiter.take(ip_key, email_key)
+    if wait is not None:
+        blocked_local_counter.inc()
+        raise _reject(wait)
+
+    # 2. Shared sliding windows
+    now_ms = int(time.time() * 1000)
+    window_ms = settings.LOGIN_WINDOW_SECONDS * 1000
+    attempt_id = f"{now_ms}-{uuid.uuid4().hex[:8]}"
+    limits = ((ip_key, settings.LOGIN_MAX_ATTEMPTS_PER_IP), (email_key, settings.LOGIN_MAX_ATTEMPTS_PER_EMAIL))
+
+    def _check(windows, record: bool):
+        keys = [key for key, _ in windows]
+        args = [now_ms, window_ms, int(record), attempt_id, *(limit for _, limit in windows)]
+        return sliding_window_script(keys=keys, args=args)
+
+    try:
+        if cluster_mode():
+            # The two keys live in different slots (possibly nodes): check both
+            # concurrently, then record in both. Two concurrent attempts can
+            # both pass the check; the next one sees them.
+            results = await asyncio.gather(*(_check([window], False) for window in limits))
+            if all(int(allowed) for allowed, _ in results):
+                results = await asyncio.gather(*(_check([window], True) for window in limits))
+        else:
+            results = [await _check(limits, True)]
+    except Exception as e:
+        redis_error_counter.inc()
+        logger.warning(f"Login throttle skipped Redis check: {e}")
+        allowed_counter.inc()
+        return
+
+    for allowed, retry_after_ms in results:
+        if not int(allowed):
+            blocked_redis_counter.inc()
+            raise _reject(int(retry_after_ms) / 1000)
+
+    allowed_counter.inc()
+
+
+async def reset_login_attempts(email: str) -> None:
+    """
+    Forget failed attempts for the email after a successful login.
+    The per-IP window is kept.
+    """
+    if not settings.LOGIN_THROTTLE_ENABLED:
+        return
+    try:
+        await redis_cache.delete(_email_key(email))
+    except Exception as e:
+        logger.warning(f"Could not reset login attempts: {e}")
@@ -0,0 +1,175 @@
+"""
+Cross-request cache of authenticated principals.
+
+get_current_user() used to load the user from Postgres on every
+authenticated request. Loaded users are now kept in a small in-process
+TTL/LRU cache keyed by user id.
+
+Consistency across workers: every write to a user row calls
+invalidate_principal(), which drops the local entry and publishes the id
+on a Redis channel. Each worker runs listen_for_invalidations() and drops
+the entry as well. The TTL bounds staleness if a message is ever lost, and
+the whole cache is cleared whenever the subscription (re)connects.
+"""
+
+import asyncio
+import logging
+import time
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+
+from sqlalchemy import inspect
+
+from fastapi_auth_service.app.core.metrics import metrics
+from fastapi_auth_service.app.core.redis import redis_cache, redis_pubsub
+from fastapi_auth_service.app.core.settings import settings
+from fastapi_auth_service.app.database import recent_writes
+from fastapi_auth_service.app.models.user import User
+
+
+logger = logging.getLogger(__name__)
+
+# Redis pub/sub channel with ids of changed users
+INVALIDATION_CHANNEL = "principal_invalidation"
+# Prefix of ids on the channel that only wrote (another user's row), nothing to drop
+WRITER_PREFIX = "writer:"
+
+
+def _snapshot(user: User) -> dict:
+    """Column values of a loaded user (no session state)."""
+    return {attr.key: getattr(user, attr.key) for attr in inspect(User).column_attrs}
+
+
+class PrincipalCache:
+    """
+    TTL + LRU cache of user rows.
+
+    Entries are stored as plain column values; every hit returns a new
+    transient User, so handlers can never share or mutate a cached object.
+
+    :param max_size: Max number of cached users (least recently used are evicted)
+    :param ttl: Seconds an entry stays valid
+    """
+
+    def __init__(self, max_size: int, ttl: float) -> None:
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries: "OrderedDict[int, Tuple[float, dict]]" = OrderedDict()
+        # A load that started before an invalidation of its user (or a clear())
+        # is not cached. Per user, so writes to other users never block caching.
+        self._epoch = 0
+        self._generations: Dict[int, int] = {}
+
+        self.hits = metrics.counter("principal_cache.hits")
+        self.misses = metrics.counter("principal_cache.misses")
+        self.invalidations = metrics.counter("principal_cache.invalidations")
+        metrics.gauge("principal_cache.size", lambda: len(self._entries))
+
+    def get(self, user_id: int) -> Optional[User]:
+        entry = self._entries.get(user_id)
+        if entry is None or entry[0] < time.monotonic():
+            if entry is not None:
+                del self._entries[user_id]
+            self.misses.inc()
+            return None
+        self._entries.move_to_end(user_id)
+        self.hits.inc()
+        return User(**entry[1])
+
+    def generation(self, user_id: int) -> Tuple[int, int]:
+        """Take before reading the user from the DB and pass to put()."""
+        return self._epoch, self._generations.get(user_id, 0)
+
+    def put(self, user: User, generation: Tuple[int, int]) -> None:
+        """
+        Cache a user loaded from the DB.
+
+        :param generation: self.generation(user.id) taken before the DB read
+        """
+        if generation != self.generation(user.id) or self.max_size <= 0:
+            return  # An invalidation raced with the load, the row may be stale
+        self._entries[user.id] = (time.monotonic() + self.ttl, _snapshot(user))
+        self._entries.move_to_end(user.id)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    def invalidate(self, user_id: int) -> None:
+        if user_id not in self._generations and len(self._generations) >= max(self.max_size, 1):
+            # Keep the table bounded: only loads in flight right now are not cached
+            self._epoch += 1
+            self._generations.clear()
+        self._generations[user_id] = self._generations.get(user_id, 0) + 1
+        self.invalidations.inc()
+        self._entries.pop(user_id, None)
+
+    def clear(self) -> None:
+        self._epoch += 1
+        self._generations.clear()
+        self._entries.clear()
+
+
+principal_cache = PrincipalCache(
+    max_size=settings.PRINCIPAL_CACHE_SIZE if settings.PRINCIPAL_CACHE_ENABLED else 0,
+    ttl=settings.PRINCIPAL_CACHE_TTL_SECONDS,
+)
+
+
+async def invalidate_principal(user_id: int) -> None:
+    """
+    Drop the cached user in this worker and notify all other workers.
+    """
+    principal_cache.invalidate(user_id)
+    try:
+        await redis_cache.publish(INVALIDATION_CHANNEL, user_id)
+    except Exception as e:
+        # Other workers will catch up when the TTL expires
+        logger.warning(f"Could not publish principal invalidation for user {user_id}: {e}")
+
+
+async def announce_write(user_id: int) -> None:
+    """
+    Send the next reads of a user who wrote another user's row to the primary,
+    in this worker and all other workers.
+    """
+    recent_writes.mark(user_id)
+    try:
+        await redis_cache.publish(INVALIDATION_CHANNEL, f"{WRITER_PREFIX}{user_id}")
+    except Exception as e:
+        # Other workers may serve this user's reads from a replica until it catches up
+        logger.warning(f"Could not publish the write of user {user_id}: {e}")
+
+
+async def listen_for_invalidations(reconnect_delay: float = 1.0) -> None:
+    """
+    Background task: apply invalidations published by any worker.
+    Runs until cancelled, reconnecting after errors.
+    """
+    while True:
+        pubsub = redis_pubsub.pubsub()
+        try:
+            await pubsub.subscribe(INVALIDATION_CHANNEL)
+            # Messages may have been missed while we were not subscribed
+            principal_cache.clear()
+            async for message in pubsub.listen():
+                if message.get("type") != "message":
+                    continue
+                data = str(message["data"])
+                writer_only = data.startswith(WRITER_PREFIX)
+                try:
+                    user_id = int(data[len(WRITER_PREFIX):] if writer_only else data)
+                except ValueError:
+                    continue
+                if not writer_only:
+                    principal_cache.invalidate(user_id)
+                recent_writes.mark(user_id)  # Read-your-writes in this worker as well
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.warning(f"Principal invalidation listener error: {e}")
+            principal_cache.clear()
+            await asyncio.sleep(reconnect_delay)
+        finally:
+            try:
+                await pubsub.aclose()
+            except Exception:
+                pass
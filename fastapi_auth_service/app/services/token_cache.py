@@ -1,13 +1,50 @@
 """
 Module for working with access and refresh tokens in Redis.
 
-A global Redis client (redis_cache) is used, connected via asynchronous redis.
+The values live in the global token store (token_store.py): Redis by
+default, or an in-process store (TOKEN_STORE=memory).
 All values ​​are taken from settings.py via Pydantic configuration.
+
+Keys hold the owner's hash tag and a 128-bit digest of the token
+("at:{42}:<22 chars>", "rt:{42}:<22 chars>") instead of the whole JWT, so
+that in Redis Cluster all keys of a user (tokens, sessions, epoch) share
+one slot and per-user pipelines and scripts keep working.
+
+Tokens stored under the older layouts - "at:<digest>" / "rt:<digest>" and
+"access_token:<jwt>" / "refresh_token:<jwt>" - are still honoured while
+TOKEN_LEGACY_KEYS_FALLBACK is on (read in the same round trip); turn it off
+once the refresh token lifetime has passed since the upgrade. Cluster mode
+never reads them.
+
+Sliding sessions (SESSION_SLIDING_ENABLED). The access JWT then lives
+SESSION_SLIDING_MAX_MINUTES, and the access token key - which expires
+after ACCESS_TOKEN_EXPIRE_MINUTES of inactivity - decides whether the
+token is still good: authenticate_token() checks it for every request.
+The key is read and, only when less than SESSION_SLIDING_EXTEND_FRACTION
+of its TTL is left, extended in one atomic store call (TokenStore.slide),
+so there is one write per window across all workers and most checks stay
+pure reads. Batch introspection does not extend keys.
+
+Opaque tokens (TOKEN_FORMAT=opaque, see utils/opaque_tokens.py) use the
+same keys; the value is then the token's claims record instead of the
+user id, and lookup_opaque_token() reads it with the owner's epoch.
 """
 
-from fastapi_auth_service.app.core.redis import redis_cache  # Global redis client
+import base64
+from typing import List, Optional
+
+from redis.exceptions import RedisError
+
+from fastapi_auth_service.app.core.metrics import metrics
+
+from fastapi_auth_service.app.core.redis import hash_tag, legacy_keys_enabled, redis_degraded
 # Project Configuration (Pydantic)
 from fastapi_auth_service.app.core.settings import settings
+from fastapi_auth_service.app.services.token_store import token_store  # Global token store
+from fastapi_auth_service.app.services.token_validity_cache import publish_revocations, token_validity_cache
+from fastapi_auth_service.app.services.user_epoch import epoch_from_values, epoch_keys
+from fastapi_auth_service.app.utils.jwt_codec import token_digest
+from fastapi_auth_service.app.utils.opaque_tokens import decode_record, opaque_token_user
 
 
 # Access token lifetime in seconds (from .env -> settings.py)
@@ -17,12 +54,71 @@ ACCESS_TOKEN_EXPIRE_SECONDS = settings.ACCESS_TOKEN_EXPIRE_MINUTES * 60
 REFRESH_TOKEN_EXPIRE_SECONDS = settings.REFRESH_TOKEN_EXPIRE_DAYS * 24 * 60 * 60
 
 
+ACCESS_KEY_PREFIX = "at:"
+REFRESH_KEY_PREFIX = "rt:"
+LEGACY_ACCESS_KEY_PREFIX = "access_token:"
+LEGACY_REFRESH_KEY_PREFIX = "refresh_token:"
+
+# Sliding sessions: extend an access key once its TTL drops below this (seconds)
+SLIDING_EXTEND_BELOW_SECONDS = ACCESS_TOKEN_EXPIRE_SECONDS * settings.SESSION_SLIDING_EXTEND_FRACTION
+
+sliding_counter = metrics.counter("token_cache.sliding_extensions")
+
+
+def _short_digest(token: str) -> str:
+    # First 16 bytes of SHA-256, base64url: 22 characters
+    return base64.urlsafe_b64encode(token_digest(token)[:16]).rstrip(b"=").decode()
+
+
+def access_token_key(token: str, user_id: int) -> str:
+    return f"{ACCESS_KEY_PREFIX}{hash_tag(user_id)}:{_short_digest(token)}"
+
+
+def refresh_token_key(token: str, user_id: int) -> str:
+    return f"{REFRESH_KEY_PREFIX}{hash_tag(user_id)}:{_short_digest(token)}"
+
+
+def user_sessions_key(user_id: int) -> str:
+    """Hash of the user's sessions (see user_sessions.py)."""
+    return f"user_sessions:{hash_tag(user_id)}"
+
+
+def access_token_keys(token: str, user_id: int) -> List[str]:
+    """Keys an access token may be stored under (current first)."""
+    if legacy_keys_enabled():
+        return [
+            access_token_key(token, user_id),
+            f"{ACCESS_KEY_PREFIX}{_short_digest(token)}",
+            f"{LEGACY_ACCESS_KEY_PREFIX}{token}",
+        ]
+    return [access_token_key(token, user_id)]
+
+
+def refresh_token_keys(token: str, user_id: int) -> List[str]:
+    """Keys a refresh token may be stored under (current first)."""
+    if legacy_keys_enabled():
+        return [
+            refresh_token_key(token, user_id),
+            f"{REFRESH_KEY_PREFIX}{_short_digest(token)}",
+            f"{LEGACY_REFRESH_KEY_PREFIX}{token}",
+        ]
+    return [refresh_token_key(token, user_id)]
+
+
+def is_access_value_valid(value) -> bool:
+    """Whether a value read from an access token key marks a live token (user id or opaque token record)."""
+    try:
+        return int(value) > 0
+    except (TypeError, ValueError):
+        return decode_record(value) is not None
+
+
 async def store_access_token(token: str, user_id: int) -> None:
     """
     Stores the access token in Redis with a binding to the user_id.
     Used for additional token verification (optional).
     """
-    await redis_cache.set(f"access_token:{token}", user_id, ex=ACCESS_TOKEN_EXPIRE_SECONDS)
+    await token_store.set_many({access_token_key(token, user_id): (user_id, ACCESS_TOKEN_EXPIRE_SECONDS)})
 
 
 async def store_refresh_token(token: str, user_id: int) -> None:
@@ -30,38 +126,103 @@ async def store_refresh_token(token: str, user_id: int) -> None:
    Stores a refresh token in Redis with a binding to user_id. 
    This allows for logout/revocation of the token and session extension.
     """
-    await redis_cache.set(f"refresh_token:{token}", user_id, ex=REFRESH_TOKEN_EXPIRE_SECONDS)
+    await token_store.set_many({refresh_token_key(token, user_id): (user_id, REFRESH_TOKEN_EXPIRE_SECONDS)})
+
+
+async def store_token_pair(access_token: str, refresh_token: str, user_id: int) -> None:
+    """
+    Stores the access and refresh tokens of a login in one round trip
+    (MULTI/EXEC; both keys share the user's slot in cluster mode).
+    """
+    await token_store.set_many({
+        access_token_key(access_token, user_id): (user_id, ACCESS_TOKEN_EXPIRE_SECONDS),
+        refresh_token_key(refresh_token, user_id): (user_id, REFRESH_TOKEN_EXPIRE_SECONDS),
+    })
 
 
-async def is_access_token_valid(token: str) -> bool:
+async def is_access_token_valid(token: str, user_id: int) -> bool:
     """
     Checks for the presence of an access token in Redis.
     Used to validate the token on the server side.
+    In degraded mode (Redis unavailable) returns True: verify the signature as well.
     """
-    value = await redis_cache.get(f"access_token:{token}")
+    # Confirmed a moment ago and not revoked since: no Redis round trip
+    if token_validity_cache.is_valid(access_token_key(token, user_id), user_id):
+        return True
+
+    keys = access_token_keys(token, user_id)
     try:
-        return int(value) > 0
-    except (TypeError, ValueError):
-        return False
+        if settings.SESSION_SLIDING_ENABLED:
+            values = await _slide(keys)
+        else:
+            values = await token_store.get_many(keys)
+    except RedisError as e:
+        if redis_degraded(e):
+            return True  # Degraded mode: the caller's signature + expiry check decides
+        raise
+    valid = any(is_access_value_valid(value) for value in values)
+    if valid:
+        token_validity_cache.remember(keys[0])
+    return valid
+
+
+async def _slide(keys: List[str]) -> List[Optional[str]]:
+    """
+    Values of the keys; the first (current layout) access key is extended to
+    the full ACCESS_TOKEN_EXPIRE_SECONDS in the same call if it is running out.
+    Keys of the older layouts are left to expire.
+    """
+    values, extended = await token_store.slide(keys, SLIDING_EXTEND_BELOW_SECONDS, ACCESS_TOKEN_EXPIRE_SECONDS)
+    if extended:
+        sliding_counter.inc()
+    return values
 
 
-async def is_refresh_token_valid(token: str) -> bool:
+async def is_refresh_token_valid(token: str, user_id: int) -> bool:
     """
     Checks for a refresh token in Redis.
     Used before refreshing an access token.
     """
-    return await redis_cache.exists(f"refresh_token:{token}") == 1
+    return await token_store.count(refresh_token_keys(token, user_id)) >= 1
 
 
-async def delete_access_token(token: str) -> None:
+async def delete_access_token(token: str, user_id: int) -> None:
     """
     Removes an access token from Redis (logout or revoke rights).
     """
-    await redis_cache.delete(f"access_token:{token}")
+    await token_store.delete(access_token_keys(token, user_id))
+    await publish_revocations([access_token_key(token, user_id)])
 
 
-async def delete_refresh_token(token: str) -> None:
+async def delete_refresh_token(token: str, user_id: int) -> None:
     """
     Removes a refresh token from Redis (logout or revoke the refresh token).
     """
-    await redis_cache.delete(f"refresh_token:{token}")
+    await token_store.delete(refresh_token_keys(token, user_id))
+
+
+async def lookup_opaque_token(token: str, refresh: bool = False) -> Optional[dict]:
+    """
+    Claims of a live opaque token: its record and the owner's security epoch
+    in one round trip, no signature to verify. Access tokens slide like JWT
+    access keys (SESSION_SLIDING_ENABLED). No degraded mode: without the
+    store an opaque token cannot be checked, RedisError propagates.
+
+    :param refresh: Look the token up as a refresh token
+    :return: None if the token is malformed, unknown, expired, logged out or
+             issued before the last epoch bump
+    """
+    user_id = opaque_token_user(token)
+    if user_id is None:
+        return None
+    key = refresh_token_key(token, user_id) if refresh else access_token_key(token, user_id)
+    keys = [key] + epoch_keys(user_id)
+    if settings.SESSION_SLIDING_ENABLED and not refresh:
+        values = await _slide(keys)
+    else:
+        values = await token_store.get_many(keys)
+
+    record = decode_record(values[0])
+    if record is None or int(record.get("epoch", 0)) < epoch_from_values(values[1:]):
+        return None
+    return record
@@ -0,0 +1,121 @@
+"""
+Batch token introspection for API gateways.
+
+Signatures and expiry are checked locally (verified-token cache first).
+Tokens confirmed a moment ago and not revoked since are answered from the
+local validity cache; the server-side state of the rest - the access token
+key (logout) and the owner's security epoch (block, delete, password
+change) - is then read with a single MGET, whatever the batch size
+(in cluster mode: one MGET per slot, pipelined per node).
+While Redis is unavailable (degraded mode) signature + expiry decide.
+
+Opaque tokens (see utils/opaque_tokens.py) have nothing to verify locally:
+their records are read in the same MGET, and they are inactive in degraded
+mode. Their "exp" is not reported - the record only knows the end of the
+session.
+"""
+
+import time
+from typing import List
+
+from fastapi_auth_service.app.core.metrics import metrics
+from redis.exceptions import RedisError
+
+from fastapi_auth_service.app.core.redis import redis_degraded
+from fastapi_auth_service.app.services.token_cache import (
+    access_token_key, access_token_keys, is_access_value_valid
+)
+from fastapi_auth_service.app.services.token_store import token_store
+from fastapi_auth_service.app.services.token_validity_cache import token_validity_cache
+from fastapi_auth_service.app.services.user_epoch import epoch_from_values, epoch_keys
+from fastapi_auth_service.app.utils.opaque_tokens import decode_record, opaque_token_user
+from fastapi_auth_service.app.utils.security import verify_token
+
+
+introspected_counter = metrics.counter("introspection.tokens")
+batch_timer = metrics.timer("introspection.batch_time")
+
+
+async def introspect_tokens(tokens: List[str]) -> List[dict]:
+    """
+    :return: One result per token, in order: {"active": False} or
+             {"active": True, "sub", "role", "email", "exp"}
+    """
+    with batch_timer.time():
+        introspected_counter.inc(len(tokens))
+
+        # 1. Local verification (duplicates are verified once); opaque tokens only name their user
+        payloads, opaque = {}, set()
+        for token in tokens:
+            if token in payloads:
+                continue
+            user_id = opaque_token_user(token)
+            if user_id is not None:
+                payloads[token] = {"sub": str(user_id)}
+                opaque.add(token)
+                continue
+            payload = verify_token(token)
+            payloads[token] = payload if payload and payload.get("sub") is not None else None
+        verified = [token for token, payload in payloads.items() if payload is not None]
+
+        # 2. Local validity cache (no Redis for tokens seen live a moment ago)
+        token_live = {}
+        for token in verified:
+            if token in opaque:
+                continue  # The claims are in the store
+            user_id = payloads[token]["sub"]
+            if token_validity_cache.is_valid(access_token_key(token, user_id), user_id):
+                token_live[token] = True
+        verified = [token for token in verified if token not in token_live]
+
+        # 3. Redis state of all verified tokens and their users in one MGET
+        user_ids = sorted({str(payloads[token]["sub"]) for token in verified})
+        token_keys = {token: access_token_keys(token, payloads[token]["sub"]) for token in verified}
+        user_keys = {uid: epoch_keys(uid) for uid in user_ids}
+        keys = [key for token in verified for key in token_keys[token]]
+        keys += [key for uid in user_ids for key in user_keys[uid]]
+        try:
+            values = await token_store.get_many(keys) if verified else []
+        except RedisError as e:
+            if not redis_degraded(e):
+                raise
+            # Degraded mode: signature + expiry only
+            token_live.update({token: token not in opaque for token in verified})
+            verified, user_ids, values = [], [], []
+
+        values = iter(values)
+        token_values = {token: [next(values) for _ in token_keys[token]] for token in verified}
+        epochs = {uid: epoch_from_values([next(values) for _ in user_keys[uid]]) for uid in user_ids}
+        for token in verified:
+            if token in opaque:
+                record = decode_record(token_values[token][0])
+                token_live[token] = (
+                    record is not None and int(record.get("epoch", 0)) >= epochs[payloads[token]["sub"]])
+                if token_live[token]:
+                    record.pop("exp", None)
+                    payloads[token] = record
+                continue
+            payload = payloads[token]
+            token_live[token] = (
+                any(is_access_value_valid(v) for v in token_values[token])
+                and int(payload.get("epoch", 0)) >= epochs[str(payload["sub"])]
+            )
+            if token_live[token]:
+                exp = payload.get("exp")
+                ttl = exp - time.time() if isinstance(exp, (int, float)) else None
+                token_validity_cache.remember(access_token_key(token, payload["sub"]), ttl)
+
+        results = []
+        for token in tokens:
+            payload = payloads[token]
+            if payload is None or not token_live[token]:
+                results.append({"active": False})
+                continue
+            results.append({
+                "active": True,
+                "sub": str(payload["sub"]),
+                "role": payload.get("role"),
+                "email": payload.get("email"),
+                "exp": payload.get("exp"),
+            })
+        return results
@@ -0,0 +1,517 @@
+"""
+Storage backends for the server-side token state.
+
+token_cache.py, user_sessions.py and user_epoch.py build the keys
+("at:{42}:<digest>", "user_sessions:{42}", "user_epoch:{42}", ...) and
+keep their logic; the TokenStore only holds the values. Two backends are
+provided (selected by settings.TOKEN_STORE):
+- "redis"  - the global Redis client (any REDIS_MODE). Shared by all
+  workers and nodes; multi-step operations are MULTI/EXEC or Lua scripts;
+- "memory" - a dict in this process with TTL eviction. No network round
+  trip at all, but the state is private to one process: only for a
+  single-worker deployment, local benchmarks and tests without Redis.
+
+Every operation is atomic in both backends (the memory backend never
+awaits inside an operation). Values come back as strings, as from a
+Redis client with decode_responses.
+"""
+
+import heapq
+import json
+import time
+from abc import ABC, abstractmethod
+from typing import Callable, Dict, List, Optional, Tuple, Type
+
+from fastapi_auth_service.app.core.metrics import metrics
+from fastapi_auth_service.app.core.redis import redis_cache
+from fastapi_auth_service.app.core.settings import settings
+
+
+# Results of rotate_refresh()
+REFRESH_OK = 1
+REFRESH_TOKEN_MISSING = 0
+REFRESH_REVOKED = -1
+REFRESH_REUSED = -2
+
+# {key: (value, TTL in seconds)}
+TokenItems = Dict[str, Tuple[object, int]]
+
+
+class TokenStore(ABC):
+    """
+    Interface of a token store backend. Keys of one call belong to one user
+    (one cluster slot), except for get_many(). A backend missing an
+    operation cannot be instantiated.
+    """
+
+    name = ""
+
+    @abstractmethod
+    async def set_many(self, items: TokenItems) -> None:
+        """Set all keys with their TTLs at once."""
+
+    @abstractmethod
+    async def get_many(self, keys: List[str]) -> List[Optional[str]]:
+        """Values of the keys, in order (None if missing). Keys may belong to many users."""
+
+    @abstractmethod
+    async def get_with_ttl(self, keys: List[str]) -> Tuple[List[Optional[str]], float]:
+        """
+        Values of the keys and the TTL of the first one, in one round trip.
+        :return: (values, seconds left; -2 if the key is missing, -1 if it never expires)
+        """
+
+    @abstractmethod
+    async def slide(self, keys: List[str], extend_below: float, ttl: int) -> Tuple[List[Optional[str]], bool]:
+        """
+        Values of the keys; if the first key exists with less than
+        `extend_below` seconds left, it is made to live `ttl` seconds from
+        now. One atomic round trip, so of many concurrent callers (any
+        worker) only the first extends the key.
+        :return: (values, whether the key was extended)
+        """
+
+    @abstractmethod
+    async def count(self, keys: List[str]) -> int:
+        """Number of the keys that exist."""
+
+    @abstractmethod
+    async def delete(self, keys: List[str]) -> None:
+        """Delete the keys (missing ones are ignored)."""
+
+    @abstractmethod
+    async def get_sessions(self, key: str) -> Dict[str, str]:
+        """All entries of a session index: {sid: entry JSON}."""
+
+    @abstractmethod
+    async def get_session(self, key: str, sid: str) -> Optional[str]:
+        """Entry of one session (None if missing)."""
+
+    @abstractmethod
+    async def add_session(self, key: str, sid: str, entry: str, tokens: TokenItems, ttl: int) -> None:
+        """Store the tokens of a session and its index entry; the index lives `ttl` seconds."""
+
+    @abstractmethod
+    async def remove_sessions(self, key: str, sids: List[str], token_keys: List[str]) -> None:
+        """Drop index entries together with their token keys."""
+
+    @abstractmethod
+    async def rotate_refresh(
+        self,
+        key: str,
+        sid: str,
+        epoch_keys: List[str],
+        presented_keys: List[str],
+        access_key: str,
+        refresh_key: str,
+        value,
+        access_ttl: int,
+        refresh_ttl: int,
+        token_epoch: int,
+        new_entry: Optional[str],
+        channel: str,
+        keep_presented: int = 0,
+    ) -> Tuple[int, Optional[str]]:
+        """
+        Replace the token pair of session `sid` (see user_sessions.py).
+
+        :param presented_keys: Keys the presented refresh token may be stored under
+        :param new_entry: Index entry to create if the token predates sessions
+        :param channel: Revocation channel the revoked access key is published on
+        :param keep_presented: Keep the presented keys for at most this many seconds
+                               instead of deleting them (0 - delete)
+        :return: (REFRESH_* code, access key revoked by the call or None)
+        """
+
+    @abstractmethod
+    async def bump_epoch(self, keys: List[str], ttl: int) -> int:
+        """
+        Write max(max(values of keys) + 1, now in ms) to the first key, so the
+        epoch keeps growing even after the key has expired. :return: New epoch
+        """
+
+    @abstractmethod
+    async def publish(self, channel: str, message: str) -> None:
+        """Tell the other workers (no-op where the state is not shared)."""
+
+
+# All keys belong to one user, hence to one cluster slot (the keys kept in the
+# session entry too, they carry the same hash tag).
+# KEYS: new access token, new refresh token, user sessions,
+#       epoch key(s) (ARGV[7] of them), presented refresh token key(s) (current layout first)
+# ARGV: user id, access TTL, refresh TTL, token epoch, session id,
+#       entry of a new session ("" unless the token predates sessions), number of epoch keys,
+#       revocation channel, seconds to keep the presented keys for (0 - delete them)
+# Returns {result code, access token key revoked by the call (if any)}; revoked
+# keys are published for the other workers
+ROTATE_REFRESH_LUA = """
+local epoch_count = tonumber(ARGV[7])
+local current_epoch = 0
+for i = 4, 3 + epoch_count do
+    current_epoch = math.max(current_epoch, tonumber(redis.call('GET', KEYS[i]) or '0') or 0)
+end
+if tonumber(ARGV[4]) < current_epoch then
+    return {-1}
+end
+
+local presented = 4 + epoch_count
+local session
+local revoked = false
+if ARGV[6] ~= '' then
+    -- Token from before sessions: it starts a family
+    local found = 0
+    for i = presented, #KEYS do
+        found = found + redis.call('EXISTS', KEYS[i])
+    end
+    if found == 0 then
+        return {0}
+    end
+    session = cjson.decode(ARGV[6])
+else
+    local raw = redis.call('HGET', KEYS[3], ARGV[5])
+    if not raw then
+        return {0}  -- session ended (logout, revoked)
+    end
+    session = cjson.decode(raw)
+    local current = false
+    for i = presented, #KEYS do
+        current = current or KEYS[i] == session['refresh_key']
+    end
+    if not current then
+        -- An already rotated token of the family is replayed: revoke the family
+        redis.call('DEL', session['access_key'], session['refresh_key'])
+        redis.call('HDEL', KEYS[3], ARGV[5])
+        redis.call('PUBLISH', ARGV[8], session['access_key'])
+        return {-2, session['access_key']}
+    end
+    if redis.call('EXISTS', session['refresh_key']) == 0 then
+        return {0}
+    end
+    -- The previous access token of the family goes with its refresh token
+    redis.call('DEL', session['access_key'])
+    redis.call('PUBLISH', ARGV[8], session['access_key'])
+    revoked = session['access_key']
+end
+
+local keep = tonumber(ARGV[9])
+for i = presented, #KEYS do
+    if keep == 0 then
+        redis.call('DEL', KEYS[i])
+    elseif redis.call('TTL', KEYS[i]) > keep then
+        redis.call('EXPIRE', KEYS[i], keep)
+    end
+end
+redis.call('SET', KEYS[1], ARGV[1], 'EX', ARGV[2])
+redis.call('SET', KEYS[2], ARGV[1], 'EX', ARGV[3])
+session['access_key'] = KEYS[1]
+session['refresh_key'] = KEYS[2]
+redis.call('HSET', KEYS[3], ARGV[5], cjson.encode(session))
+if redis.call('TTL', KEYS[3]) < tonumber(ARGV[3]) then
+    redis.call('EXPIRE', KEYS[3], ARGV[3])
+end
+return {1, revoked}
+"""
+
+# KEYS: keys to read, the first one slides; ARGV: extend below (ms), TTL (ms)
+SLIDE_LUA = """
+local values = redis.call('MGET', unpack(KEYS))
+local pttl = redis.call('PTTL', KEYS[1])
+if pttl >= 0 and pttl < tonumber(ARGV[1]) then
+    redis.call('PEXPIRE', KEYS[1], ARGV[2])
+    return {values, 1}
+end
+return {values, 0}
+"""
+
+# KEYS: epoch keys (current first); ARGV: TTL, now in ms
+BUMP_EPOCH_LUA = """
+local epoch = 0
+for i = 1, #KEYS do
+    epoch = math.max(epoch, tonumber(redis.call('GET', KEYS[i]) or '0') or 0)
+end
+epoch = math.max(epoch + 1, tonumber(ARGV[2]))
+redis.call('SET', KEYS[1], string.format('%d', epoch), 'EX', ARGV[1])
+return epoch
+"""
+
+
+class RedisTokenStore(TokenStore):
+    """
+    :param client: ResilientRedis or ResilientRedisCluster (see core/redis.py)
+    """
+
+    name = "redis"
+
+    def __init__(self, client) -> None:
+        self.client = client
+        self.rotate_refresh_script = client.register_script(ROTATE_REFRESH_LUA)
+        self.bump_epoch_script = client.register_script(BUMP_EPOCH_LUA)
+        self.slide_script = client.register_script(SLIDE_LUA)
+
+    async def set_many(self, items: TokenItems) -> None:
+        async with self.client.pipeline(transaction=True) as pipe:
+            for key, (value, ttl) in items.items():
+                pipe.set(key, value, ex=ttl)
+            await pipe.execute()
+
+    async def get_many(self, keys: List[str]) -> List[Optional[str]]:
+        # One MGET (in cluster mode: one per slot, pipelined per node)
+        return await self.client.mget_nonatomic(keys)
+
+    async def get_with_ttl(self, keys: List[str]) -> Tuple[List[Optional[str]], float]:
+        async with self.client.pipeline(transaction=False) as pipe:
+            pipe.mget(keys)
+            pipe.pttl(keys[0])
+            values, pttl = await pipe.execute()
+        return values, pttl / 1000 if pttl >= 0 else pttl
+
+    async def slide(self, keys: List[str], extend_below: float, ttl: int) -> Tuple[List[Optional[str]], bool]:
+        values, extended = await self.slide_script(keys=keys, args=[int(extend_below * 1000), ttl * 1000])
+        return list(values), bool(extended)
+
+    async def count(self, keys: List[str]) -> int:
+        return await self.client.exists(*keys)
+
+    async def delete(self, keys: List[str]) -> None:
+        await self.client.delete(*keys)
+
+    async def get_sessions(self, key: str) -> Dict[str, str]:
+        return await self.client.hgetall(key)
+
+    async def get_session(self, key: str, sid: str) -> Optional[str]:
+        return await self.client.hget(key, sid)
+
+    async def add_session(self, key: str, sid: str, entry: str, tokens: TokenItems, ttl: int) -> None:
+        async with self.client.pipeline(transaction=True) as pipe:
+            for token_key, (value, token_ttl) in tokens.items():
+                pipe.set(token_key, value, ex=token_ttl)
+            pipe.hset(key, sid, entry)
+            pipe.expire(key, ttl)
+            await pipe.execute()
+
+    async def remove_sessions(self, key: str, sids: List[str], token_keys: List[str]) -> None:
+        async with self.client.pipeline(transaction=True) as pipe:
+            if token_keys:
+                pipe.delete(*token_keys)
+            if sids:
+                pipe.hdel(key, *sids)
+            await pipe.execute()
+
+    async def rotate_refresh(
+        self, key, sid, epoch_keys, presented_keys, access_key, refresh_key,
+        value, access_ttl, refresh_ttl, token_epoch, new_entry, channel, keep_presented=0,
+    ) -> Tuple[int, Optional[str]]:
+        code, *revoked = await self.rotate_refresh_script(
+            keys=[access_key, refresh_key, key] + epoch_keys + presented_keys,
+            args=[
+                value, access_ttl, refresh_ttl, token_epoch, sid,
+                new_entry or "", len(epoch_keys), channel, keep_presented,
+            ],
+        )
+        return int(code), (revoked[0] or None) if revoked else None
+
+    async def bump_epoch(self, keys: List[str], ttl: int) -> int:
+        return int(await self.bump_epoch_script(keys=keys, args=[ttl, _now_ms()]))
+
+    async def publish(self, channel: str, message: str) -> None:
+        await self.client.publish(channel, message)
+
+
+def _now_ms() -> int:
+    return int(time.time() * 1000)
+
+
+def _max_int(values) -> int:
+    # Like tonumber(...) or 0 in the scripts: missing or broken values count as 0
+    result = 0
+    for value in values:
+        try:
+            result = max(result, int(value))
+        except (TypeError, ValueError):
+            pass
+    return result
+
+
+class MemoryTokenStore(TokenStore):
+    """
+    In-process store: {key: (value, expires at)}, values are strings or
+    dicts (session indexes). Expired keys are invisible at once and freed
+    by a heap of expiry times, a few at a time on every write.
+
+    :param clock: Monotonic time source (seconds)
+    """
+
+    name = "memory"
+
+    def __init__(self, clock: Callable[[], float] = time.monotonic) -> None:
+        self.clock = clock
+        self._data: Dict[str, Tuple[object, float]] = {}
+        self._expiries: List[Tuple[float, str]] = []
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    # Key primitives (synchronous; an operation is atomic as long as it does not await)
+
+    def _get(self, key: str):
+        item = self._data.get(key)
+        if item is None:
+            return None
+        if item[1] <= self.clock():
+            del self._data[key]
+            return None
+        return item[0]
+
+    def _set(self, key: str, value, ttl: float) -> None:
+        expires_at = self.clock() + ttl
+        self._data[key] = (value, expires_at)
+        heapq.heappush(self._expiries, (expires_at, key))
+
+    def _ttl(self, key: str) -> float:
+        item = self._data.get(key)
+        return item[1] - self.clock() if item is not None else -2
+
+    def _evict(self, limit: int = 100) -> None:
+        """Free up to `limit` expired keys; rebuild the heap once stale entries dominate it."""
+        now = self.clock()
+        while limit and self._expiries and self._expiries[0][0] <= now:
+            expires_at, key = heapq.heappop(self._expiries)
+            item = self._data.get(key)
+            # A key set again since has a newer heap entry
+            if item is not None and item[1] == expires_at:
+                del self._data[key]
+            limit -= 1
+        if len(self._expiries) > 2 * len(self._data) + 1024:
+            self._expiries = [(expires_at, key) for key, (_, expires_at) in self._data.items()]
+            heapq.heapify(self._expiries)
+
+    # TokenStore
+
+    async def set_many(self, items: TokenItems) -> None:
+        for key, (value, ttl) in items.items():
+            self._set(key, str(value), ttl)
+        self._evict()
+
+    async def get_many(self, keys: List[str]) -> List[Optional[str]]:
+        values = [self._get(key) for key in keys]
+        return [value if isinstance(value, str) else None for value in values]
+
+    async def get_with_ttl(self, keys: List[str]) -> Tuple[List[Optional[str]], float]:
+        values = await self.get_many(keys)
+        return values, self._ttl(keys[0]) if self._get(keys[0]) is not None else -2
+
+    async def slide(self, keys: List[str], extend_below: float, ttl: int) -> Tuple[List[Optional[str]], bool]:
+        values = await self.get_many(keys)
+        if values[0] is None or self._ttl(keys[0]) >= extend_below:
+            return values, False
+        self._set(keys[0], self._get(keys[0]), ttl)
+        self._evict()
+        return values, True
+
+    async def count(self, keys: List[str]) -> int:
+        return sum(self._get(key) is not None for key in keys)
+
+    async def delete(self, keys: List[str]) -> None:
+        for key in keys:
+            self._data.pop(key, None)
+
+    async def get_sessions(self, key: str) -> Dict[str, str]:
+        return dict(self._get(key) or {})
+
+    async def get_session(self, key: str, sid: str) -> Optional[str]:
+        return (self._get(key) or {}).get(sid)
+
+    async def add_session(self, key: str, sid: str, entry: str, tokens: TokenItems, ttl: int) -> None:
+        for token_key, (value, token_ttl) in tokens.items():
+            self._set(token_key, str(value), token_ttl)
+        sessions = self._get(key) or {}
+        sessions[sid] = entry
+        self._set(key, sessions, ttl)
+        self._evict()
+
+    async def remove_sessions(self, key: str, sids: List[str], token_keys: List[str]) -> None:
+        await self.delete(token_keys)
+        sessions = self._get(key)
+        if sessions is None:
+            return
+        for sid in sids:
+            sessions.pop(sid, None)
+        if not sessions:
+            self._data.pop(key, None)
+
+    async def rotate_refresh(
+        self, key, sid, epoch_keys, presented_keys, access_key, refresh_key,
+        value, access_ttl, refresh_ttl, token_epoch, new_entry, channel, keep_presented=0,
+    ) -> Tuple[int, Optional[str]]:
+        # Same steps as ROTATE_REFRESH_LUA
+        if int(token_epoch) < _max_int(await self.get_many(epoch_keys)):
+            return REFRESH_REVOKED, None
+
+        sessions = self._get(key) or {}
+        revoked = None
+        if new_entry:
+            # Token from before sessions: it starts a family
+            if not any(self._get(presented) is not None for presented in presented_keys):
+                return REFRESH_TOKEN_MISSING, None
+            session = json.loads(new_entry)
+        else:
+            if sid not in sessions:
+                return REFRESH_TOKEN_MISSING, None  # session ended (logout, revoked)
+            session = json.loads(sessions[sid])
+            if session["refresh_key"] not in presented_keys:
+                # An already rotated token of the family is replayed: revoke the family
+                await self.remove_sessions(key, [sid], [session["access_key"], session["refresh_key"]])
+                return REFRESH_REUSED, session["access_key"]
+            if self._get(session["refresh_key"]) is None:
+                return REFRESH_TOKEN_MISSING, None
+            # The previous access token of the family goes with its refresh token
+            self._data.pop(session["access_key"], None)
+            revoked = session["access_key"]
+
+        for presented in presented_keys:
+            if not keep_presented:
+                self._data.pop(presented, None)
+            elif self._ttl(presented) > keep_presented:
+                self._set(presented, self._data[presented][0], keep_presented)
+        self._set(access_key, str(value), access_ttl)
+        self._set(refresh_key, str(value), refresh_ttl)
+        session["access_key"] = access_key
+        session["refresh_key"] = refresh_key
+        sessions[sid] = json.dumps(session)
+        self._set(key, sessions, max(self._ttl(key), refresh_ttl))
+        self._evict()
+        return REFRESH_OK, revoked
+
+    async def bump_epoch(self, keys: List[str], ttl: int) -> int:
+        epoch = max(_max_int(await self.get_many(keys)) + 1, _now_ms())
+        self._set(keys[0], str(epoch), ttl)
+        self._evict()
+        return epoch
+
+    async def publish(self, channel: str, message: str) -> None:
+        # Nothing is shared with other processes
+        return None
+
+
+TOKEN_STORES: Dict[str, Type[TokenStore]] = {
+    RedisTokenStore.name: RedisTokenStore,
+    MemoryTokenStore.name: MemoryTokenStore,
+}
+
+
+def build_token_store(config) -> TokenStore:
+    """
+    :raises ValueError: unknown TOKEN_STORE
+    """
+    if config.TOKEN_STORE == RedisTokenStore.name:
+        return RedisTokenStore(redis_cache)
+    if config.TOKEN_STORE == MemoryTokenStore.name:
+        store = MemoryTokenStore()
+        # Registered for the configured store only (benchmarks and tests build their own)
+        metrics.gauge("token_store.memory_keys", lambda: len(store))
+        return store
+    raise ValueError(f"Unknown TOKEN_STORE '{config.TOKEN_STORE}', available: {', '.join(TOKEN_STORES)}")
+
+
+# Token store is created once and is accessible as a variable
+token_store = build_token_store(settings)
@@ -0,0 +1,217 @@
+"""
+Local (L1) layer in front of the Redis token checks.
+
+- Positive cache: access token keys recently confirmed live in Redis, kept
+  for TOKEN_L1_TTL_SECONDS. A hit skips the Redis round trip.
+- Revocation filter: a Bloom filter of revoked access token keys and of
+  users whose security epoch was bumped ("user:<id>"). Anything that may be
+  in the filter is checked in Redis again; a false positive only costs the
+  usual round trip, never a wrong answer.
+
+Revocations are published on a Redis channel by the worker that made them
+and applied by every worker's listen_for_revocations(), so a logged-out
+token is rejected locally within milliseconds. The positive cache is
+cleared whenever the subscription (re)connects, and its TTL bounds
+staleness if a message is ever lost.
+
+The filter is two Bloom filters rotated every access token lifetime: a
+revoked access token cannot outlive its key, so older entries are useless.
+"""
+
+import asyncio
+import hashlib
+import logging
+import math
+import time
+from collections import OrderedDict
+from typing import Iterable, Optional
+
+from fastapi_auth_service.app.core.metrics import metrics
+from fastapi_auth_service.app.core.redis import redis_pubsub
+from fastapi_auth_service.app.core.settings import settings
+from fastapi_auth_service.app.services.token_store import token_store
+
+
+logger = logging.getLogger(__name__)
+
+# Redis pub/sub channel with revoked items (space separated)
+REVOCATION_CHANNEL = "token_revocations"
+
+
+def user_revocation_item(user_id) -> str:
+    """Filter item for "every token of this user" (security epoch bump)."""
+    return f"user:{user_id}"
+
+
+class BloomFilter:
+    """
+    Plain Bloom filter on a bytearray.
+
+    :param capacity: Expected number of items
+    :param error_rate: False positive rate at that capacity
+    """
+
+    def __init__(self, capacity: int, error_rate: float) -> None:
+        self.size = max(8, int(-capacity * math.log(error_rate) / (math.log(2) ** 2)))
+        self.hash_count = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+        self.count = 0
+
+    def _positions(self, item: str):
+        # Double hashing: k positions from one 128-bit digest
+        digest = hashlib.blake2b(item.encode(), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:], "little") | 1
+        return ((h1 + i * h2) % self.size for i in range(self.hash_count))
+
+    def add(self, item: str) -> None:
+        for position in self._positions(item):
+            self.bits[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+
+    def __contains__(self, item: str) -> bool:
+        return all(self.bits[position >> 3] & (1 << (position & 7)) for position in self._positions(item))
+
+
+class RotatingRevocationFilter:
+    """
+    Two Bloom filters; the older one is dropped every `rotate_after` seconds,
+    so an item is remembered for between one and two periods.
+    """
+
+    def __init__(self, capacity: int, error_rate: float, rotate_after: float) -> None:
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.rotate_after = rotate_after
+        self.current = BloomFilter(capacity, error_rate)
+        self.previous = BloomFilter(capacity, error_rate)
+        self.rotated_at = time.monotonic()
+
+    def _maybe_rotate(self) -> None:
+        if time.monotonic() - self.rotated_at >= self.rotate_after:
+            self.previous = self.current
+            self.current = BloomFilter(self.capacity, self.error_rate)
+            self.rotated_at = time.monotonic()
+
+    def add(self, item: str) -> None:
+        self._maybe_rotate()
+        self.current.add(item)
+
+    def __contains__(self, item: str) -> bool:
+        self._maybe_rotate()
+        return item in self.current or item in self.previous
+
+
+class TokenValidityCache:
+    """
+    Short-lived positive cache of live access token keys plus the revocation filter.
+
+    :param max_size: Max number of cached keys (0 disables the positive cache)
+    :param ttl: Seconds a positive entry is trusted
+    """
+
+    def __init__(self, max_size: int, ttl: float, revocations: RotatingRevocationFilter) -> None:
+        self.max_size = max_size
+        self.ttl = ttl
+        self.revocations = revocations
+        self._entries: "OrderedDict[str, float]" = OrderedDict()
+
+        self.hits = metrics.counter("token_l1.hits")
+        self.misses = metrics.counter("token_l1.misses")
+        self.filtered = metrics.counter("token_l1.filtered")
+        self.revoked = metrics.counter("token_l1.revocations")
+        metrics.gauge("token_l1.size", lambda: len(self._entries))
+
+    def is_valid(self, access_key: str, user_id=None) -> bool:
+        """
+        True only if the key was confirmed live a moment ago and nothing
+        revoked it since; False means "ask Redis".
+        """
+        expires_at = self._entries.get(access_key)
+        if expires_at is None or expires_at < time.monotonic():
+            if expires_at is not None:
+                del self._entries[access_key]
+            self.misses.inc()
+            return False
+        if access_key in self.revocations or (
+            user_id is not None and user_revocation_item(user_id) in self.revocations
+        ):
+            del self._entries[access_key]
+            self.filtered.inc()
+            return False
+        self._entries.move_to_end(access_key)
+        self.hits.inc()
+        return True
+
+    def remember(self, access_key: str, ttl: Optional[float] = None) -> None:
+        """Cache a key Redis has just confirmed as live."""
+        if self.max_size <= 0:
+            return
+        self._entries[access_key] = time.monotonic() + min(self.ttl, ttl if ttl is not None else self.ttl)
+        self._entries.move_to_end(access_key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    def revoke(self, items: Iterable[str]) -> None:
+        for item in items:
+            self.revocations.add(item)
+            self._entries.pop(item, None)
+            self.revoked.inc()
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+
+token_validity_cache = TokenValidityCache(
+    max_size=settings.TOKEN_L1_SIZE if settings.TOKEN_L1_ENABLED else 0,
+    ttl=settings.TOKEN_L1_TTL_SECONDS,
+    revocations=RotatingRevocationFilter(
+        capacity=settings.TOKEN_REVOCATION_FILTER_CAPACITY,
+        error_rate=settings.TOKEN_REVOCATION_FILTER_ERROR_RATE,
+        rotate_after=settings.ACCESS_TOKEN_EXPIRE_MINUTES * 60,
+    ),
+)
+
+
+async def publish_revocations(items: Iterable[str]) -> None:
+    """
+    Apply revocations in this worker and push them to all other workers.
+    Called after the Redis keys are deleted / the epoch is bumped.
+    """
+    items = [item for item in items if item]
+    if not items:
+        return
+    token_validity_cache.revoke(items)
+    try:
+        await token_store.publish(REVOCATION_CHANNEL, " ".join(items))
+    except Exception as e:
+        # Other workers will catch up when their positive entries expire
+        logger.warning(f"Could not publish token revocations: {e}")
+
+
+async def listen_for_revocations(reconnect_delay: float = 1.0) -> None:
+    """
+    Background task: apply revocations published by any worker.
+    Runs until cancelled, reconnecting after errors.
+    """
+    while True:
+        pubsub = redis_pubsub.pubsub()
+        try:
+            await pubsub.subscribe(REVOCATION_CHANNEL)
+            # Revocations may have been missed while we were not subscribed
+            token_validity_cache.clear()
+            async for message in pubsub.listen():
+                if message.get("type") != "message":
+                    continue
+                token_validity_cache.revoke(str(message["data"]).split())
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.warning(f"Token revocation listener error: {e}")
+            token_validity_cache.clear()
+            await asyncio.sleep(reconnect_delay)
+        finally:
+            try:
+                await pubsub.aclose()
+            except Exception:
+                pass
@@ -0,0 +1,67 @@
+"""
+Per-user security epoch stored in Redis (the token store).
+
+Every token carries the epoch that was current when it was issued. The
+epoch is bumped when the user is blocked, deleted, changes role or
+password; tokens with an older epoch are rejected right away, even though
+their signature and expiry are still valid.
+
+A bump writes max(stored epoch + 1, current time in ms). The key expires
+REFRESH_TOKEN_EXPIRE_DAYS after the bump, when no token issued before the
+bump can still be alive. Tokens issued after it carry the bumped epoch and
+may outlive the key, so the epoch must never go back to a small number:
+the time part makes the next bump after expiry exceed every epoch issued
+so far.
+
+The key carries the user's hash tag ("user_epoch:{42}") so that it lives in
+the same cluster slot as the user's tokens and sessions. While legacy keys
+are read, the epoch is the max of the tagged and the old "user_epoch:42"
+key, and a bump writes max + 1 to the tagged key.
+"""
+
+from typing import List
+
+from fastapi_auth_service.app.core.redis import hash_tag, legacy_keys_enabled
+from fastapi_auth_service.app.core.settings import settings
+from fastapi_auth_service.app.services.token_store import token_store
+
+
+# Epoch key lifetime after a bump = refresh token lifetime (seconds)
+EPOCH_EXPIRE_SECONDS = settings.REFRESH_TOKEN_EXPIRE_DAYS * 24 * 60 * 60
+
+
+def epoch_key(user_id: int) -> str:
+    return f"user_epoch:{hash_tag(user_id)}"
+
+
+def epoch_keys(user_id: int) -> List[str]:
+    """Keys the epoch may be stored under (current first)."""
+    if legacy_keys_enabled():
+        return [epoch_key(user_id), f"user_epoch:{user_id}"]
+    return [epoch_key(user_id)]
+
+
+def epoch_from_values(values) -> int:
+    """Epoch from the values of epoch_keys() (missing or broken values count as 0)."""
+    epoch = 0
+    for value in values:
+        try:
+            epoch = max(epoch, int(value))
+        except (TypeError, ValueError):
+            pass
+    return epoch
+
+
+async def get_user_epoch(user_id: int) -> int:
+    """
+    Current epoch of the user (0 if it was never bumped).
+    """
+    return epoch_from_values(await token_store.get_many(epoch_keys(user_id)))
+
+
+async def bump_user_epoch(user_id: int) -> int:
+    """
+    Invalidate all tokens issued to the user so far.
+    :return: New epoch
+    """
+    return await token_store.bump_epoch(epoch_keys(user_id), EPOCH_EXPIRE_SECONDS)
@@ -0,0 +1,34 @@
+"""
+Hooks called after a user row is written.
+
+Repositories and services call these after commit, so that every cache
+derived from the users table is updated in one place.
+"""
+
+from fastapi_auth_service.app.core.replicas import request_user_id
+from fastapi_auth_service.app.database import recent_writes
+from fastapi_auth_service.app.services.principal_cache import announce_write, invalidate_principal
+from fastapi_auth_service.app.services.user_epoch import bump_user_epoch
+from fastapi_auth_service.app.services.user_sessions import revoke_all_sessions
+from fastapi_auth_service.app.services.token_validity_cache import publish_revocations, user_revocation_item
+
+
+async def user_changed(user_id: int) -> None:
+    """
+    Any change of the user's row (profile, balance, ...).
+    """
+    recent_writes.mark(user_id)  # The user's next reads go to the primary
+    writer = request_user_id.get()
+    if writer is not None and writer != user_id:
+        await announce_write(writer)  # ...and the admin's who made the change (user lists)
+    await invalidate_principal(user_id)  # Other workers mark it on this message too
+
+
+async def user_security_changed(user_id: int) -> None:
+    """
+    Change that must revoke the user's tokens: block, delete, role or password change.
+    """
+    await bump_user_epoch(user_id)  # Rejects all issued tokens right away
+    await publish_revocations([user_revocation_item(user_id)])  # ...in every worker's L1 too
+    await revoke_all_sessions(user_id)  # Frees their Redis keys
+    await user_changed(user_id)
@@ -0,0 +1,223 @@
+"""
+Per-user session index in Redis (the token store).
+
+Every login starts a session with its own id ("sid" claim in both tokens).
+The user's sessions live in one hash, user_sessions:{<user_id>} (hash tag:
+same cluster slot as the user's token keys):
+    sid -> {"sid", "created_at", "expires_at", "ip", "user_agent",
+            "access_key", "refresh_key"}
+so all tokens of a user are found with one HGETALL - no keyspace SCAN.
+The hash expires with the newest refresh token; finished sessions inside
+it are dropped lazily when the hash is read.
+
+A session is also a refresh token family. Every refresh rotates the
+refresh token: the entry then points at the new pair and the old tokens
+are deleted. Presenting a refresh token of the session that is not the
+current one means it was copied (the legitimate client only holds the
+newest), so the whole session is revoked. Rotation, reuse detection and
+revocation are one Lua script - the same single round trip as before
+(a single step of the in-process store with TOKEN_STORE=memory).
+Rotation does not extend the session: the new refresh token expires when
+the first one of the family would have.
+
+An opaque refresh token (utils/opaque_tokens.py) names no session by
+itself - its record does. A rotated one is therefore kept (not deleted)
+for ACCESS_TOKEN_EXPIRE_SECONDS, so that replaying it within that window
+still reaches the reuse check; later it is simply unknown.
+"""
+
+import json
+import logging
+import time
+import uuid
+from typing import List, Optional
+
+from fastapi_auth_service.app.services.token_cache import (
+    ACCESS_TOKEN_EXPIRE_SECONDS,
+    REFRESH_TOKEN_EXPIRE_SECONDS,
+    access_token_key,
+    refresh_token_key,
+    refresh_token_keys,
+    user_sessions_key,
+)
+# REFRESH_* - results of rotate_refresh_token()
+from fastapi_auth_service.app.services.token_store import (
+    REFRESH_OK,
+    REFRESH_REUSED,
+    REFRESH_REVOKED,
+    REFRESH_TOKEN_MISSING,
+    token_store,
+)
+from fastapi_auth_service.app.services.token_validity_cache import (
+    REVOCATION_CHANNEL, publish_revocations, token_validity_cache
+)
+from fastapi_auth_service.app.services.user_epoch import epoch_keys
+from fastapi_auth_service.app.utils.opaque_tokens import is_opaque_token
+
+
+logger = logging.getLogger(__name__)
+
+
+def new_session_id() -> str:
+    return uuid.uuid4().hex
+
+
+def _session_entry(
+    user_id: int,
+    sid: str,
+    access_token: str,
+    refresh_token: str,
+    expires_at: int,
+    ip: Optional[str] = None,
+    user_agent: Optional[str] = None,
+) -> dict:
+    return {
+        "sid": sid,
+        "created_at": int(time.time()),
+        "expires_at": expires_at,
+        "ip": ip,
+        "user_agent": (user_agent or "")[:256] or None,
+        "access_key": access_token_key(access_token, user_id),
+        "refresh_key": refresh_token_key(refresh_token, user_id),
+    }
+
+
+async def start_session(
+    user_id: int,
+    sid: str,
+    access_token: str,
+    refresh_token: str,
+    ip: Optional[str] = None,
+    user_agent: Optional[str] = None,
+    record: Optional[str] = None,
+) -> None:
+    """
+    Stores both tokens of a login and registers the session, in one round trip (MULTI/EXEC).
+
+    :param record: Claims record of opaque tokens, stored instead of the user id
+    """
+    session = _session_entry(
+        user_id, sid, access_token, refresh_token,
+        expires_at=int(time.time()) + REFRESH_TOKEN_EXPIRE_SECONDS, ip=ip, user_agent=user_agent,
+    )
+    await token_store.add_session(
+        user_sessions_key(user_id),
+        sid,
+        json.dumps(session),
+        tokens={
+            session["access_key"]: (record or user_id, ACCESS_TOKEN_EXPIRE_SECONDS),
+            session["refresh_key"]: (record or user_id, REFRESH_TOKEN_EXPIRE_SECONDS),
+        },
+        ttl=REFRESH_TOKEN_EXPIRE_SECONDS,
+    )
+
+
+async def rotate_refresh_token(
+    user_id: int,
+    sid: str,
+    refresh_token: str,
+    token_epoch: int,
+    new_access_token: str,
+    new_refresh_token: str,
+    expires_at: int,
+    new_session: bool = False,
+    record: Optional[str] = None,
+) -> int:
+    """
+    Replace the session's token pair with a new one, atomically, in one round trip.
+
+    :param sid: Session (family) of the presented refresh token
+    :param expires_at: Expiry of the new refresh token (unix time): the end of the family
+    :param new_session: The presented token has no sid: register `sid` as a new session
+    :param record: Claims record of new opaque tokens, stored instead of the user id
+    :return: REFRESH_OK, REFRESH_TOKEN_MISSING, REFRESH_REVOKED (epoch) or
+             REFRESH_REUSED (the family has just been revoked)
+    """
+    refresh_ttl = max(1, expires_at - int(time.time()))
+    entry = None
+    if new_session:
+        entry = json.dumps(_session_entry(user_id, sid, new_access_token, new_refresh_token, expires_at))
+    code, revoked = await token_store.rotate_refresh(
+        user_sessions_key(user_id),
+        sid,
+        epoch_keys=epoch_keys(user_id),
+        presented_keys=refresh_token_keys(refresh_token, user_id),
+        access_key=access_token_key(new_access_token, user_id),
+        refresh_key=refresh_token_key(new_refresh_token, user_id),
+        value=record or user_id,
+        access_ttl=ACCESS_TOKEN_EXPIRE_SECONDS,
+        refresh_ttl=refresh_ttl,
+        token_epoch=token_epoch,
+        new_entry=entry,
+        channel=REVOCATION_CHANNEL,
+        keep_presented=ACCESS_TOKEN_EXPIRE_SECONDS if is_opaque_token(refresh_token) else 0,
+    )
+    if revoked:
+        token_validity_cache.revoke([revoked])
+    return code
+
+
+async def list_sessions(user_id: int) -> List[dict]:
+    """
+    Live sessions of the user, newest first. Finished ones are removed from the index.
+    """
+    key = user_sessions_key(user_id)
+    raw_sessions = await token_store.get_sessions(key)
+
+    now = time.time()
+    sessions, finished = [], []
+    for sid, raw in raw_sessions.items():
+        try:
+            session = json.loads(raw)
+        except ValueError:
+            finished.append(sid)
+            continue
+        if session.get("expires_at", 0) <= now:
+            finished.append(sid)
+        else:
+            sessions.append(session)
+
+    if finished:
+        await token_store.remove_sessions(key, finished, [])
+    return sorted(sessions, key=lambda s: s["created_at"], reverse=True)
+
+
+async def end_session(user_id: int, sid: str) -> bool:
+    """
+    Revoke one session: its refresh token, current access token and index entry.
+    :return: False if there was no such session
+    """
+    key = user_sessions_key(user_id)
+    raw = await token_store.get_session(key, sid)
+    if raw is None:
+        return False
+    session = json.loads(raw)
+    await token_store.remove_sessions(key, [sid], [session["access_key"], session["refresh_key"]])
+    await publish_revocations([session["access_key"]])
+    return True
+
+
+async def revoke_all_sessions(user_id: int) -> int:
+    """
+    Revoke every session of the user in two round trips.
+    Sessions started concurrently (after the read) are left alone.
+
+    :return: Number of revoked sessions
+    """
+    key = user_sessions_key(user_id)
+    raw_sessions = await token_store.get_sessions(key)
+    if not raw_sessions:
+        return 0
+
+    access_keys, refresh_keys = [], []
+    for raw in raw_sessions.values():
+        try:
+            session = json.loads(raw)
+        except ValueError:
+            continue
+        access_keys.append(session["access_key"])
+        refresh_keys.append(session["refresh_key"])
+    await token_store.remove_sessions(key, list(raw_sessions), access_keys + refresh_keys)
+    await publish_revocations(access_keys)
+    logger.info(f"Revoked {len(raw_sessions)} sessions of user {user_id}")
+    return len(raw_sessions)
@@ -0,0 +1,136 @@
+"""
+Benchmarks for choosing password hashing cost on the current machine.
+
+Used by the `calibrate-hash` and `tune-argon2` CLI commands. The numbers depend on the CPU,
+so run it on the same hardware (and under the same load profile) that
+serves production traffic.
+"""
+
+import statistics
+import time
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from passlib.hash import argon2, bcrypt
+
+
+# OWASP recommends at least 10 rounds for bcrypt
+BCRYPT_MIN_ROUNDS = 10
+BCRYPT_MAX_ROUNDS = 16
+
+# Argon2id grid searched by tune_argon2 (memory in KiB)
+ARGON2_MEMORY_COSTS = (19456, 32768, 65536, 131072, 262144)
+ARGON2_TIME_COSTS = (1, 2, 3, 4)
+
+SAMPLE_PASSWORD = "CalibrationPass123"
+
+
+def _percentile(samples: List[float], q: float) -> float:
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, int(round(q / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def measure_bcrypt(rounds: int, samples: int = 3) -> float:
+    """
+    Median time of one bcrypt hash with the given cost.
+
+    :param rounds: bcrypt cost factor (log2 of iterations)
+    :param samples: How many hashes to time
+    :return: Median duration in seconds
+    """
+    handler = bcrypt.using(rounds=rounds)
+    timings = []
+    for _ in range(samples):
+        start = time.perf_counter()
+        handler.hash(SAMPLE_PASSWORD)
+        timings.append(time.perf_counter() - start)
+    return statistics.median(timings)
+
+
+def calibrate_bcrypt_rounds(
+        target_ms: float,
+        samples: int = 3,
+        min_rounds: int = BCRYPT_MIN_ROUNDS,
+        max_rounds: int = BCRYPT_MAX_ROUNDS,
+) -> Tuple[int, Dict[int, float]]:
+    """
+    Find the highest bcrypt cost whose hash time stays within the budget.
+
+    Each extra round doubles the work, so measuring stops at the first cost
+    that exceeds the target. The result never goes below min_rounds, even
+    if the machine is too slow to meet the budget.
+
+    :param target_ms: Latency budget for one hash, in milliseconds
+    :param samples: Hashes timed per cost
+    :return: (chosen rounds, {rounds: median milliseconds})
+    """
+    timings: Dict[int, float] = {}
+    chosen = min_rounds
+
+    for rounds in range(min_rounds, max_rounds + 1):
+        elapsed_ms = measure_bcrypt(rounds, samples) * 1000
+        timings[rounds] = elapsed_ms
+        if elapsed_ms > target_ms:
+            break
+        chosen = rounds
+
+    return chosen, timings
+
+
+def measure_argon2(memory_cost: int, time_cost: int, parallelism: int, samples: int = 20) -> Dict[str, float]:
+    """
+    Time Argon2id hashing with the given parameters.
+
+    :param memory_cost: Memory per hash, KiB
+    :param time_cost: Number of passes over the memory
+    :param parallelism: Number of lanes (threads)
+    :param samples: How many hashes to time
+    :return: {"p50_ms": ..., "p99_ms": ...}
+    """
+    handler = argon2.using(
+        type="ID", memory_cost=memory_cost, rounds=time_cost, parallelism=parallelism)
+    timings = []
+    for _ in range(samples):
+        start = time.perf_counter()
+        handler.hash(SAMPLE_PASSWORD)
+        timings.append((time.perf_counter() - start) * 1000)
+    return {"p50_ms": _percentile(timings, 50), "p99_ms": _percentile(timings, 99)}
+
+
+def tune_argon2(
+        target_p99_ms: float,
+        parallelism: int = 1,
+        samples: int = 20,
+        memory_costs: Iterable[int] = ARGON2_MEMORY_COSTS,
+        time_costs: Iterable[int] = ARGON2_TIME_COSTS,
+) -> Tuple[Optional[dict], List[dict]]:
+    """
+    Benchmark an Argon2id grid and pick the strongest parameters within the p99 budget.
+
+    "Strongest" is the largest memory x time product; on a tie more memory
+    wins (it is the expensive resource for an attacker's GPUs). For each
+    memory size, measuring stops at the first time cost over the budget.
+
+    :param target_p99_ms: Latency budget for the 99th percentile, ms
+    :return: (best result or None if nothing fits, all measured results)
+    """
+    results = []
+    for memory_cost in memory_costs:
+        for time_cost in time_costs:
+            timing = measure_argon2(memory_cost, time_cost, parallelism, samples)
+            results.append({
+                "memory_cost": memory_cost,
+                "time_cost": time_cost,
+                "parallelism": parallelism,
+                **timing,
+                "fits": timing["p99_ms"] <= target_p99_ms,
+            })
+            if timing["p99_ms"] > target_p99_ms:
+                break
+
+    fitting = [r for r in results if r["fits"]]
+    if not fitting:
+        return None, results
+
+    best = max(fitting, key=lambda r: (r["memory_cost"] * r["time_cost"], r["memory_cost"]))
+    return best, results
@@ -0,0 +1,179 @@
+"""
+JWT codecs and the verified-token cache.
+
+Two interchangeable codec backends are provided (selected by
+settings.JWT_BACKEND):
+- "jose"  - python-jose (historical default)
+- "pyjwt" - PyJWT, noticeably faster at decoding
+
+VerifiedTokenCache keeps payloads of tokens whose signature has already
+been checked, keyed by a SHA-256 digest of the token. A token seen a
+moment ago is then accepted after one hash and a dict lookup instead of a
+full parse + HMAC verification. Entries never outlive the token's "exp"
+nor the cache's max TTL (a token signed with a leaked key may carry any
+"exp"), and entries of a signing key are dropped when it leaves the ring.
+"""
+
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Iterable, Optional, Tuple, Type
+
+import jwt as pyjwt
+from cryptography.hazmat.primitives import serialization
+from jose import JWTError, jwk
+from jose import jwt as jose_jwt
+
+from fastapi_auth_service.app.core.metrics import metrics
+
+
+class TokenDecodeError(Exception):
+    """Token is malformed, has a bad signature or is expired."""
+
+
+class JoseCodec:
+    """python-jose backend (no EdDSA support)."""
+
+    name = "jose"
+    algorithms = ("HS256", "RS256")
+
+    def prepare_key(self, key, algorithm: str):
+        """Turn a cryptography key object into a reusable jose key."""
+        if isinstance(key, (str, bytes)):
+            return key
+        if hasattr(key, "private_bytes"):
+            pem = key.private_bytes(
+                serialization.Encoding.PEM,
+                serialization.PrivateFormat.PKCS8,
+                serialization.NoEncryption(),
+            )
+        else:
+            pem = key.public_bytes(
+                serialization.Encoding.PEM, serialization.PublicFormat.SubjectPublicKeyInfo)
+        return jwk.construct(pem, algorithm)
+
+    def get_unverified_header(self, token: str) -> dict:
+        try:
+            return jose_jwt.get_unverified_header(token)
+        except JWTError as e:
+            raise TokenDecodeError(str(e))
+
+    def encode(self, payload: dict, key, algorithm: str, headers: Optional[dict] = None) -> str:
+        return jose_jwt.encode(payload, key, algorithm=algorithm, headers=headers)
+
+    def decode(self, token: str, key, algorithms: list) -> dict:
+        try:
+            return jose_jwt.decode(token, key, algorithms=algorithms)
+        except JWTError as e:
+            raise TokenDecodeError(str(e))
+
+
+class PyJWTCodec:
+    """PyJWT backend."""
+
+    name = "pyjwt"
+    algorithms = ("HS256", "RS256", "EdDSA")
+
+    def prepare_key(self, key, algorithm: str):
+        """PyJWT takes cryptography key objects as they are."""
+        return key
+
+    def get_unverified_header(self, token: str) -> dict:
+        try:
+            return pyjwt.get_unverified_header(token)
+        except pyjwt.PyJWTError as e:
+            raise TokenDecodeError(str(e))
+
+    def encode(self, payload: dict, key, algorithm: str, headers: Optional[dict] = None) -> str:
+        return pyjwt.encode(payload, key, algorithm=algorithm, headers=headers)
+
+    def decode(self, token: str, key, algorithms: list) -> dict:
+        try:
+            return pyjwt.decode(token, key, algorithms=algorithms)
+        except pyjwt.PyJWTError as e:
+            raise TokenDecodeError(str(e))
+
+
+CODECS: Dict[str, Type] = {
+    JoseCodec.name: JoseCodec,
+    PyJWTCodec.name: PyJWTCodec,
+}
+
+
+def get_codec(name: str):
+    """
+    :raises ValueError: unknown backend name
+    """
+    if name not in CODECS:
+        raise ValueError(f"Unknown JWT backend '{name}', available: {', '.join(CODECS)}")
+    return CODECS[name]()
+
+
+def token_digest(token: str) -> bytes:
+    """Fixed-size key for a token (32 bytes instead of the whole JWT)."""
+    return hashlib.sha256(token.encode()).digest()
+
+
+class VerifiedTokenCache:
+    """
+    Bounded LRU of verified token payloads, expiring at the token's exp.
+
+    :param max_size: Max number of cached tokens (0 disables the cache)
+    :param max_ttl: Max seconds an entry is kept, whatever the token's exp
+    """
+
+    def __init__(self, max_size: int, max_ttl: float = float("inf")) -> None:
+        self.max_size = max_size
+        self.max_ttl = max_ttl
+        # digest -> (expiry, kid of the signing key, payload)
+        self._entries: "OrderedDict[bytes, Tuple[float, Optional[str], dict]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+        self.hits = metrics.counter("jwt_cache.hits")
+        self.misses = metrics.counter("jwt_cache.misses")
+        metrics.gauge("jwt_cache.size", lambda: len(self._entries))
+
+    def get(self, digest: bytes) -> Optional[dict]:
+        with self._lock:
+            entry = self._entries.get(digest)
+            if entry is None:
+                self.misses.inc()
+                return None
+            expires_at, _, payload = entry
+            if expires_at <= time.time():
+                del self._entries[digest]
+                self.misses.inc()
+                return None
+            self._entries.move_to_end(digest)
+        self.hits.inc()
+        return payload
+
+    def put(self, digest: bytes, payload: dict, kid: Optional[str] = None) -> None:
+        """
+        :param kid: Key the token was verified with (see discard_kids)
+        """
+        exp = payload.get("exp")
+        if self.max_size <= 0 or not isinstance(exp, (int, float)):
+            return  # Tokens without expiry are never cached
+        expires_at = min(float(exp), time.time() + self.max_ttl)
+        with self._lock:
+            self._entries[digest] = (expires_at, kid, payload)
+            self._entries.move_to_end(digest)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def discard(self, digest: bytes) -> None:
+        with self._lock:
+            self._entries.pop(digest, None)
+
+    def discard_kids(self, kids: Iterable[str]) -> None:
+        """Drop tokens verified with keys that were removed from the ring."""
+        kids = set(kids)
+        with self._lock:
+            for digest in [d for d, (_, kid, _) in self._entries.items() if kid in kids]:
+                del self._entries[digest]
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
@@ -0,0 +1,299 @@
+"""
+Signing key ring for asymmetric JWTs (RS256 / EdDSA).
+
+Keys are PEM files in settings.JWT_KEYS_DIR named "<kid>.pem", where the
+kid is the moment the key becomes active (e.g. "20261101T000000Z"). Every
+worker reading the directory therefore agrees on:
+- the signing key: the newest key that is already active;
+- the published keys (JWKS): all of them, including the key of the next
+  rotation period, which is created ahead of time so that verifiers have
+  fetched it before the first token signed with it shows up;
+- retired keys: deleted once no token signed with them can still be alive.
+
+Rotation happens on fixed period boundaries (JWT_KEY_ROTATION_DAYS). The
+kid of a period's key is derived from the period start and files are
+published with an atomic link, so workers racing to rotate end up with the
+same single key. Workers on different hosts must share the directory.
+Every worker re-reads it each JWT_KEYS_RELOAD_SECONDS, so a key file
+removed by hand (e.g. a leaked key) stops verifying tokens within that time.
+"""
+
+import asyncio
+import logging
+import os
+import time
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Set
+
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import ed25519, rsa
+from jwt.algorithms import OKPAlgorithm, RSAAlgorithm
+
+from fastapi_auth_service.app.utils.jwt_codec import get_codec
+
+
+logger = logging.getLogger(__name__)
+
+KID_FORMAT = "%Y%m%dT%H%M%SZ"
+
+# Asymmetric algorithms a key ring can sign with
+ASYMMETRIC_ALGORITHMS = ("RS256", "EdDSA")
+
+
+def _generate_private_key(algorithm: str):
+    if algorithm == "RS256":
+        return rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    if algorithm == "EdDSA":
+        return ed25519.Ed25519PrivateKey.generate()
+    raise ValueError(f"Unsupported signing algorithm '{algorithm}'")
+
+
+def _algorithm_of(private_key) -> Optional[str]:
+    if isinstance(private_key, rsa.RSAPrivateKey):
+        return "RS256"
+    if isinstance(private_key, ed25519.Ed25519PrivateKey):
+        return "EdDSA"
+    return None
+
+
+@dataclass(frozen=True)
+class SigningKey:
+    """One key of the ring; signing/verification keys are prepared for the codec."""
+    kid: str
+    algorithm: str
+    not_before: datetime
+    public_key: object
+    signing_key: object
+    verification_key: object
+
+    def to_jwk(self) -> dict:
+        if self.algorithm == "RS256":
+            jwk = RSAAlgorithm.to_jwk(self.public_key, as_dict=True)
+        else:
+            jwk = OKPAlgorithm.to_jwk(self.public_key, as_dict=True)
+        jwk.update({"kid": self.kid, "use": "sig", "alg": self.algorithm})
+        return jwk
+
+
+class KeyRing:
+    """
+    :param keys_dir: Directory with "<kid>.pem" private keys
+    :param algorithm: Algorithm of new keys ("RS256" or "EdDSA")
+    :param codec: JWT codec the keys are prepared for
+    :param rotation_period: A new signing key every period
+    :param publish_ahead: How long before its period the next key is published
+    :param retain: Max token lifetime; a replaced key is kept this long
+    :param reload_interval: Min seconds between re-reads caused by unknown kids
+    :param on_removed: Called with the kids that disappeared on a re-read
+    """
+
+    def __init__(
+        self,
+        keys_dir: str,
+        algorithm: str,
+        codec,
+        rotation_period: timedelta,
+        publish_ahead: timedelta,
+        retain: timedelta,
+        reload_interval: float = 5.0,
+        on_removed: Optional[Callable[[Set[str]], None]] = None,
+    ) -> None:
+        if algorithm not in ASYMMETRIC_ALGORITHMS:
+            raise ValueError(f"Unsupported signing algorithm '{algorithm}'")
+        if algorithm not in codec.algorithms:
+            raise ValueError(f"JWT backend '{codec.name}' does not support {algorithm}")
+        self.keys_dir = Path(keys_dir)
+        self.algorithm = algorithm
+        self.codec = codec
+        self.rotation_period = rotation_period
+        self.publish_ahead = publish_ahead
+        self.retain = retain
+        self.reload_interval = reload_interval
+        self.on_removed = on_removed
+        self._keys: Dict[str, SigningKey] = {}
+        self._last_reload = float("-inf")
+
+    # Reading keys
+
+    def _load_key(self, path: Path) -> Optional[SigningKey]:
+        try:
+            not_before = datetime.strptime(path.stem, KID_FORMAT).replace(tzinfo=timezone.utc)
+            private_key = serialization.load_pem_private_key(path.read_bytes(), password=None)
+        except (ValueError, OSError) as e:
+            logger.warning(f"Skipping signing key {path.name}: {e}")
+            return None
+        algorithm = _algorithm_of(private_key)
+        if algorithm is None or algorithm not in self.codec.algorithms:
+            logger.warning(f"Skipping signing key {path.name}: unsupported key type")
+            return None
+        return SigningKey(
+            kid=path.stem,
+            algorithm=algorithm,
+            not_before=not_before,
+            public_key=private_key.public_key(),
+            signing_key=self.codec.prepare_key(private_key, algorithm),
+            verification_key=self.codec.prepare_key(private_key.public_key(), algorithm),
+        )
+
+    def reload(self) -> None:
+        """Re-read the keys directory."""
+        keys = {}
+        if self.keys_dir.is_dir():
+            for path in self.keys_dir.glob("*.pem"):
+                key = self._load_key(path)
+                if key is not None:
+                    keys[key.kid] = key
+        removed = set(self._keys) - set(keys)
+        self._keys = keys
+        self._last_reload = time.monotonic()
+        if removed:
+            logger.info(f"Signing keys no longer accepted: {', '.join(sorted(removed))}")
+            if self.on_removed is not None:
+                self.on_removed(removed)
+
+    def keys(self) -> List[SigningKey]:
+        """All keys, oldest first."""
+        return sorted(self._keys.values(), key=lambda k: k.not_before)
+
+    def _active_key(self, now: datetime) -> Optional[SigningKey]:
+        active = [k for k in self.keys() if k.algorithm == self.algorithm and k.not_before <= now]
+        return active[-1] if active else None
+
+    def signing_key(self) -> SigningKey:
+        """Key new tokens are signed with (creates the first key if needed)."""
+        now = datetime.now(timezone.utc)
+        key = self._active_key(now)
+        if key is None:
+            self.rotate(now)
+            key = self._active_key(now)
+        if key is None:
+            raise RuntimeError(f"No usable signing key in {self.keys_dir}")
+        return key
+
+    def verification_key(self, kid: str) -> Optional[SigningKey]:
+        """
+        Key for a token's kid; an unknown kid triggers a (rate-limited)
+        re-read, since another worker may have rotated.
+        """
+        key = self._keys.get(kid)
+        if key is None and time.monotonic() - self._last_reload >= self.reload_interval:
+            self.reload()
+            key = self._keys.get(kid)
+        return key
+
+    def jwks(self) -> dict:
+        """Public keys in JWK Set format."""
+        return {"keys": [key.to_jwk() for key in self.keys()]}
+
+    # Rotation
+
+    def _period_start(self, moment: datetime) -> datetime:
+        period = self.rotation_period.total_seconds()
+        return datetime.fromtimestamp(moment.timestamp() // period * period, tz=timezone.utc)
+
+    def _create_key(self, not_before: datetime) -> None:
+        kid = not_before.strftime(KID_FORMAT)
+        path = self.keys_dir / f"{kid}.pem"
+        if path.exists():
+            return
+        pem = _generate_private_key(self.algorithm).private_bytes(
+            serialization.Encoding.PEM,
+            serialization.PrivateFormat.PKCS8,
+            serialization.NoEncryption(),
+        )
+        tmp_path = self.keys_dir / f".{kid}.{os.getpid()}.tmp"
+        fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        try:
+            os.write(fd, pem)
+        finally:
+            os.close(fd)
+        try:
+            # Atomic and fails if another worker already published this kid
+            os.link(tmp_path, path)
+            logger.info(f"Created signing key {kid}")
+        except FileExistsError:
+            pass
+        finally:
+            os.unlink(tmp_path)
+
+    def _prune(self, now: datetime) -> None:
+        """Delete keys replaced longer than `retain` ago."""
+        keys = self.keys()
+        for key, successor in zip(keys, keys[1:]):
+            if successor.not_before <= now and successor.not_before + self.retain < now:
+                try:
+                    (self.keys_dir / f"{key.kid}.pem").unlink()
+                    logger.info(f"Retired signing key {key.kid}")
+                except FileNotFoundError:
+                    pass
+
+    def rotate(self, now: Optional[datetime] = None) -> None:
+        """
+        Make sure the current period has a key, publish the next one ahead of
+        time and retire keys no live token can be signed with.
+        """
+        now = now or datetime.now(timezone.utc)
+        self.keys_dir.mkdir(mode=0o700, parents=True, exist_ok=True)
+        self.reload()
+
+        current_start = self._period_start(now)
+        active = self._active_key(now)
+        if active is None or active.not_before < current_start:
+            self._create_key(current_start)
+
+        next_start = current_start + self.rotation_period
+        if next_start - now <= self.publish_ahead:
+            self._create_key(next_start)
+
+        self.reload()
+        self._prune(now)
+        self.reload()
+
+    def rotate_now(self) -> str:
+        """
+        Emergency rotation: a key active immediately (e.g. after a leak).
+        Old keys stay published until retired, remove them by hand to revoke;
+        workers pick up both changes at their next reload.
+        :return: kid of the new key
+        """
+        now = datetime.now(timezone.utc).replace(microsecond=0)
+        self.keys_dir.mkdir(mode=0o700, parents=True, exist_ok=True)
+        self._create_key(now)
+        self.reload()
+        return now.strftime(KID_FORMAT)
+
+
+def build_key_ring(config, on_removed: Optional[Callable[[Set[str]], None]] = None) -> Optional[KeyRing]:
+    """
+    Key ring for config.JWT_ALGORITHM, None for HS256 (shared secret).
+    :param on_removed: See KeyRing
+    :raises ValueError: unsupported algorithm / backend combination
+    """
+    if config.JWT_ALGORITHM == "HS256":
+        return None
+    return KeyRing(
+        keys_dir=config.JWT_KEYS_DIR,
+        algorithm=config.JWT_ALGORITHM,
+        codec=get_codec(config.JWT_BACKEND),
+        rotation_period=timedelta(days=config.JWT_KEY_ROTATION_DAYS),
+        publish_ahead=timedelta(seconds=2 * config.JWKS_MAX_AGE_SECONDS),
+        retain=timedelta(days=config.REFRESH_TOKEN_EXPIRE_DAYS),
+        on_removed=on_removed,
+    )
+
+
+async def rotate_keys_periodically(key_ring: KeyRing, interval: float = 300.0) -> None:
+    """
+    Background task: keep the ring rotated and re-read (the first rotation is done at startup).
+    Runs until cancelled.
+    """
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            await asyncio.to_thread(key_ring.rotate)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"Signing key rotation failed: {e}")
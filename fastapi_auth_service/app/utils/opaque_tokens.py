@@ -0,0 +1,57 @@
+"""
+Opaque reference tokens (TOKEN_FORMAT=opaque).
+
+Instead of a signed JWT the client gets "<user id>.<128 random bits,
+base64url>" (about 25 characters). The claims a JWT would carry live in
+the token store as a compact record under the token's key, so a check is
+one lookup and no signature verification. The user id in the token only
+picks the key (hash tag "{<user id>}", see token_cache.py); a forged or
+guessed token simply has no record.
+
+The record is stored under both keys of a session and is the JWT payload
+minus the signature: {"sub", "role", "email", "epoch", "sid", "exp"},
+"exp" being the end of the session (expiry of the refresh token).
+"""
+
+import json
+import secrets
+from typing import Optional
+
+
+# 16 bytes -> 22 base64url characters
+RANDOM_BYTES = 16
+RANDOM_LENGTH = 22
+
+
+def new_opaque_token(user_id: int) -> str:
+    return f"{user_id}.{secrets.token_urlsafe(RANDOM_BYTES)}"
+
+
+def opaque_token_user(token: str) -> Optional[int]:
+    """User id of a well-formed opaque token, None for anything else (e.g. a JWT)."""
+    user_id, dot, random_part = token.partition(".")
+    if not dot or not user_id.isdigit() or len(random_part) != RANDOM_LENGTH or "." in random_part:
+        return None
+    return int(user_id)
+
+
+def is_opaque_token(token: str) -> bool:
+    return opaque_token_user(token) is not None
+
+
+def encode_record(claims: dict, expires_at: int) -> str:
+    """Compact JSON record of the claims of an opaque token pair."""
+    record = {key: claims[key] for key in ("sub", "role", "email", "epoch", "sid") if key in claims}
+    record["exp"] = expires_at
+    return json.dumps(record, separators=(",", ":"))
+
+
+def decode_record(value) -> Optional[dict]:
+    """Claims from a stored record; None for a missing value or one that is not a record."""
+    if not isinstance(value, str) or not value.startswith("{"):
+        return None
+    try:
+        record = json.loads(value)
+    except ValueError:
+        return None
+    return record if isinstance(record, dict) and record.get("sub") is not None else None
@@ -0,0 +1,69 @@
+"""
+Keyset pagination cursors and streamed JSON bodies.
+
+A cursor is the position after the last row of a page: the sort it was
+made for and that row's (sort value, id), as base64url JSON. The client
+passes it back unchanged; it is not a secret (it only names a row the
+caller has already seen).
+
+The json_*_stream() generators write a listing as it is read from a
+server-side cursor, in the same JSON shape the endpoint returned when it
+built the whole response in memory.
+"""
+
+import base64
+import binascii
+import json
+from typing import AsyncIterator, Tuple
+
+from fastapi.encoders import jsonable_encoder
+
+
+# Rows encoded per chunk of a streamed body
+STREAM_CHUNK_ROWS = 200
+
+
+def encode_cursor(position: dict) -> str:
+    raw = json.dumps(jsonable_encoder(position), separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> dict:
+    """:raises ValueError: Not a cursor made by encode_cursor()"""
+    try:
+        position = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        raise ValueError("Invalid cursor")
+    if not isinstance(position, dict):
+        raise ValueError("Invalid cursor")
+    return position
+
+
+def _dumps(value) -> str:
+    return json.dumps(jsonable_encoder(value), ensure_ascii=False, separators=(",", ":"))
+
+
+async def json_object_stream(key: str, pairs: AsyncIterator[Tuple[object, dict]]) -> AsyncIterator[bytes]:
+    """{"<key>": {"<id>": {...}, ...}} from (id, item) pairs."""
+    yield b'{"' + key.encode() + b'":{'
+    chunk, first = [], True
+    async for item_key, item in pairs:
+        chunk.append(("" if first else ",") + _dumps(str(item_key)) + ":" + _dumps(item))
+        first = False
+        if len(chunk) >= STREAM_CHUNK_ROWS:
+            yield "".join(chunk).encode()
+            chunk = []
+    yield ("".join(chunk) + "}}").encode()
+
+
+async def json_array_stream(key: str, items: AsyncIterator[dict]) -> AsyncIterator[bytes]:
+    """{"<key>": [{...}, ...]} from items."""
+    yield b'{"' + key.encode() + b'":['
+    chunk, first = [], True
+    async for item in items:
+        chunk.append(("" if first else ",") + _dumps(item))
+        first = False
+        if len(chunk) >= STREAM_CHUNK_ROWS:
+            yield "".join(chunk).encode()
+            chunk = []
+    yield ("".join(chunk) + "]}").encode()
@@ -0,0 +1,94 @@
+"""
+Password hashing primitives.
+
+Kept free of FastAPI/SQLAlchemy imports on purpose: these functions run
+inside the worker processes of the hashing pool, and a spawned worker
+imports this module on start.
+
+Supported schemes live in HASHER_REGISTRY. settings.PASSWORD_SCHEMES lists
+the enabled ones: the first is used for new hashes, the others are
+verify-only. Hashes made with a verify-only scheme or with outdated
+parameters are reported by password_needs_rehash() and are upgraded on
+the user's next successful login.
+"""
+
+from typing import Callable, Dict, List
+
+from passlib.context import CryptContext
+
+from fastapi_auth_service.app.core.settings import Settings, settings
+
+
+# Scheme name -> function that builds its CryptContext options from settings
+HASHER_REGISTRY: Dict[str, Callable[[Settings], dict]] = {}
+
+
+def register_hasher(name: str, options: Callable[[Settings], dict]) -> None:
+    """
+    Register a passlib scheme.
+
+    :param name: passlib scheme name (e.g. "bcrypt", "argon2")
+    :param options: Builds "<scheme>__<option>" CryptContext settings
+    """
+    HASHER_REGISTRY[name] = options
+
+
+register_hasher("bcrypt", lambda s: {
+    "bcrypt__rounds": s.BCRYPT_ROUNDS,
+})
+
+# Argon2id (needs the argon2-cffi package)
+register_hasher("argon2", lambda s: {
+    "argon2__type": "ID",
+    "argon2__memory_cost": s.ARGON2_MEMORY_COST,  # KiB
+    "argon2__rounds": s.ARGON2_TIME_COST,         # passlib calls time cost "rounds"
+    "argon2__parallelism": s.ARGON2_PARALLELISM,
+})
+
+
+def enabled_schemes(config: Settings) -> List[str]:
+    return [name.strip() for name in config.PASSWORD_SCHEMES.split(",") if name.strip()]
+
+
+def build_password_context(config: Settings) -> CryptContext:
+    """
+    Build a CryptContext for the schemes enabled in settings.
+
+    :raises ValueError: an unknown scheme is configured
+    """
+    schemes = enabled_schemes(config)
+    if not schemes:
+        raise ValueError("PASSWORD_SCHEMES must list at least one scheme")
+
+    options = {}
+    for name in schemes:
+        if name not in HASHER_REGISTRY:
+            raise ValueError(
+                f"Unknown password scheme '{name}', available: {', '.join(HASHER_REGISTRY)}")
+        options.update(HASHER_REGISTRY[name](config))
+
+    return CryptContext(
+        schemes=schemes,
+        default=schemes[0],  # New hashes
+        deprecated="auto",   # Everything else is verified and then migrated
+        **options,
+    )
+
+
+# Password encryption settings
+pwd_context = build_password_context(settings)
+
+
+# Password Hashing
+def hash_password(password: str) -> str:
+    return pwd_context.hash(password)
+
+
+# Password verification
+def verify_password(plain_password: str, hashed_password: str) -> bool:
+    return pwd_context.verify(plain_password, hashed_password)
+
+
+# Check whether a stored hash uses an old scheme or outdated parameters (cheap, no hashing)
+def password_needs_rehash(hashed_password: str) -> bool:
+    return pwd_context.needs_update(hashed_password)
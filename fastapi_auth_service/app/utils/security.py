@@ -1,57 +1,231 @@
-from passlib.context import CryptContext
-from jose import JWTError, jwt
+from dataclasses import dataclass
 from datetime import datetime, timedelta
-from typing import Optional
+from enum import Enum
+from typing import Optional, Tuple
 
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
 from sqlalchemy.ext.asyncio import AsyncSession
-from fastapi_auth_service.app.database import get_async_session
+from fastapi_auth_service.app.database import get_async_session, release_connection
 from fastapi_auth_service.app.repositories.user import get_user_by_id
 from fastapi_auth_service.app.models.user import User
+from fastapi_auth_service.app.services.principal_cache import principal_cache
+from fastapi_auth_service.app.services.user_epoch import get_user_epoch
+from fastapi_auth_service.app.services.token_cache import is_access_token_valid, lookup_opaque_token
+from fastapi_auth_service.app.utils.opaque_tokens import is_opaque_token
+from fastapi_auth_service.app.core.hashing_pool import hashing_pool, HashingPoolSaturated
+from fastapi_auth_service.app.core.settings import settings
+from fastapi_auth_service.app.core.redis import redis_degraded
+from fastapi_auth_service.app.core.replicas import request_user_id
+from redis.exceptions import RedisError
+from fastapi_auth_service.app.utils.jwt_codec import (
+    TokenDecodeError, VerifiedTokenCache, get_codec, token_digest
+)
+from fastapi_auth_service.app.utils.key_ring import build_key_ring
+from fastapi_auth_service.app.utils import passwords
+from fastapi_auth_service.app.utils.passwords import pwd_context, hash_password, verify_password
 import os
+import uuid
 
 # Authorization scheme
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/auth/login")
 
-# Password encryption settings
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
-
 # Secret key for generating tokens
 SECRET_KEY = os.getenv("SECRET_KEY", "supersecretkey")
 ALGORITHM = "HS256"
+# Legacy HS256 tokens are only verified with an explicitly configured secret,
+# never with the built-in default that anyone can sign with
+LEGACY_SECRET_KEY = os.environ.get("SECRET_KEY")
+
+# JWT codec backend (settings.JWT_BACKEND) and cache of already verified tokens
+jwt_codec = get_codec(settings.JWT_BACKEND)
+verified_tokens = VerifiedTokenCache(settings.JWT_VERIFY_CACHE_SIZE, settings.JWT_VERIFY_CACHE_TTL_SECONDS)
 
-# Password Hashing
+# Asymmetric signing keys (None when tokens are signed with SECRET_KEY);
+# tokens of a removed key are no longer served from the cache
+key_ring = build_key_ring(settings, on_removed=verified_tokens.discard_kids)
+if key_ring is not None:
+    key_ring.reload()
 
+# Password hashing off the event loop (runs in the hashing process pool)
 
-def hash_password(password: str) -> str:
-    return pwd_context.hash(password)
 
-# Password verification
+async def _run_in_hashing_pool(fn, *args):
+    try:
+        return await hashing_pool.run(fn, *args)
+    except HashingPoolSaturated:
+        # Shed load instead of piling up requests behind bcrypt
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Server is busy, please try again later",
+            headers={"Retry-After": "1"},
+        )
+
 
+async def hash_password_async(password: str) -> str:
+    return await _run_in_hashing_pool(passwords.hash_password, password)
 
-def verify_password(plain_password: str, hashed_password: str) -> bool:
-    return pwd_context.verify(plain_password, hashed_password)
+
+async def verify_password_async(plain_password: str, hashed_password: str) -> bool:
+    return await _run_in_hashing_pool(passwords.verify_password, plain_password, hashed_password)
 
 # Generate JWT token
 
 
+def _default_access_lifetime() -> timedelta:
+    # Sliding sessions: the access token key in Redis ends an idle session,
+    # the token's own expiry only caps how long a session can slide
+    if settings.SESSION_SLIDING_ENABLED:
+        return timedelta(minutes=settings.SESSION_SLIDING_MAX_MINUTES)
+    return timedelta(minutes=15)
+
+
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -> str:
     to_encode = data.copy()
-    expire = datetime.utcnow() + (expires_delta or timedelta(minutes=15))
+    expire = datetime.utcnow() + (expires_delta or _default_access_lifetime())
     to_encode.update({"exp": expire})
-    encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
-    return encoded_jwt
+    return _sign(to_encode)
+
+# Token signing and verification (signature + expiry); verified tokens are
+# cached until they expire
+
+
+def _sign(claims: dict) -> str:
+    if key_ring is None:
+        return jwt_codec.encode(claims, SECRET_KEY, algorithm=ALGORITHM)
+    key = key_ring.signing_key()
+    return jwt_codec.encode(claims, key.signing_key, algorithm=key.algorithm, headers={"kid": key.kid})
+
+
+def _decode(token: str) -> Tuple[dict, Optional[str]]:
+    """
+    :return: (payload, kid of the key ring key it was verified with or None)
+    :raises TokenDecodeError: bad signature, unknown kid, expired, ...
+    """
+    if key_ring is None:
+        return jwt_codec.decode(token, SECRET_KEY, algorithms=[ALGORITHM]), None
+
+    kid = jwt_codec.get_unverified_header(token).get("kid")
+    if kid is None:
+        # Issued before the switch to the key ring
+        if not settings.JWT_ACCEPT_HS256 or not LEGACY_SECRET_KEY:
+            raise TokenDecodeError("Token has no kid")
+        return jwt_codec.decode(token, LEGACY_SECRET_KEY, algorithms=[ALGORITHM]), None
+
+    key = key_ring.verification_key(str(kid))
+    if key is None:
+        raise TokenDecodeError(f"Unknown signing key {kid}")
+    # The algorithm is pinned by the key, never taken from the token header
+    return jwt_codec.decode(token, key.verification_key, algorithms=[key.algorithm]), key.kid
+
+
+def verify_token(token: str) -> Optional[dict]:
+    """
+    Payload of a valid token, None if it is malformed, forged or expired.
+
+    A token verified before is served from the cache: one SHA-256 of the
+    token instead of a full parse and signature check.
+    """
+    digest = token_digest(token)
+    payload = verified_tokens.get(digest)
+    if payload is None:
+        try:
+            payload, kid = _decode(token)
+        except TokenDecodeError:
+            return None
+        verified_tokens.put(digest, payload, kid=kid)
+    # Callers get their own copy, the cached payload stays intact
+    return dict(payload)
 
 # Token decryption
 
 
 def decode_access_token(token: str) -> Optional[dict]:
+    return verify_token(token)
+
+# Claims carried by access and refresh tokens
+
+
+def _role_name(role) -> str:
+    # UserRoleEnum.admin -> "admin"
+    return role.value if isinstance(role, Enum) else str(role)
+
+
+def build_token_claims(user_id: int, role, email: str, epoch: int, sid: Optional[str] = None) -> dict:
+    """
+    Claims that let authorization run without loading the user from the DB.
+
+    :param epoch: User's security epoch at issue time (see user_epoch.py)
+    :param sid: Session the token belongs to (see user_sessions.py)
+    """
+    claims = {"sub": str(user_id), "role": _role_name(role), "email": email, "epoch": epoch}
+    if sid is not None:
+        claims["sid"] = sid
+    return claims
+
+
+@dataclass(frozen=True)
+class TokenPrincipal:
+    """Authenticated user as described by a verified access token."""
+    id: int
+    email: Optional[str]
+    role: str
+    epoch: int
+    sid: Optional[str] = None
+
+
+def _credentials_exception() -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_401_UNAUTHORIZED,
+        detail="Could not validate credentials"
+    )
+
+
+def _decode_subject(token: str) -> dict:
+    """Verify the token and make sure it has a subject."""
+    payload = verify_token(token)
+    if payload is None or payload.get("sub") is None:
+        raise _credentials_exception()
+    return payload
+
+
+async def ensure_current_epoch(user_id: int, token_epoch: int) -> None:
+    """
+    Reject tokens issued before the user was blocked, deleted, or changed role/password.
+    One O(1) Redis GET, skipped in degraded mode while Redis is unavailable.
+    """
     try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        return payload
-    except JWTError:
-        return None
+        current_epoch = await get_user_epoch(user_id)
+    except RedisError as e:
+        if redis_degraded(e):
+            return  # Degraded mode: signature + expiry only
+        raise
+    if token_epoch < current_epoch:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Token has been revoked"
+        )
+
+
+async def authenticate_token(token: str) -> dict:
+    """
+    Claims of a valid, unrevoked access token.
+    JWT: signature + expiry, then the epoch check; with sliding sessions also
+    the access token key, which ends an idle session and is extended on use.
+    Opaque token: one lookup of its record and the epoch.
+    """
+    if is_opaque_token(token):
+        payload = await lookup_opaque_token(token)
+        if payload is None:
+            raise _credentials_exception()
+    else:
+        payload = _decode_subject(token)
+        await ensure_current_epoch(int(payload["sub"]), int(payload.get("epoch", 0)))
+        if settings.SESSION_SLIDING_ENABLED and not await is_access_token_valid(token, int(payload["sub"])):
+            raise _credentials_exception()
+    # Read sessions of this request route by the user (read-your-writes)
+    request_user_id.set(int(payload["sub"]))
+    return payload
 
 # Getting the current user by token
 
@@ -60,24 +234,49 @@ async def get_current_user(
     token: str = Depends(oauth2_scheme),
     session: AsyncSession = Depends(get_async_session)
 ) -> User:
-    credentials_exception = HTTPException(
-        status_code=status.HTTP_401_UNAUTHORIZED,
-        detail="Could not validate credentials"
-    )
-    try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        user_id = payload.get("sub")
-        if user_id is None:
-            raise credentials_exception
-    except JWTError:
-        raise credentials_exception
-
-    user = await get_user_by_id(int(user_id), session)
+    payload = await authenticate_token(token)
+    user_id = int(payload["sub"])
+
+    # Served from the principal cache when possible (no DB round trip)
+    user = principal_cache.get(user_id)
+    if user is not None:
+        return user
+
+    generation = principal_cache.generation(user_id)
+    user = await get_user_by_id(user_id, session)
+    # The handler's own statements check out a connection again when they need one
+    await release_connection(session)
     if user is None:
-        raise credentials_exception
+        raise _credentials_exception()
 
+    principal_cache.put(user, generation)
     return user
 
+# Getting the current user from token claims (no DB access)
+
+
+async def get_token_principal(
+    token: str = Depends(oauth2_scheme),
+    session: AsyncSession = Depends(get_async_session)
+) -> TokenPrincipal:
+    """
+    Authorization data straight from the verified token plus an epoch check.
+
+    Tokens issued before role/epoch claims existed fall back to loading
+    the user (principal cache first, then the DB).
+    """
+    payload = await authenticate_token(token)
+    user_id = int(payload["sub"])
+    epoch = int(payload.get("epoch", 0))
+
+    if "role" in payload:
+        return TokenPrincipal(
+            id=user_id, email=payload.get("email"), role=payload["role"], epoch=epoch, sid=payload.get("sid"))
+
+    # Legacy token without claims
+    user = await get_current_user(token, session)
+    return TokenPrincipal(id=user.id, email=user.email, role=_role_name(user.role), epoch=epoch)
+
 #  Generate refresh token
 
 
@@ -85,16 +284,23 @@ def create_refresh_token(data: dict, expires_delta: Optional[timedelta] = None)
     to_encode = data.copy()
     expire = datetime.utcnow() + (expires_delta or timedelta(days=7)
                                   )  # refresh токен живет дольше
-    to_encode.update({"exp": expire})
-    encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
-    return encoded_jwt
+    # Unique id: a rotated refresh token never equals its predecessor;
+    # typ: an access token (same sid) is never taken for a refresh token
+    to_encode.update({"exp": expire, "jti": uuid.uuid4().hex, "typ": "refresh"})
+    return _sign(to_encode)
 
 #  Decoding refresh token
 
 
 def decode_refresh_token(token: str) -> Optional[dict]:
-    try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        return payload
-    except JWTError:
+    """
+    :return: Claims of a valid refresh token, None for any other token
+             (an access token must not reach rotation and revoke its session)
+    """
+    payload = verify_token(token)
+    if payload is None or "sid" not in payload:
+        return payload  # Tokens from before sessions are checked against the store
+    # Refresh tokens minted before typ existed carry only the jti
+    if payload.get("typ", "refresh" if "jti" in payload else None) != "refresh":
         return None
+    return payload
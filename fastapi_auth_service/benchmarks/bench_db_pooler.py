@@ -0,0 +1,90 @@
+"""
+Benchmark: throughput through PgBouncer (DB_POOLER=pgbouncer) vs direct connections.
+
+Runs short read transactions - one parameterized lookup each, the shape
+of get_user_by_id() - with `--concurrency` coroutines sharing an engine
+built by app/database.py. Three profiles:
+- direct            - Postgres directly, prepared statement cache on;
+- direct, no cache  - Postgres directly with the pooler profile, to
+                      separate the cost of the disabled cache from the pooler;
+- pgbouncer         - the pooler profile through PgBouncer.
+
+Postgres and the credentials come from the settings (.env). A local
+PgBouncer in transaction mode (port 6432) for the comparison:
+
+    docker compose -f docker-compose.pgbouncer.yml up -d
+
+Usage:
+    python -m fastapi_auth_service.benchmarks.bench_db_pooler --transactions 20000 --concurrency 50
+"""
+
+import argparse
+import asyncio
+import time
+
+from sqlalchemy import text
+from sqlalchemy.exc import SQLAlchemyError
+
+from fastapi_auth_service.app.core.settings import settings
+from fastapi_auth_service.app.database import build_async_engine
+
+
+# Parameterized primary-key lookup on a table every database has
+LOOKUP = text("SELECT oid, typname FROM pg_type WHERE oid = :oid")
+OIDS = (16, 20, 23, 25, 1043, 1114, 1184, 3802)
+
+
+async def _transactions_per_second(engine, transactions: int, concurrency: int) -> float:
+    queue = iter(range(transactions))
+
+    async def _worker():
+        for i in queue:
+            async with engine.connect() as connection:
+                await connection.execute(LOOKUP, {"oid": OIDS[i % len(OIDS)]})
+                await connection.commit()
+
+    start = time.perf_counter()
+    await asyncio.gather(*(_worker() for _ in range(concurrency)))
+    return transactions / (time.perf_counter() - start)
+
+
+async def run(transactions: int, concurrency: int, pooler_host: str, pooler_port: int) -> dict:
+    """
+    :return: {profile: transactions per second}; a profile that cannot connect is left out
+    """
+    pool = {"DB_POOL_SIZE": concurrency, "DB_MAX_OVERFLOW": 0, "DB_ECHO": False}
+    profiles = {
+        "direct": settings.model_copy(update=pool),
+        "direct, no cache": settings.model_copy(update={**pool, "DB_POOLER": "pgbouncer"}),
+        "pgbouncer": settings.model_copy(update={
+            **pool, "DB_POOLER": "pgbouncer", "POSTGRES_HOST": pooler_host, "POSTGRES_PORT": pooler_port}),
+    }
+    results = {}
+    for name, config in profiles.items():
+        engine = build_async_engine(config, name="bench_pool")
+        try:
+            # Warm up: open the pool's connections
+            await _transactions_per_second(engine, concurrency, concurrency)
+            results[name] = await _transactions_per_second(engine, transactions, concurrency)
+        except (OSError, SQLAlchemyError) as e:
+            print(f"{name}: skipped ({e})")
+        finally:
+            await engine.dispose()
+    return results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--transactions", type=int, default=20000)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--pooler-host", default=settings.POSTGRES_HOST)
+    parser.add_argument("--pooler-port", type=int, default=6432)
+    args = parser.parse_args()
+
+    results = asyncio.run(run(args.transactions, args.concurrency, args.pooler_host, args.pooler_port))
+    for name, rate in results.items():
+        print(f"{name:<17} {rate:12,.0f} tx/s")
+
+
+if __name__ == "__main__":
+    main()
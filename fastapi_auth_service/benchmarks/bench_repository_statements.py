@@ -0,0 +1,86 @@
+"""
+Benchmark: per-call overhead of a rebuilt query vs a prebuilt statement.
+
+The repositories used to build `select(User).where(User.id == user_id)` on
+every call; they now execute prebuilt statements with bound parameters
+(USER_BY_ID, ... in app/repositories/user.py). This measures both forms
+through an ORM session on in-memory SQLite, so the database round trip is
+negligible and what is left is the Python overhead per call:
+- build        - constructing the statement and its SQL cache key;
+- execute      - the full session.execute() + scalar_one_or_none() call.
+
+Usage:
+    python -m fastapi_auth_service.benchmarks.bench_repository_statements --iterations 20000
+"""
+
+import argparse
+import time
+
+from sqlalchemy import create_engine, select
+from sqlalchemy.orm import Session
+
+from fastapi_auth_service.app.database import Base
+from fastapi_auth_service.app.models.user import User
+from fastapi_auth_service.app.repositories.user import USER_BY_ID
+
+USERS = 100
+
+
+def _rebuilt(user_id: int):
+    return select(User).where(User.id == user_id), None
+
+
+def _prebuilt(user_id: int):
+    return USER_BY_ID, {"user_id": user_id}
+
+
+FORMS = (("rebuilt", _rebuilt), ("prebuilt", _prebuilt))
+
+
+def _us_per_call(fn, iterations: int) -> float:
+    start = time.perf_counter()
+    for i in range(iterations):
+        fn(i % USERS + 1)
+    return (time.perf_counter() - start) / iterations * 1e6
+
+
+def run(iterations: int) -> dict:
+    """
+    :return: {form: {"build": µs per call, "execute": µs per call}}
+    """
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(engine)
+    with Session(engine) as session:
+        session.add_all(User(email=f"bench{i}@example.com", hashed_password="x") for i in range(USERS))
+        session.commit()
+
+        results = {}
+        for name, form in FORMS:
+            def _build(user_id, form=form):
+                statement, _ = form(user_id)
+                statement._generate_cache_key()
+
+            def _execute(user_id, form=form):
+                statement, params = form(user_id)
+                session.execute(statement, params).scalar_one_or_none()
+
+            _us_per_call(_execute, min(iterations, 1000))  # Warm up the compiled cache
+            results[name] = {
+                "build": _us_per_call(_build, iterations),
+                "execute": _us_per_call(_execute, iterations),
+            }
+    engine.dispose()
+    return results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--iterations", type=int, default=20000)
+    args = parser.parse_args()
+
+    for name, timings in run(args.iterations).items():
+        print(f"{name:<9} build {timings['build']:8.1f} µs/call   execute {timings['execute']:8.1f} µs/call")
+
+
+if __name__ == "__main__":
+    main()
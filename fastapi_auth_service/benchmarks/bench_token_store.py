@@ -0,0 +1,107 @@
+"""
+Benchmark: throughput of the token store backends.
+
+Runs the operations of a token's life - login (session + token pair),
+validity check, refresh rotation, logout - against each backend, with
+`--concurrency` coroutines in flight, the way the request handlers
+call the store. The Redis backend uses REDIS_* from the settings (.env)
+and is skipped if Redis does not answer.
+
+Usage:
+    python -m fastapi_auth_service.benchmarks.bench_token_store --operations 20000 --concurrency 50
+"""
+
+import argparse
+import asyncio
+import json
+import time
+import uuid
+
+from redis.exceptions import RedisError
+
+from fastapi_auth_service.app.core.redis import redis_cache
+from fastapi_auth_service.app.services.token_store import MemoryTokenStore, RedisTokenStore
+
+
+def _keys(run: str, i: int) -> dict:
+    user = f"{{bench:{run}:{i}}}"
+    return {
+        "sessions": f"user_sessions:{user}",
+        "epoch": f"user_epoch:{user}",
+        "access": f"at:{user}:1",
+        "refresh": f"rt:{user}:1",
+        "new_access": f"at:{user}:2",
+        "new_refresh": f"rt:{user}:2",
+    }
+
+
+async def _login(store, k: dict) -> None:
+    entry = json.dumps({"sid": "s", "access_key": k["access"], "refresh_key": k["refresh"]})
+    await store.add_session(
+        k["sessions"], "s", entry, tokens={k["access"]: (1, 900), k["refresh"]: (1, 3600)}, ttl=3600)
+
+
+async def _check(store, k: dict) -> None:
+    await store.get_many([k["access"]])
+
+
+async def _rotate(store, k: dict) -> None:
+    await store.rotate_refresh(
+        k["sessions"], "s", epoch_keys=[k["epoch"]], presented_keys=[k["refresh"]],
+        access_key=k["new_access"], refresh_key=k["new_refresh"], value=1,
+        access_ttl=900, refresh_ttl=3600, token_epoch=0, new_entry=None, channel="bench_revocations",
+    )
+
+
+async def _logout(store, k: dict) -> None:
+    await store.remove_sessions(k["sessions"], ["s"], [k["new_access"], k["new_refresh"]])
+
+
+OPERATIONS = (("login", _login), ("check", _check), ("rotate", _rotate), ("logout", _logout))
+
+
+async def _ops_per_second(store, operation, keys: list, concurrency: int) -> float:
+    queue = iter(keys)
+
+    async def _worker():
+        for k in queue:
+            await operation(store, k)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(_worker() for _ in range(concurrency)))
+    return len(keys) / (time.perf_counter() - start)
+
+
+async def run(operations: int, concurrency: int) -> dict:
+    """
+    :return: {backend: {operation: operations per second}}; a backend that is unavailable is left out
+    """
+    stores = [MemoryTokenStore(), RedisTokenStore(redis_cache)]
+    results = {}
+    for store in stores:
+        try:
+            await store.get_many(["bench:ping"])
+        except RedisError as e:
+            print(f"{store.name}: skipped ({e})")
+            continue
+        keys = [_keys(uuid.uuid4().hex[:8], i) for i in range(operations)]
+        results[store.name] = {
+            name: await _ops_per_second(store, operation, keys, concurrency) for name, operation in OPERATIONS
+        }
+    return results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--operations", type=int, default=20000)
+    parser.add_argument("--concurrency", type=int, default=50)
+    args = parser.parse_args()
+
+    results = asyncio.run(run(args.operations, args.concurrency))
+    for backend, rates in results.items():
+        for name, rate in rates.items():
+            print(f"{backend:<7} {name:<7} {rate:12,.0f} ops/s")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,8 +1,12 @@
-from sqlalchemy import create_engine
-from fastapi_auth_service.app.database import Base
+from fastapi_auth_service.app.database import Base, build_sync_engine
 from dotenv import load_dotenv
 import typer
 from fastapi_auth_service.app.core.settings import settings
+from fastapi_auth_service.app.utils.hash_tuning import calibrate_bcrypt_rounds, tune_argon2
+from fastapi_auth_service.app.utils.key_ring import build_key_ring
+from fastapi_auth_service.app.services.keyspace_report import sample_token_keyspace
+from fastapi_auth_service.app.core.redis import build_redis_client
+import asyncio
 
 
 # Create a Typer Application
@@ -12,13 +16,10 @@ app = typer.Typer()
 load_dotenv()
 
 # Building a Synchronous URL for the CLI
-SYNC_DATABASE_URL = (
-    f"postgresql+psycopg2://{settings.POSTGRES_USER}:{settings.POSTGRES_PASSWORD}"
-    f"@{settings.POSTGRES_HOST}:{settings.POSTGRES_PORT}/{settings.POSTGRES_DB}"
-)
+SYNC_DATABASE_URL = settings.sync_db_url
 
 # Synchronous Engine for CLI
-sync_engine = create_engine(SYNC_DATABASE_URL)
+sync_engine = build_sync_engine(settings)
 
 
 @app.command("create-db")
@@ -47,6 +48,101 @@ def drop_db():
         typer.echo(f"❌ Database deletion error: {e}")
 
 
+@app.command("calibrate-hash")
+def calibrate_hash(
+    target_ms: float = typer.Option(
+        settings.HASH_TARGET_MS, help="Latency budget for one password hash, ms"),
+    samples: int = typer.Option(3, help="Hashes timed per cost value"),
+):
+    """
+    ⏱️ Measure bcrypt on this machine and suggest BCRYPT_ROUNDS.
+    """
+    rounds, timings = calibrate_bcrypt_rounds(target_ms, samples=samples)
+
+    for cost, elapsed_ms in timings.items():
+        marker = "✅" if elapsed_ms <= target_ms else "❌"
+        typer.echo(f"{marker} rounds={cost:<3} {elapsed_ms:8.1f} ms")
+
+    if timings[rounds] > target_ms:
+        typer.echo(f"⚠️ Even the minimum cost exceeds {target_ms} ms, keeping rounds={rounds}")
+
+    typer.echo(f"Current BCRYPT_ROUNDS={settings.BCRYPT_ROUNDS}")
+    typer.echo(f"Recommended: BCRYPT_ROUNDS={rounds}")
+    typer.echo("Existing hashes are upgraded on the next successful login.")
+
+
+@app.command("tune-argon2")
+def tune_argon2_command(
+    target_ms: float = typer.Option(
+        settings.HASH_TARGET_MS, help="p99 latency budget for one password hash, ms"),
+    parallelism: int = typer.Option(settings.ARGON2_PARALLELISM, help="Argon2 lanes"),
+    samples: int = typer.Option(20, help="Hashes timed per parameter set"),
+):
+    """
+    ⏱️ Benchmark Argon2id memory/time cost on this machine and suggest ARGON2_*.
+    """
+    best, results = tune_argon2(target_ms, parallelism=parallelism, samples=samples)
+
+    for r in results:
+        marker = "✅" if r["fits"] else "❌"
+        typer.echo(
+            f"{marker} m={r['memory_cost']:>7} KiB t={r['time_cost']} p={r['parallelism']} "
+            f"p50={r['p50_ms']:7.1f} ms p99={r['p99_ms']:7.1f} ms")
+
+    if best is None:
+        typer.echo(f"⚠️ No parameters fit a p99 of {target_ms} ms on this machine")
+        raise typer.Exit(code=1)
+
+    typer.echo("Recommended:")
+    typer.echo(f"ARGON2_MEMORY_COST={best['memory_cost']}")
+    typer.echo(f"ARGON2_TIME_COST={best['time_cost']}")
+    typer.echo(f"ARGON2_PARALLELISM={best['parallelism']}")
+    typer.echo("PASSWORD_SCHEMES=argon2,bcrypt  # bcrypt users migrate on next login")
+
+
+@app.command("rotate-signing-key")
+def rotate_signing_key():
+    """
+    🔑 Create a JWT signing key that is active immediately (e.g. after a key leak).
+    """
+    key_ring = build_key_ring(settings)
+    if key_ring is None:
+        typer.echo("⚠️ JWT_ALGORITHM is HS256, there is no key ring to rotate")
+        raise typer.Exit(code=1)
+    kid = key_ring.rotate_now()
+    typer.echo(f"✅ New signing key {kid} in {key_ring.keys_dir}")
+    typer.echo(
+        "Remove the leaked key file: workers stop accepting tokens signed with it "
+        f"at their next key reload, within {settings.JWT_KEYS_RELOAD_SECONDS} s.")
+
+
+@app.command("token-keyspace-report")
+def token_keyspace_report(
+    samples: int = typer.Option(1000, help="Random keys to sample"),
+):
+    """
+    📊 Sample Redis and report memory used by token keys (bytes per session).
+    """
+    async def _sample() -> dict:
+        # Same client as the app: REDIS_DB and REDIS_MODE (sentinel / cluster) apply
+        client = build_redis_client(settings)
+        try:
+            return await sample_token_keyspace(client, samples=samples)
+        finally:
+            await client.aclose()
+
+    report = asyncio.run(_sample())
+
+    typer.echo(f"Keys in DB: {report['dbsize']}, sampled: {report['sampled']}")
+    for prefix, stats in report["prefixes"].items():
+        avg = f"{stats['avg_bytes']:.0f} B" if stats["avg_bytes"] is not None else "-"
+        typer.echo(f"{prefix:<15} sampled={stats['sampled']:<6} ~keys={stats['estimated_keys']:<10} avg={avg}")
+
+    for name, value in report["bytes_per_session"].items():
+        if value is not None:
+            typer.echo(f"Bytes per session ({name} keys): {value:.0f}")
+
+
 # Сwe start the application if we launched this file directly
 if __name__ == "__main__":
     app()
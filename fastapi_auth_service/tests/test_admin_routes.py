@@ -16,3 +16,37 @@ async def test_admin_check_success(admin_client: AsyncClient):
     assert "admin@test.com" in message
     assert "admin" in message.lower()
     assert message == "Welcome, admin admin@test.com!"
+
+
+@pytest.mark.asyncio
+async def test_user_listing_is_buffered_by_default_and_streams_on_request(admin_client: AsyncClient):
+    """
+    The default response, the keyset pages and stream=true list the same users.
+    """
+    buffered = await admin_client.get("/users/", params={"sort_by": "balance", "sort_order": "desc"})
+    assert buffered.status_code == 200
+    assert "content-length" in buffered.headers  # One body, not a chunked stream
+    users = buffered.json()["users"]
+
+    streamed = await admin_client.get("/users/", params={"sort_by": "balance", "sort_order": "desc", "stream": True})
+    assert streamed.status_code == 200
+    assert list(streamed.json()["users"]) == list(users)
+
+    paged, cursor = [], None
+    while True:
+        params = {"sort_by": "balance", "sort_order": "desc", "limit": 2}
+        if cursor:
+            params["cursor"] = cursor
+        page = (await admin_client.get("/users/", params=params)).json()
+        paged += list(page["users"])
+        cursor = page["next_cursor"]
+        if cursor is None:
+            break
+    assert paged == list(users)
+
+    rejected = await admin_client.get("/users/", params={"stream": True, "limit": 2})
+    assert rejected.status_code == 400
+
+    deleted = await admin_client.get("/users/deleted")
+    assert deleted.status_code == 200
+    assert deleted.json() == (await admin_client.get("/users/deleted", params={"stream": True})).json()
@@ -0,0 +1,30 @@
+import pytest
+from uuid import uuid4
+
+from sqlalchemy import select
+
+from fastapi_auth_service.app.database import release_connection
+from fastapi_auth_service.app.models.user import User
+
+
+@pytest.mark.anyio
+async def test_release_connection_ends_only_read_transactions(async_session, wait_for_db):
+    """
+    A read-only transaction gives its connection back; one with changes keeps it.
+    """
+    user = User(email=f"lazy_{uuid4().hex}@example.com", hashed_password="x")
+    async_session.add(user)
+    await async_session.commit()
+    assert not async_session.in_transaction()
+
+    loaded = (await async_session.execute(select(User).where(User.id == user.id))).scalar_one()
+    assert async_session.in_transaction()
+    await release_connection(async_session)
+    assert not async_session.in_transaction()
+    assert loaded.email == user.email  # Still usable without a connection
+
+    loaded.balance = 5
+    await async_session.flush()
+    await release_connection(async_session)
+    assert async_session.in_transaction()
+    await async_session.rollback()
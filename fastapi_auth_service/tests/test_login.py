@@ -113,3 +113,128 @@ async def test_refresh_access_token(async_client, registered_user):
     assert response2.status_code == 200, response2.text
     new_tokens = response2.json()
     assert "access_token" in new_tokens
+
+
+@pytest.mark.asyncio
+async def test_logout_all_revokes_every_session(async_client, registered_user):
+    """
+    Two logins are two sessions; /auth/logout-all revokes the tokens of both.
+    """
+    tokens = []
+    for _ in range(2):
+        response = await async_client.post("/auth/login", data={
+            "username": registered_user["email"],
+            "password": registered_user["password"]
+        })
+        assert response.status_code == 200, response.text
+        tokens.append(response.json())
+
+    headers = {"Authorization": f"Bearer {tokens[0]['access_token']}"}
+    sessions = await async_client.get("/auth/sessions", headers=headers)
+    assert sessions.status_code == 200
+    assert len(sessions.json()) >= 2
+    assert sum(session["current"] for session in sessions.json()) == 1
+
+    response = await async_client.post("/auth/logout-all", headers=headers)
+    assert response.status_code == 200
+
+    for pair in tokens:
+        me = await async_client.get("/auth/me", headers={"Authorization": f"Bearer {pair['access_token']}"})
+        assert me.status_code == status.HTTP_401_UNAUTHORIZED
+        refreshed = await async_client.post("/auth/refresh", json={"refresh_token": pair["refresh_token"]})
+        assert refreshed.status_code == status.HTTP_401_UNAUTHORIZED
+
+
+@pytest.mark.asyncio
+async def test_refresh_rotates_and_detects_reuse(async_client, registered_user):
+    """
+    Every refresh returns a new refresh token; replaying an old one revokes the session.
+    """
+    response = await async_client.post("/auth/login", data={
+        "username": registered_user["email"],
+        "password": registered_user["password"]
+    })
+    assert response.status_code == 200, response.text
+    first = response.json()
+
+    rotated = await async_client.post("/auth/refresh", json={"refresh_token": first["refresh_token"]})
+    assert rotated.status_code == 200, rotated.text
+    second = rotated.json()
+    assert second["refresh_token"] != first["refresh_token"]
+
+    # The old refresh token is replayed (e.g. stolen): the whole session is revoked
+    replayed = await async_client.post("/auth/refresh", json={"refresh_token": first["refresh_token"]})
+    assert replayed.status_code == status.HTTP_401_UNAUTHORIZED
+
+    refreshed = await async_client.post("/auth/refresh", json={"refresh_token": second["refresh_token"]})
+    assert refreshed.status_code == status.HTTP_401_UNAUTHORIZED
+    me = await async_client.get("/auth/me", headers={"Authorization": f"Bearer {second['access_token']}"})
+    assert me.status_code == status.HTTP_401_UNAUTHORIZED
+
+
+@pytest.mark.asyncio
+async def test_access_token_sent_to_refresh_leaves_the_session_alive(async_client, registered_user):
+    """
+    An access token carries the session's sid but is not a refresh token:
+    /auth/refresh rejects it without treating it as a replayed refresh token.
+    """
+    response = await async_client.post("/auth/login", data={
+        "username": registered_user["email"],
+        "password": registered_user["password"]
+    })
+    assert response.status_code == 200, response.text
+    tokens = response.json()
+
+    rejected = await async_client.post("/auth/refresh", json={"refresh_token": tokens["access_token"]})
+    assert rejected.status_code == status.HTTP_401_UNAUTHORIZED
+    assert rejected.json()["detail"] == "Invalid refresh token"
+
+    me = await async_client.get("/auth/me", headers={"Authorization": f"Bearer {tokens['access_token']}"})
+    assert me.status_code == 200
+    refreshed = await async_client.post("/auth/refresh", json={"refresh_token": tokens["refresh_token"]})
+    assert refreshed.status_code == 200, refreshed.text
+
+
+@pytest.mark.asyncio
+async def test_opaque_token_mode(async_client, registered_user, monkeypatch):
+    """
+    TOKEN_FORMAT=opaque: short random tokens that work for /me, protected routes, refresh and logout.
+    """
+    from fastapi_auth_service.app.core.settings import settings
+    monkeypatch.setattr(settings, "TOKEN_FORMAT", "opaque")
+
+    response = await async_client.post("/auth/login", data={
+        "username": registered_user["email"],
+        "password": registered_user["password"]
+    })
+    assert response.status_code == 200, response.text
+    tokens = response.json()
+    assert len(tokens["access_token"]) < 40 and tokens["access_token"].count(".") == 1
+
+    headers = {"Authorization": f"Bearer {tokens['access_token']}"}
+    me = await async_client.get("/auth/me", headers=headers)
+    assert me.status_code == 200, me.text
+    sessions = await async_client.get("/auth/sessions", headers=headers)
+    assert sessions.status_code == 200 and any(s["current"] for s in sessions.json())
+
+    rotated = await async_client.post("/auth/refresh", json={"refresh_token": tokens["refresh_token"]})
+    assert rotated.status_code == 200, rotated.text
+    new_headers = {"Authorization": f"Bearer {rotated.json()['access_token']}"}
+    assert (await async_client.get("/auth/me", headers=headers)).status_code == status.HTTP_401_UNAUTHORIZED
+    assert (await async_client.get("/auth/me", headers=new_headers)).status_code == 200
+
+    # A replayed opaque refresh token is still recognised as reuse
+    replayed = await async_client.post("/auth/refresh", json={"refresh_token": tokens["refresh_token"]})
+    assert replayed.status_code == status.HTTP_401_UNAUTHORIZED
+    assert "already been used" in replayed.json()["detail"]
+    assert (await async_client.get("/auth/me", headers=new_headers)).status_code == status.HTTP_401_UNAUTHORIZED
+
+    response = await async_client.post("/auth/login", data={
+        "username": registered_user["email"],
+        "password": registered_user["password"]
+    })
+    new_headers = {"Authorization": f"Bearer {response.json()['access_token']}"}
+
+    assert (await async_client.post("/auth/logout", headers=new_headers)).status_code == 200
+    assert (await async_client.get("/auth/me", headers=new_headers)).status_code == status.HTTP_401_UNAUTHORIZED
+    assert (await async_client.get("/auth/sessions", headers=new_headers)).status_code == status.HTTP_401_UNAUTHORIZED
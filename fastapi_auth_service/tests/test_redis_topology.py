@@ -0,0 +1,111 @@
+"""
+Token store against a multi-node Redis (see docker-compose.redis.yml).
+
+Skipped unless REDIS_MODE is "cluster" or "sentinel".
+"""
+
+import time
+import uuid
+from datetime import timedelta
+
+import pytest
+
+from fastapi_auth_service.app.core.redis import redis_cache
+from fastapi_auth_service.app.core.settings import settings
+from fastapi_auth_service.app.services.token_cache import (
+    access_token_key,
+    is_access_token_valid,
+    is_refresh_token_valid,
+    refresh_token_key,
+    user_sessions_key,
+)
+from fastapi_auth_service.app.services.token_introspection import introspect_tokens
+from fastapi_auth_service.app.services.user_epoch import bump_user_epoch, epoch_key
+from fastapi_auth_service.app.services.user_sessions import (
+    REFRESH_OK,
+    REFRESH_REUSED,
+    REFRESH_REVOKED,
+    list_sessions,
+    new_session_id,
+    revoke_all_sessions,
+    rotate_refresh_token,
+    start_session,
+)
+from fastapi_auth_service.app.utils.security import build_token_claims, create_access_token
+
+
+pytestmark = pytest.mark.skipif(
+    settings.REDIS_MODE == "standalone",
+    reason="needs a multi-node Redis: docker-compose.redis.yml + REDIS_MODE=cluster|sentinel",
+)
+
+
+def _user_id() -> int:
+    return 800_000 + uuid.uuid4().int % 100_000
+
+
+@pytest.mark.anyio
+async def test_session_lifecycle_on_topology():
+    """
+    Login pipeline, rotation script, epoch bump and revoke-all work for one user's keys.
+    """
+    user_id = _user_id()
+    sid = new_session_id()
+    expires_at = int(time.time()) + 60
+    await start_session(user_id, sid, f"access-{sid}", f"refresh-{sid}")
+    assert [s["sid"] for s in await list_sessions(user_id)] == [sid]
+
+    assert await rotate_refresh_token(
+        user_id, sid, f"refresh-{sid}", 0, f"access2-{sid}", f"refresh2-{sid}", expires_at) == REFRESH_OK
+    assert await is_access_token_valid(f"access2-{sid}", user_id) is True
+
+    await bump_user_epoch(user_id)
+    assert await rotate_refresh_token(
+        user_id, sid, f"refresh2-{sid}", 0, f"access3-{sid}", f"refresh3-{sid}", expires_at) == REFRESH_REVOKED
+
+    assert await revoke_all_sessions(user_id) == 1
+    assert await is_access_token_valid(f"access2-{sid}", user_id) is False
+    assert await is_refresh_token_valid(f"refresh2-{sid}", user_id) is False
+
+
+@pytest.mark.anyio
+async def test_refresh_reuse_revokes_family_on_topology():
+    user_id = _user_id()
+    sid = new_session_id()
+    expires_at = int(time.time()) + 60
+    await start_session(user_id, sid, f"access-{sid}", f"refresh-{sid}")
+    assert await rotate_refresh_token(
+        user_id, sid, f"refresh-{sid}", 0, f"access2-{sid}", f"refresh2-{sid}", expires_at) == REFRESH_OK
+    assert await rotate_refresh_token(
+        user_id, sid, f"refresh-{sid}", 0, f"access3-{sid}", f"refresh3-{sid}", expires_at) == REFRESH_REUSED
+    assert await is_refresh_token_valid(f"refresh2-{sid}", user_id) is False
+
+
+@pytest.mark.anyio
+async def test_introspection_spans_many_users():
+    """
+    One batch with tokens of many users (many slots in a cluster).
+    """
+    tokens = []
+    for _ in range(20):
+        user_id = _user_id()
+        token = create_access_token(
+            build_token_claims(user_id, "user", f"{user_id}@test.com", 0), expires_delta=timedelta(minutes=5))
+        await start_session(user_id, new_session_id(), token, f"refresh-{uuid.uuid4().hex}")
+        tokens.append(token)
+
+    results = await introspect_tokens(tokens + ["not.a.token"])
+    assert [r["active"] for r in results] == [True] * 20 + [False]
+
+
+@pytest.mark.anyio
+@pytest.mark.skipif(settings.REDIS_MODE != "cluster", reason="cluster only")
+async def test_user_keys_live_on_one_node():
+    user_id = _user_id()
+    keys = [
+        access_token_key("a", user_id),
+        refresh_token_key("r", user_id),
+        user_sessions_key(user_id),
+        epoch_key(user_id),
+    ]
+    assert len({redis_cache.keyslot(key) for key in keys}) == 1
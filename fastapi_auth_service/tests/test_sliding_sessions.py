@@ -0,0 +1,44 @@
+import asyncio
+from uuid import uuid4
+
+import pytest
+from starlette import status
+
+from fastapi_auth_service.app.core.redis import redis_cache
+from fastapi_auth_service.app.services import token_cache
+from fastapi_auth_service.app.utils.security import decode_access_token
+
+
+async def _login(async_client) -> tuple:
+    email = f"sliding_{uuid4().hex}@example.com"
+    password = "StrongPass123!"
+    await async_client.post("/auth/register", json={"email": email, "password": password})
+    response = await async_client.post("/auth/login", data={"username": email, "password": password})
+    assert response.status_code == status.HTTP_200_OK
+    token = response.json()["access_token"]
+    key = token_cache.access_token_key(token, int(decode_access_token(token)["sub"]))
+    return {"Authorization": f"Bearer {token}"}, key
+
+
+@pytest.mark.anyio
+async def test_idle_session_ends_and_active_session_slides(async_client, wait_for_db, monkeypatch):
+    """
+    With sliding sessions the long-lived access JWT is only as good as its
+    access key: an idle session is rejected everywhere, an active one is extended.
+    """
+    monkeypatch.setattr(token_cache.settings, "SESSION_SLIDING_ENABLED", True)
+
+    # Idle: the access key expired while the JWT itself is still valid
+    idle_headers, idle_key = await _login(async_client)
+    await redis_cache.pexpire(idle_key, 50)
+    await asyncio.sleep(0.1)
+    assert (await async_client.get("/auth/me", headers=idle_headers)).status_code == status.HTTP_401_UNAUTHORIZED
+    assert (await async_client.get("/users/profile", headers=idle_headers)).status_code == status.HTTP_401_UNAUTHORIZED
+    assert (await async_client.get("/auth/sessions", headers=idle_headers)).status_code == status.HTTP_401_UNAUTHORIZED
+
+    # Active: a running-out key is extended by the request
+    for path in ("/users/balance", "/auth/me"):
+        active_headers, active_key = await _login(async_client)
+        await redis_cache.expire(active_key, 30)
+        assert (await async_client.get(path, headers=active_headers)).status_code == status.HTTP_200_OK
+        assert await redis_cache.ttl(active_key) > token_cache.SLIDING_EXTEND_BELOW_SECONDS
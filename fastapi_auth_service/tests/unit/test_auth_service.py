@@ -155,3 +155,34 @@ async def test_change_user_password_success(wait_for_db):
 
     # Let's check that the password has actually changed
     assert verify_password(new_password, user.hashed_password)
+
+
+@pytest.mark.asyncio
+async def test_authenticate_user_schedules_rehash_for_outdated_hash(monkeypatch):
+    """
+    A correct password stored with an outdated cost is rehashed in the background.
+    """
+    from passlib.hash import bcrypt
+    from fastapi_auth_service.app.services import auth_service
+
+    plain_password = "StrongPass123!"
+    outdated_hash = bcrypt.using(rounds=4).hash(plain_password)
+    user = User(id=7, email="old@example.com", hashed_password=outdated_hash,
+                is_blocked=False, is_deleted=False, balance=0, role=UserRoleEnum.user)
+
+    mock_result = MagicMock()
+    mock_result.scalar_one_or_none = lambda: user
+    mock_session = MagicMock()
+    mock_session.execute = AsyncMock(return_value=mock_result)
+    mock_transaction = AsyncMock()
+    mock_transaction.__aenter__.return_value = None
+    mock_transaction.__aexit__.return_value = None
+    mock_session.begin.return_value = mock_transaction
+
+    scheduled = MagicMock()
+    monkeypatch.setattr(auth_service, "schedule_password_rehash", scheduled)
+
+    result = await authenticate_user(email=user.email, password=plain_password, session=mock_session)
+
+    assert result is not None
+    scheduled.assert_called_once_with(7, plain_password, outdated_hash)
@@ -0,0 +1,90 @@
+"""
+Unit tests for the circuit breaker and the Redis client built on it.
+"""
+
+from types import SimpleNamespace
+
+import pytest
+
+from fastapi_auth_service.app.core import circuit_breaker as circuit_breaker_module
+from fastapi_auth_service.app.core.circuit_breaker import CircuitBreaker
+from fastapi_auth_service.app.core.redis import (
+    UNAVAILABLE_ERRORS, CircuitOpenError, PoolExhaustedError, build_redis_client
+)
+
+
+def test_breaker_opens_after_consecutive_failures_and_recovers(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(circuit_breaker_module.time, "monotonic", lambda: now[0])
+    breaker = CircuitBreaker("test_breaker", failure_threshold=3, reset_timeout=5)
+
+    breaker.record_failure()
+    breaker.record_failure()
+    breaker.record_success()  # resets the streak
+    breaker.record_failure()
+    breaker.record_failure()
+    assert breaker.is_closed and breaker.allow()
+
+    breaker.record_failure()
+    assert breaker.state == "open"
+    assert not breaker.allow()
+
+    # After reset_timeout exactly one trial call goes through
+    now[0] += 5
+    assert breaker.allow()
+    assert not breaker.allow()
+
+    # A failed trial opens the breaker again, a successful one closes it
+    breaker.record_failure()
+    assert breaker.state == "open"
+    now[0] += 5
+    assert breaker.allow()
+    breaker.record_success()
+    assert breaker.is_closed and breaker.allow()
+
+
+@pytest.mark.asyncio
+async def test_open_breaker_fails_redis_commands_fast():
+    """
+    While the breaker is open, commands and pipelines raise CircuitOpenError
+    without touching the connection pool.
+    """
+    config = SimpleNamespace(
+        REDIS_MODE="standalone", REDIS_HOST="127.0.0.1", REDIS_PORT=1, REDIS_DB=0,
+        REDIS_MAX_CONNECTIONS=2, REDIS_POOL_TIMEOUT=0.1, REDIS_SOCKET_TIMEOUT=0.1,
+        REDIS_CONNECT_TIMEOUT=0.1, REDIS_HEALTH_CHECK_INTERVAL=30, REDIS_RETRIES=0,
+        REDIS_BREAKER_FAILURES=2, REDIS_BREAKER_RESET_SECONDS=60,
+    )
+    client = build_redis_client(config)
+    client.breaker.record_failure()
+    client.breaker.record_failure()
+
+    with pytest.raises(CircuitOpenError):
+        await client.get("some_key")
+    with pytest.raises(CircuitOpenError):
+        async with client.pipeline(transaction=True) as pipe:
+            pipe.get("some_key")
+            await pipe.execute()
+
+
+@pytest.mark.asyncio
+async def test_pool_exhaustion_does_not_open_the_breaker():
+    """
+    Waiting in vain for a pooled connection is local overload: the command
+    fails with PoolExhaustedError and the breaker stays closed.
+    """
+    config = SimpleNamespace(
+        REDIS_MODE="standalone", REDIS_HOST="127.0.0.1", REDIS_PORT=1, REDIS_DB=0,
+        REDIS_MAX_CONNECTIONS=1, REDIS_POOL_TIMEOUT=0.05, REDIS_SOCKET_TIMEOUT=0.1,
+        REDIS_CONNECT_TIMEOUT=0.1, REDIS_HEALTH_CHECK_INTERVAL=30, REDIS_RETRIES=0,
+        REDIS_BREAKER_FAILURES=2, REDIS_BREAKER_RESET_SECONDS=60,
+    )
+    client = build_redis_client(config)
+    client.connection_pool.get_available_connection()  # Another request holds the only connection
+
+    for _ in range(3):
+        with pytest.raises(PoolExhaustedError):
+            await client.get("some_key")
+
+    assert client.breaker.is_closed
+    assert not isinstance(PoolExhaustedError(), UNAVAILABLE_ERRORS)  # No degraded mode either
@@ -0,0 +1,118 @@
+"""
+Unit tests for the database engine profile (no connection to PostgreSQL is made).
+"""
+
+from types import SimpleNamespace
+from unittest.mock import MagicMock
+
+import pytest
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from sqlalchemy.pool import NullPool
+from sqlalchemy.util import greenlet_spawn
+
+from fastapi_auth_service.app.core.metrics import metrics
+from fastapi_auth_service.app.core.settings import Settings
+from fastapi_auth_service.app.database import (
+    InstrumentedAsyncPool,
+    build_async_engine,
+    build_sync_engine,
+    connect_args,
+    reject_session_state,
+)
+
+
+def _config(**overrides) -> SimpleNamespace:
+    config = dict(
+        DB_ECHO=False, DB_POOL_SIZE=3, DB_MAX_OVERFLOW=2, DB_POOL_TIMEOUT=5.0,
+        DB_POOL_PRE_PING=True, DB_POOL_RECYCLE=600, DB_STATEMENT_CACHE_SIZE=50, DB_POOLER="none",
+        db_url="postgresql+asyncpg://u:p@db:5432/app",
+        sync_db_url="postgresql+psycopg2://u:p@db:5432/app",
+    )
+    config.update(overrides)
+    return SimpleNamespace(**config)
+
+
+def test_async_engine_uses_the_pool_settings():
+    engine = build_async_engine(_config())
+    pool = engine.sync_engine.pool
+
+    assert isinstance(pool, InstrumentedAsyncPool)
+    assert pool.size() == 3
+    assert pool._max_overflow == 2
+    assert pool.timeout() == 5.0
+    assert pool._recycle == 600
+    assert pool._pre_ping is True
+    assert engine.echo is False
+    assert engine.url.query["prepared_statement_cache_size"] == "50"
+    assert connect_args(_config()) == {"statement_cache_size": 50}
+    assert metrics.snapshot()["db_pool.size"] == 3
+
+
+def test_sql_echo_is_opt_in():
+    assert Settings.model_fields["DB_ECHO"].default is False
+
+
+def test_null_pool_and_sync_engine_share_the_profile():
+    engine = build_async_engine(_config(DB_ECHO=True), null_pool=True)
+    assert isinstance(engine.sync_engine.pool, NullPool)
+    assert engine.echo is True
+
+    sync_engine = build_sync_engine(_config())
+    assert sync_engine.url.drivername == "postgresql+psycopg2"
+    assert sync_engine.url.database == "app"
+
+
+def test_pgbouncer_mode_turns_off_statement_caches():
+    config = _config(DB_POOLER="pgbouncer")
+    engine = build_async_engine(config)
+    args = connect_args(config)
+
+    assert engine.url.query["prepared_statement_cache_size"] == "0"
+    assert args["statement_cache_size"] == 0
+    assert args["prepared_statement_name_func"]() != args["prepared_statement_name_func"]()
+
+    with pytest.raises(ValueError):
+        build_async_engine(_config(DB_POOLER="pgpool"))
+
+
+@pytest.mark.parametrize("statement", [
+    "SET search_path TO app",
+    "set session statement_timeout = 5000",
+    "RESET ALL",
+    "LISTEN user_changes",
+    "CREATE TEMP TABLE t (id int)",
+    "SELECT pg_advisory_lock(42)",
+])
+def test_pgbouncer_mode_rejects_session_state(statement):
+    with pytest.raises(ValueError):
+        reject_session_state(None, None, statement, None, None, False)
+
+
+@pytest.mark.parametrize("statement", [
+    "SET LOCAL statement_timeout = 5000",
+    "SET TRANSACTION ISOLATION LEVEL SERIALIZABLE",
+    "UPDATE users SET balance = balance + $1 WHERE users.id = $2",
+    "SELECT pg_advisory_xact_lock(42)",
+])
+def test_pgbouncer_mode_allows_transaction_scoped_statements(statement):
+    reject_session_state(None, None, statement, None, None, False)
+
+
+@pytest.mark.asyncio
+async def test_pool_reports_checkouts_connects_and_timeouts():
+    pool = InstrumentedAsyncPool(MagicMock, pool_size=1, max_overflow=0, timeout=0.01)
+    checkouts = metrics.timer("db_pool.checkout_time").count
+    connects = metrics.timer("db_pool.connect_time").count
+    timeouts = metrics.counter("db_pool.timeouts").value
+
+    connection = await greenlet_spawn(pool.connect)
+    assert pool.checkedout() == 1
+    with pytest.raises(PoolTimeoutError):
+        await greenlet_spawn(pool.connect)
+
+    connection.close()
+    (await greenlet_spawn(pool.connect)).close()
+    # A checkout that timed out counts as a wait too
+    assert metrics.timer("db_pool.checkout_time").count == checkouts + 3
+    assert metrics.timer("db_pool.connect_time").count == connects + 1
+    assert metrics.counter("db_pool.timeouts").value == timeouts + 1
@@ -60,3 +60,44 @@ async def test_is_user_raises_404_if_role_not_user():
 
     assert exc_info.value.status_code == 404
     assert exc_info.value.detail == "Not found"
+
+
+@pytest.mark.asyncio
+async def test_token_principal_comes_from_claims_without_db():
+    """
+    ✅ A token with role/epoch claims is authorized without touching the DB
+    """
+    from unittest.mock import MagicMock
+    from fastapi_auth_service.app.utils.security import (
+        build_token_claims, create_access_token, get_token_principal)
+
+    token = create_access_token(build_token_claims(990001, "admin", "admin@test.com", 0))
+    session = MagicMock()  # Any DB call would fail on a MagicMock
+
+    principal = await get_token_principal(token=token, session=session)
+
+    assert principal.id == 990001
+    assert principal.role == "admin"
+    assert (await is_admin(current_user=principal)) == principal
+    session.execute.assert_not_called()
+
+
+@pytest.mark.asyncio
+async def test_token_principal_rejected_after_epoch_bump():
+    """
+    ❌ Tokens issued before a block / role change / password change are revoked
+    """
+    from unittest.mock import MagicMock
+    from fastapi_auth_service.app.services.user_epoch import bump_user_epoch, get_user_epoch
+    from fastapi_auth_service.app.utils.security import (
+        build_token_claims, create_access_token, get_token_principal)
+
+    user_id = 990002
+    epoch = await get_user_epoch(user_id)
+    token = create_access_token(build_token_claims(user_id, "user", "user@test.com", epoch))
+
+    await bump_user_epoch(user_id)
+
+    with pytest.raises(HTTPException) as exc_info:
+        await get_token_principal(token=token, session=MagicMock())
+    assert exc_info.value.status_code == 401
@@ -0,0 +1,59 @@
+"""
+Unit tests for bcrypt cost calibration.
+"""
+
+from fastapi_auth_service.app.utils import hash_tuning
+
+
+def test_calibrate_picks_highest_cost_within_budget(monkeypatch):
+    """
+    Costs are tried in order; the last one within the budget wins.
+    """
+    fake_timings = {10: 0.05, 11: 0.1, 12: 0.2, 13: 0.4}
+    monkeypatch.setattr(hash_tuning, "measure_bcrypt", lambda rounds, samples: fake_timings[rounds])
+
+    rounds, timings = hash_tuning.calibrate_bcrypt_rounds(target_ms=250)
+
+    assert rounds == 12
+    assert list(timings) == [10, 11, 12, 13]  # stops after the first miss
+
+
+def test_calibrate_never_goes_below_minimum(monkeypatch):
+    """
+    A slow machine still gets the minimum safe cost.
+    """
+    monkeypatch.setattr(hash_tuning, "measure_bcrypt", lambda rounds, samples: 1.0)
+
+    rounds, _ = hash_tuning.calibrate_bcrypt_rounds(target_ms=100)
+
+    assert rounds == hash_tuning.BCRYPT_MIN_ROUNDS
+
+
+def test_measure_bcrypt_returns_positive_duration():
+    assert hash_tuning.measure_bcrypt(4, samples=1) > 0
+
+
+def test_tune_argon2_picks_strongest_fitting_parameters(monkeypatch):
+    """
+    The largest memory x time product within the p99 budget wins.
+    """
+    def fake_measure(memory_cost, time_cost, parallelism, samples):
+        p99 = memory_cost / 1024 * time_cost  # 1 ms per MiB per pass
+        return {"p50_ms": p99, "p99_ms": p99}
+
+    monkeypatch.setattr(hash_tuning, "measure_argon2", fake_measure)
+
+    best, results = hash_tuning.tune_argon2(
+        target_p99_ms=100, memory_costs=(16384, 32768, 65536), time_costs=(1, 2, 3, 4))
+
+    assert best["memory_cost"] == 32768 and best["time_cost"] == 3
+    assert any(not r["fits"] for r in results)
+
+
+def test_tune_argon2_returns_none_when_nothing_fits(monkeypatch):
+    monkeypatch.setattr(hash_tuning, "measure_argon2",
+                        lambda *args: {"p50_ms": 500.0, "p99_ms": 500.0})
+
+    best, _ = hash_tuning.tune_argon2(target_p99_ms=10, memory_costs=(19456,), time_costs=(1,))
+
+    assert best is None
@@ -0,0 +1,81 @@
+"""
+Unit tests for the password hashing pool: execution, load shedding and metrics.
+"""
+
+import asyncio
+import time
+
+import pytest
+
+from fastapi_auth_service.app.core.hashing_pool import HashingPool, HashingPoolSaturated
+from fastapi_auth_service.app.utils.passwords import hash_password, verify_password
+
+
+def _slow_identity(value, delay=0.2):
+    time.sleep(delay)
+    return value
+
+
+@pytest.mark.asyncio
+async def test_pool_hashes_and_verifies_in_threads():
+    """
+    With 0 workers the pool runs jobs in the default thread pool.
+    """
+    pool = HashingPool(workers=0, max_queue=4, queue_timeout=5)
+
+    hashed = await pool.run(hash_password, "StrongPass123!")
+
+    assert await pool.run(verify_password, "StrongPass123!", hashed) is True
+    assert await pool.run(verify_password, "WrongPass123!", hashed) is False
+    assert pool.hash_time.count >= 3
+
+
+@pytest.mark.asyncio
+async def test_pool_runs_in_worker_process():
+    """
+    A real worker process produces a hash that verifies in the parent.
+    """
+    pool = HashingPool(workers=1, max_queue=1, queue_timeout=30)
+    try:
+        hashed = await pool.run(hash_password, "StrongPass123!")
+    finally:
+        pool.shutdown()
+
+    assert verify_password("StrongPass123!", hashed)
+
+
+@pytest.mark.asyncio
+async def test_pool_rejects_when_queue_is_full():
+    """
+    Jobs above workers + max_queue are shed immediately.
+    """
+    pool = HashingPool(workers=0, max_queue=1, queue_timeout=5)
+
+    # One job runs, one waits in the queue
+    running = asyncio.create_task(pool.run(_slow_identity, 1))
+    queued = asyncio.create_task(pool.run(_slow_identity, 2))
+    await asyncio.sleep(0.05)
+
+    with pytest.raises(HashingPoolSaturated):
+        await pool.run(_slow_identity, 3)
+
+    assert await running == 1
+    assert await queued == 2
+    assert pool.rejected.value >= 1
+
+
+@pytest.mark.asyncio
+async def test_pool_times_out_waiting_jobs():
+    """
+    A job that waits in the queue longer than queue_timeout is dropped.
+    """
+    pool = HashingPool(workers=0, max_queue=1, queue_timeout=0.05)
+
+    running = asyncio.create_task(pool.run(_slow_identity, 1, 0.3))
+    await asyncio.sleep(0.01)
+
+    with pytest.raises(HashingPoolSaturated):
+        await pool.run(_slow_identity, 2)
+
+    assert await running == 1
+    assert pool.queue_depth.value == 0
@@ -0,0 +1,78 @@
+"""
+Unit tests for jwt_codec.py - codec backends and the verified-token cache.
+"""
+
+import time
+from datetime import datetime, timedelta
+
+import pytest
+
+from fastapi_auth_service.app.utils.jwt_codec import (
+    CODECS, TokenDecodeError, VerifiedTokenCache, get_codec, token_digest
+)
+
+
+SECRET = "test-secret"
+
+
+@pytest.mark.parametrize("encoder", list(CODECS))
+@pytest.mark.parametrize("decoder", list(CODECS))
+def test_codecs_are_interchangeable(encoder, decoder):
+    """
+    A token issued by one backend is accepted by the other; a forged one is rejected by both.
+    """
+    claims = {"sub": "1", "role": "user", "exp": datetime.utcnow() + timedelta(minutes=5)}
+    token = get_codec(encoder).encode(claims, SECRET, algorithm="HS256")
+
+    payload = get_codec(decoder).decode(token, SECRET, algorithms=["HS256"])
+    assert payload["sub"] == "1"
+    assert payload["role"] == "user"
+
+    with pytest.raises(TokenDecodeError):
+        get_codec(decoder).decode(token, "another-secret", algorithms=["HS256"])
+
+
+def test_unknown_codec_is_rejected():
+    with pytest.raises(ValueError):
+        get_codec("nope")
+
+
+def test_verified_cache_respects_expiry_and_size():
+    """
+    Entries expire at the token's exp, tokens without exp are not cached,
+    and the least recently used entry is evicted.
+    """
+    cache = VerifiedTokenCache(max_size=2)
+    now = time.time()
+
+    cache.put(token_digest("expired"), {"sub": "1", "exp": now - 1})
+    cache.put(token_digest("no-exp"), {"sub": "2"})
+    assert cache.get(token_digest("expired")) is None
+    assert cache.get(token_digest("no-exp")) is None
+
+    cache.put(token_digest("a"), {"sub": "a", "exp": now + 60})
+    cache.put(token_digest("b"), {"sub": "b", "exp": now + 60})
+    assert cache.get(token_digest("a"))["sub"] == "a"
+    cache.put(token_digest("c"), {"sub": "c", "exp": now + 60})
+
+    assert cache.get(token_digest("b")) is None
+    assert cache.get(token_digest("a")) is not None
+    assert cache.get(token_digest("c")) is not None
+
+
+def test_verified_cache_caps_lifetime_and_drops_removed_keys(monkeypatch):
+    """
+    A far-future exp is cached for max_ttl only; tokens of a removed kid are dropped.
+    """
+    cache = VerifiedTokenCache(max_size=10, max_ttl=60)
+    now = time.time()
+    cache.put(token_digest("leaked"), {"sub": "1", "exp": now + 10 ** 9}, kid="k1")
+    cache.put(token_digest("other"), {"sub": "2", "exp": now + 30}, kid="k2")
+
+    cache.discard_kids({"k1"})
+    assert cache.get(token_digest("leaked")) is None
+    assert cache.get(token_digest("other")) is not None
+
+    cache.put(token_digest("leaked"), {"sub": "1", "exp": now + 10 ** 9}, kid="k1")
+    monkeypatch.setattr(time, "time", lambda: now + 61)
+    assert cache.get(token_digest("leaked")) is None
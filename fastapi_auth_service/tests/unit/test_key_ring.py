@@ -0,0 +1,132 @@
+"""
+Unit tests for key_ring.py - asymmetric signing keys, rotation and JWKS.
+"""
+
+from datetime import datetime, timedelta, timezone
+
+import jwt
+import pytest
+
+from fastapi_auth_service.app.utils.jwt_codec import get_codec
+from fastapi_auth_service.app.utils.key_ring import KeyRing
+
+
+def _ring(keys_dir, algorithm="EdDSA", backend="pyjwt") -> KeyRing:
+    return KeyRing(
+        keys_dir=str(keys_dir),
+        algorithm=algorithm,
+        codec=get_codec(backend),
+        rotation_period=timedelta(days=30),
+        publish_ahead=timedelta(hours=2),
+        retain=timedelta(days=7),
+    )
+
+
+def test_rotation_publishes_next_key_ahead_and_workers_agree(tmp_path):
+    """
+    Two workers rotating the same directory end up with the same keys;
+    the next period's key is published before it becomes active.
+    """
+    first, second = _ring(tmp_path), _ring(tmp_path)
+    period_start = first._period_start(datetime.now(timezone.utc))
+
+    first.rotate(period_start + timedelta(days=10))
+    second.rotate(period_start + timedelta(days=10))
+    assert [k.kid for k in first.keys()] == [k.kid for k in second.keys()]
+    assert len(first.keys()) == 1
+
+    # Close to the period end the next key shows up in JWKS, but is not used yet
+    almost_next = period_start + timedelta(days=30) - timedelta(hours=1)
+    first.rotate(almost_next)
+    assert len(first.jwks()["keys"]) == 2
+    assert first._active_key(almost_next).not_before == period_start
+
+
+def test_replaced_keys_are_retired_after_token_lifetime(tmp_path):
+    ring = _ring(tmp_path)
+    period_start = ring._period_start(datetime.now(timezone.utc))
+    ring.rotate(period_start)
+    old_kid = ring.keys()[0].kid
+
+    ring.rotate(period_start + timedelta(days=31))
+    assert old_kid in [k.kid for k in ring.keys()]  # tokens signed with it may be alive
+
+    ring.rotate(period_start + timedelta(days=38))
+    assert old_kid not in [k.kid for k in ring.keys()]
+
+
+@pytest.mark.parametrize("algorithm,backend", [("EdDSA", "pyjwt"), ("RS256", "jose"), ("RS256", "pyjwt")])
+def test_tokens_verify_with_published_jwks(tmp_path, algorithm, backend, monkeypatch):
+    """
+    Tokens carry a kid and verify locally with nothing but the JWKS document.
+    """
+    from fastapi_auth_service.app.utils import security
+
+    ring = _ring(tmp_path, algorithm, backend)
+    monkeypatch.setattr(security, "key_ring", ring)
+    monkeypatch.setattr(security, "jwt_codec", get_codec(backend))
+
+    token = security.create_access_token({"sub": "5"}, expires_delta=timedelta(minutes=5))
+    kid = jwt.get_unverified_header(token)["kid"]
+
+    jwk = next(k for k in ring.jwks()["keys"] if k["kid"] == kid)
+    payload = jwt.decode(token, jwt.PyJWK(jwk).key, algorithms=[jwk["alg"]])
+    assert payload["sub"] == "5"
+    assert security.decode_access_token(token)["sub"] == "5"
+
+    # A token signed with the shared secret is accepted only as a legacy token without kid
+    forged = jwt.encode({"sub": "5", "exp": datetime.now(timezone.utc) + timedelta(minutes=5)},
+                        security.SECRET_KEY, algorithm="HS256", headers={"kid": kid})
+    assert security.decode_access_token(forged) is None
+
+
+def test_removed_key_stops_verifying_cached_tokens(tmp_path, monkeypatch):
+    """
+    Deleting a leaked key file rejects its tokens at the next reload,
+    even those already in the verified-token cache.
+    """
+    from fastapi_auth_service.app.utils import security
+    from fastapi_auth_service.app.utils.jwt_codec import VerifiedTokenCache
+
+    cache = VerifiedTokenCache(max_size=10)
+    ring = _ring(tmp_path, "RS256", "pyjwt")
+    ring.on_removed = cache.discard_kids
+    monkeypatch.setattr(security, "key_ring", ring)
+    monkeypatch.setattr(security, "jwt_codec", get_codec("pyjwt"))
+    monkeypatch.setattr(security, "verified_tokens", cache)
+
+    leaked_kid = ring.signing_key().kid
+    token = security.create_access_token({"sub": "5"}, expires_delta=timedelta(minutes=5))
+    assert security.decode_access_token(token)["sub"] == "5"
+
+    ring.rotate_now()
+    (tmp_path / f"{leaked_kid}.pem").unlink()
+    ring.reload()
+
+    assert security.decode_access_token(token) is None
+    fresh = security.create_access_token({"sub": "5"}, expires_delta=timedelta(minutes=5))
+    assert security.decode_access_token(fresh)["sub"] == "5"
+
+
+def test_jose_backend_rejects_eddsa(tmp_path):
+    with pytest.raises(ValueError):
+        _ring(tmp_path, "EdDSA", "jose")
+
+
+@pytest.mark.parametrize("accept, legacy_secret, accepted", [
+    (False, "configured-secret", False),
+    (True, None, False),  # The built-in default secret is never trusted
+    (True, "configured-secret", True),
+])
+def test_legacy_hs256_tokens(tmp_path, monkeypatch, accept, legacy_secret, accepted):
+    from fastapi_auth_service.app.utils import security
+
+    monkeypatch.setattr(security, "key_ring", _ring(tmp_path, "RS256", "pyjwt"))
+    monkeypatch.setattr(security, "jwt_codec", get_codec("pyjwt"))
+    monkeypatch.setattr(security.settings, "JWT_ACCEPT_HS256", accept)
+    monkeypatch.setattr(security, "LEGACY_SECRET_KEY", legacy_secret)
+
+    exp = datetime.now(timezone.utc) + timedelta(minutes=5)
+    legacy = jwt.encode({"sub": "5", "exp": exp}, legacy_secret or security.SECRET_KEY, algorithm="HS256")
+
+    assert (security.decode_access_token(legacy) is not None) is accepted
@@ -0,0 +1,136 @@
+"""
+Unit tests for login throttling: local token buckets and the Redis sliding window.
+"""
+
+import uuid
+
+import pytest
+from fastapi import HTTPException
+from starlette.requests import Request
+
+from fastapi_auth_service.app.services import login_throttle
+from fastapi_auth_service.app.services.login_throttle import LocalBucketLimiter, TokenBucket
+
+
+def test_token_bucket_allows_burst_then_blocks():
+    bucket = TokenBucket(capacity=3, refill_rate=0)
+
+    assert [bucket.take() for _ in range(4)] == [True, True, True, False]
+
+
+def test_local_limiter_reports_retry_after():
+    limiter = LocalBucketLimiter(capacity=1, refill_rate=2)
+
+    assert limiter.take("ip:1") is None
+    wait = limiter.take("ip:1")
+
+    assert wait is not None and 0 < wait <= 0.5
+    assert limiter.take("ip:2") is None  # Other keys are independent
+
+
+def test_local_limiter_is_bounded():
+    limiter = LocalBucketLimiter(capacity=1, refill_rate=0, max_keys=2)
+
+    for key in ("a", "b", "c"):
+        limiter.take(key)
+
+    assert len(limiter._buckets) == 2
+
+
+def test_local_limiter_takes_all_keys_or_none():
+    limiter = LocalBucketLimiter(capacity=1, refill_rate=0)
+    limiter.take("email:a")
+
+    assert limiter.take("ip:1", "email:a") is not None
+    assert limiter.take("ip:1") is None  # The rejected attempt did not spend ip:1
+
+
+@pytest.mark.asyncio
+async def test_local_bucket_rejects_before_redis(monkeypatch):
+    """
+    An empty local bucket gives 429 without a Redis call.
+    """
+    monkeypatch.setattr(login_throttle, "local_limiter", LocalBucketLimiter(capacity=0, refill_rate=1))
+
+    def _no_redis(*args, **kwargs):
+        raise AssertionError("Redis must not be called")
+
+    monkeypatch.setattr(login_throttle.redis_cache, "pipeline", _no_redis)
+
+    with pytest.raises(HTTPException) as exc_info:
+        await login_throttle.enforce_login_throttle("user@example.com", "10.0.0.1")
+
+    assert exc_info.value.status_code == 429
+    assert "Retry-After" in exc_info.value.headers
+
+
+@pytest.mark.asyncio
+async def test_redis_failure_fails_open(monkeypatch):
+    monkeypatch.setattr(login_throttle, "local_limiter", LocalBucketLimiter(capacity=10, refill_rate=1))
+
+    async def _broken_script(*args, **kwargs):
+        raise ConnectionError("Redis is down")
+
+    monkeypatch.setattr(login_throttle, "sliding_window_script", _broken_script)
+
+    await login_throttle.enforce_login_throttle("user@example.com", "10.0.0.2")
+
+
+@pytest.mark.asyncio
+async def test_sliding_window_blocks_email_over_limit(monkeypatch):
+    """
+    The shared Redis window blocks an email after LOGIN_MAX_ATTEMPTS_PER_EMAIL attempts.
+    """
+    monkeypatch.setattr(login_throttle, "local_limiter", LocalBucketLimiter(capacity=100, refill_rate=1))
+    monkeypatch.setattr(login_throttle.settings, "LOGIN_MAX_ATTEMPTS_PER_EMAIL", 3)
+    email = f"{uuid.uuid4().hex}@example.com"
+
+    for _ in range(3):
+        await login_throttle.enforce_login_throttle(email, "10.0.0.3")
+
+    with pytest.raises(HTTPException) as exc_info:
+        await login_throttle.enforce_login_throttle(email, "10.0.0.3")
+    assert exc_info.value.status_code == 429
+
+    # A successful login clears the email window
+    await login_throttle.reset_login_attempts(email)
+    await login_throttle.enforce_login_throttle(email, "10.0.0.3")
+
+
+@pytest.mark.asyncio
+async def test_rejected_email_does_not_spend_ip_window(monkeypatch):
+    """
+    Attempts blocked by the email window are not recorded in the IP window.
+    """
+    monkeypatch.setattr(login_throttle, "local_limiter", LocalBucketLimiter(capacity=100, refill_rate=1))
+    monkeypatch.setattr(login_throttle.settings, "LOGIN_MAX_ATTEMPTS_PER_EMAIL", 1)
+    monkeypatch.setattr(login_throttle.settings, "LOGIN_MAX_ATTEMPTS_PER_IP", 3)
+    ip = f"10.1.{uuid.uuid4().int % 250}.{uuid.uuid4().int % 250}"
+    sprayed = f"{uuid.uuid4().hex}@example.com"
+
+    await login_throttle.enforce_login_throttle(sprayed, ip)
+    for _ in range(5):
+        with pytest.raises(HTTPException):
+            await login_throttle.enforce_login_throttle(sprayed, ip)
+
+    # The IP has spent one attempt of three
+    for _ in range(2):
+        await login_throttle.enforce_login_throttle(f"{uuid.uuid4().hex}@example.com", ip)
+
+
+def _request(peer: str, forwarded_for: str = None) -> Request:
+    headers = [(b"x-forwarded-for", forwarded_for.encode())] if forwarded_for else []
+    return Request({"type": "http", "client": (peer, 1234), "headers": headers})
+
+
+@pytest.mark.parametrize("trusted, peer, forwarded_for, expected", [
+    ("", "10.0.0.5", "1.2.3.4", "10.0.0.5"),                          # No proxies configured
+    ("10.0.0.0/8", "10.0.0.5", "1.2.3.4", "1.2.3.4"),                 # Behind the load balancer
+    ("10.0.0.0/8", "10.0.0.5", "6.6.6.6, 1.2.3.4, 10.0.0.7", "1.2.3.4"),  # Spoofed left part ignored
+    ("10.0.0.0/8", "8.8.8.8", "1.2.3.4", "8.8.8.8"),                  # Untrusted peer's header ignored
+    ("10.0.0.0/8", "10.0.0.5", None, "10.0.0.5"),
+])
+def test_client_ip_trusts_only_configured_proxies(monkeypatch, trusted, peer, forwarded_for, expected):
+    monkeypatch.setattr(login_throttle.settings, "TRUSTED_PROXIES", trusted)
+
+    assert login_throttle.client_ip(_request(peer, forwarded_for)) == expected
@@ -0,0 +1,66 @@
+"""
+Unit tests for opaque reference tokens.
+"""
+
+import time
+import uuid
+
+import pytest
+
+from fastapi_auth_service.app.services.token_cache import lookup_opaque_token
+from fastapi_auth_service.app.services.token_introspection import introspect_tokens
+from fastapi_auth_service.app.services.user_epoch import bump_user_epoch
+from fastapi_auth_service.app.services.user_sessions import new_session_id, start_session
+from fastapi_auth_service.app.utils.opaque_tokens import (
+    decode_record,
+    encode_record,
+    is_opaque_token,
+    new_opaque_token,
+    opaque_token_user,
+)
+from fastapi_auth_service.app.utils.security import build_token_claims, create_access_token
+
+
+def test_opaque_token_format():
+    token = new_opaque_token(42)
+    assert len(token) == 25
+    assert opaque_token_user(token) == 42
+    assert new_opaque_token(42) != token
+
+    assert not is_opaque_token(create_access_token({"sub": "42"}))
+    for bad in ("42", "abc.aaaaaaaaaaaaaaaaaaaaaa", "42.short", "42.aaaaaaaaaaaaaaaaaaaaa.b"):
+        assert opaque_token_user(bad) is None
+
+
+def test_record_round_trip():
+    claims = build_token_claims(42, "admin", "a@test.com", 3, sid="s1")
+    record = encode_record(claims, expires_at=1700000000)
+    assert " " not in record
+    assert decode_record(record) == {
+        "sub": "42", "role": "admin", "email": "a@test.com", "epoch": 3, "sid": "s1", "exp": 1700000000}
+    assert decode_record("42") is None
+    assert decode_record(None) is None
+
+
+@pytest.mark.asyncio
+async def test_lookup_checks_the_record_and_the_epoch():
+    """
+    One lookup answers for the token; an epoch bump makes the record stale.
+    """
+    user_id = 700_000 + uuid.uuid4().int % 100_000
+    sid = new_session_id()
+    access, refresh = new_opaque_token(user_id), new_opaque_token(user_id)
+    record = encode_record(build_token_claims(user_id, "user", "u@test.com", 0, sid=sid), int(time.time()) + 60)
+    await start_session(user_id, sid, access, refresh, record=record)
+
+    assert (await lookup_opaque_token(access))["sid"] == sid
+    assert (await lookup_opaque_token(refresh, refresh=True))["sub"] == str(user_id)
+    assert await lookup_opaque_token(refresh) is None  # not an access token
+    assert await lookup_opaque_token(new_opaque_token(user_id)) is None
+
+    result, = await introspect_tokens([access])
+    assert result["active"] and result["role"] == "user" and result.get("exp") is None
+
+    await bump_user_epoch(user_id)
+    assert await lookup_opaque_token(access) is None
+    assert (await introspect_tokens([access]))[0]["active"] is False
@@ -0,0 +1,57 @@
+import json
+from datetime import datetime
+
+import pytest
+
+from fastapi_auth_service.app.utils import pagination
+from fastapi_auth_service.app.utils.pagination import (
+    decode_cursor, encode_cursor, json_array_stream, json_object_stream,
+)
+
+
+async def _aiter(items):
+    for item in items:
+        yield item
+
+
+async def _body(stream) -> bytes:
+    return b"".join([chunk async for chunk in stream])
+
+
+def test_cursor_round_trip():
+    position = {"sort": "last_activity_at:desc", "value": datetime(2025, 1, 2, 3, 4, 5), "id": 42}
+    cursor = encode_cursor(position)
+
+    assert "=" not in cursor
+    assert decode_cursor(cursor) == {"sort": "last_activity_at:desc", "value": "2025-01-02T03:04:05", "id": 42}
+
+
+@pytest.mark.parametrize("cursor", ["garbage!", "bm90IGpzb24", encode_cursor([1, 2])])
+def test_decode_cursor_rejects_foreign_input(cursor):
+    with pytest.raises(ValueError):
+        decode_cursor(cursor)
+
+
+@pytest.mark.asyncio
+async def test_json_object_stream_matches_in_memory_body(monkeypatch):
+    monkeypatch.setattr(pagination, "STREAM_CHUNK_ROWS", 2)
+    users = {i: {"user_id": i, "first_name": "Ім'я", "last_activity_at": datetime(2025, 1, i)} for i in range(1, 6)}
+
+    body = await _body(json_object_stream("users", _aiter(users.items())))
+
+    assert json.loads(body) == {"users": {str(i): {**u, "last_activity_at": u["last_activity_at"].isoformat()}
+                                          for i, u in users.items()}}
+
+
+@pytest.mark.asyncio
+async def test_json_streams_of_nothing_are_valid():
+    assert json.loads(await _body(json_object_stream("users", _aiter([])))) == {"users": {}}
+    assert json.loads(await _body(json_array_stream("deleted_users", _aiter([])))) == {"deleted_users": []}
+
+
+@pytest.mark.asyncio
+async def test_json_array_stream_keeps_order(monkeypatch):
+    monkeypatch.setattr(pagination, "STREAM_CHUNK_ROWS", 2)
+    items = [{"id": i} for i in range(5)]
+
+    assert json.loads(await _body(json_array_stream("deleted_users", _aiter(items)))) == {"deleted_users": items}
@@ -0,0 +1,133 @@
+"""
+Unit tests for the principal cache used by get_current_user.
+"""
+
+import asyncio
+import contextlib
+
+import pytest
+
+from fastapi_auth_service.app.models.user import User
+from fastapi_auth_service.app.services import principal_cache as principal_cache_module
+from fastapi_auth_service.app.services.principal_cache import PrincipalCache
+
+
+def _user(user_id: int, **fields) -> User:
+    return User(id=user_id, email=f"user{user_id}@example.com", role="user", balance=0, **fields)
+
+
+def test_hit_returns_a_fresh_copy():
+    cache = PrincipalCache(max_size=10, ttl=60)
+    cache.put(_user(1, first_name="Ivan"), cache.generation(1))
+
+    first = cache.get(1)
+    second = cache.get(1)
+
+    assert first.first_name == "Ivan"
+    assert first is not second  # Handlers never share a cached object
+
+
+def test_entries_expire():
+    cache = PrincipalCache(max_size=10, ttl=0)
+    cache.put(_user(1), cache.generation(1))
+
+    assert cache.get(1) is None
+
+
+def test_lru_eviction():
+    cache = PrincipalCache(max_size=2, ttl=60)
+    for user_id in (1, 2):
+        cache.put(_user(user_id), cache.generation(user_id))
+    cache.get(1)  # 1 becomes most recently used
+    cache.put(_user(3), cache.generation(3))
+
+    assert cache.get(2) is None
+    assert cache.get(1) is not None and cache.get(3) is not None
+
+
+def test_invalidation_during_load_is_not_cached():
+    """
+    A row read before an invalidation must not be stored after it.
+    """
+    cache = PrincipalCache(max_size=10, ttl=60)
+    generation = cache.generation(1)
+
+    cache.invalidate(1)  # A write happened while the DB read was in flight
+    cache.put(_user(1), generation)
+
+    assert cache.get(1) is None
+
+
+def test_invalidating_another_user_does_not_block_caching():
+    cache = PrincipalCache(max_size=10, ttl=60)
+    generation = cache.generation(1)
+
+    cache.invalidate(2)  # E.g. another user's login updated their balance
+    cache.put(_user(1), generation)
+
+    assert cache.get(1) is not None
+
+
+def test_clear_during_load_is_not_cached():
+    cache = PrincipalCache(max_size=10, ttl=60)
+    generation = cache.generation(1)
+
+    cache.clear()
+    cache.put(_user(1), generation)
+
+    assert cache.get(1) is None
+
+
+@pytest.mark.asyncio
+async def test_invalidate_principal_drops_local_entry_without_redis(monkeypatch):
+    cache = PrincipalCache(max_size=10, ttl=60)
+    cache.put(_user(5), cache.generation(5))
+    monkeypatch.setattr(principal_cache_module, "principal_cache", cache)
+
+    async def _broken_publish(*args):
+        raise ConnectionError("Redis is down")
+
+    monkeypatch.setattr(principal_cache_module.redis_cache, "publish", _broken_publish)
+
+    await principal_cache_module.invalidate_principal(5)
+
+    assert cache.get(5) is None
+
+
+@pytest.mark.asyncio
+async def test_published_invalidation_reaches_listener(monkeypatch):
+    cache = PrincipalCache(max_size=10, ttl=60)
+    monkeypatch.setattr(principal_cache_module, "principal_cache", cache)
+
+    listener = asyncio.create_task(principal_cache_module.listen_for_invalidations())
+    await asyncio.sleep(0.1)
+    cache.put(_user(7), cache.generation(7))
+
+    await principal_cache_module.redis_cache.publish(principal_cache_module.INVALIDATION_CHANNEL, 7)
+    await asyncio.sleep(0.1)
+    listener.cancel()
+    with contextlib.suppress(asyncio.CancelledError):
+        await listener
+
+    assert cache.get(7) is None
+
+
+@pytest.mark.asyncio
+async def test_published_write_marks_the_writer_and_keeps_their_entry(monkeypatch):
+    cache = PrincipalCache(max_size=10, ttl=60)
+    monkeypatch.setattr(principal_cache_module, "principal_cache", cache)
+
+    listener = asyncio.create_task(principal_cache_module.listen_for_invalidations())
+    await asyncio.sleep(0.1)
+    cache.put(_user(8), cache.generation(8))
+
+    await principal_cache_module.redis_cache.publish(
+        principal_cache_module.INVALIDATION_CHANNEL, f"{principal_cache_module.WRITER_PREFIX}8"
+    )
+    await asyncio.sleep(0.1)
+    listener.cancel()
+    with contextlib.suppress(asyncio.CancelledError):
+        await listener
+
+    assert cache.get(8) is not None  # The writer's own row did not change
+    assert 8 in principal_cache_module.recent_writes
@@ -0,0 +1,47 @@
+"""
+Unit tests for building the Redis client of each topology (no connection is made).
+"""
+
+from types import SimpleNamespace
+
+import pytest
+
+from fastapi_auth_service.app.core.redis import (
+    ResilientRedis,
+    ResilientRedisCluster,
+    build_redis_client,
+    parse_nodes,
+)
+
+
+def _config(**overrides) -> SimpleNamespace:
+    config = dict(
+        REDIS_MODE="standalone", REDIS_HOST="127.0.0.1", REDIS_PORT=6379, REDIS_DB=0,
+        REDIS_CLUSTER_NODES="", REDIS_SENTINELS="", REDIS_SENTINEL_MASTER="mymaster",
+        REDIS_MAX_CONNECTIONS=10, REDIS_POOL_TIMEOUT=0.1, REDIS_SOCKET_TIMEOUT=0.1,
+        REDIS_CONNECT_TIMEOUT=0.1, REDIS_HEALTH_CHECK_INTERVAL=30, REDIS_RETRIES=0,
+        REDIS_BREAKER_FAILURES=2, REDIS_BREAKER_RESET_SECONDS=60,
+    )
+    config.update(overrides)
+    return SimpleNamespace(**config)
+
+
+def test_parse_nodes():
+    assert parse_nodes("a:7000, b:7001,") == [("a", 7000), ("b", 7001)]
+    with pytest.raises(ValueError):
+        parse_nodes("a")
+    with pytest.raises(ValueError):
+        parse_nodes("")
+
+
+def test_client_per_topology_has_a_breaker():
+    cluster = build_redis_client(_config(REDIS_MODE="cluster", REDIS_CLUSTER_NODES="127.0.0.1:7000,127.0.0.1:7001"))
+    assert isinstance(cluster, ResilientRedisCluster)
+    assert cluster.breaker.is_closed
+
+    sentinel = build_redis_client(_config(REDIS_MODE="sentinel", REDIS_SENTINELS="127.0.0.1:26379"))
+    assert isinstance(sentinel, ResilientRedis)
+    assert sentinel.connection_pool.service_name == "mymaster"
+
+    with pytest.raises(ValueError):
+        build_redis_client(_config(REDIS_MODE="ring"))
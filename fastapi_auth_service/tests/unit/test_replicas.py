@@ -0,0 +1,111 @@
+"""
+Unit tests for read replica routing (no database needed).
+"""
+
+from types import SimpleNamespace
+
+import pytest
+
+from fastapi_auth_service.app.core.replicas import RecentWrites, ReplicaRouter, request_user_id
+from fastapi_auth_service.app.services import principal_cache as principal_cache_module
+from fastapi_auth_service.app.services import user_events
+
+
+class FakeClock:
+    def __init__(self) -> None:
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def _replica(name: str, lag=None) -> SimpleNamespace:
+    return SimpleNamespace(name=name, lag=lag, engine=SimpleNamespace(sync_engine=name))
+
+
+def _router(*replicas, window: float = 5.0, clock=None) -> ReplicaRouter:
+    return ReplicaRouter(list(replicas), max_lag=2.0, recent_writes=RecentWrites(window, clock or FakeClock()))
+
+
+def test_recent_writes_expire_after_the_window():
+    clock = FakeClock()
+    writes = RecentWrites(5.0, clock)
+    writes.mark(1)
+    clock.now += 3
+    writes.mark(2)
+    assert 1 in writes and 2 in writes and 3 not in writes
+
+    clock.now += 2.5
+    assert 1 not in writes and 2 in writes
+    writes.mark(3)
+    assert len(writes) == 2  # The expired entry of user 1 is dropped
+
+
+def test_reads_are_spread_over_replicas_within_the_lag():
+    router = _router(_replica("r1", lag=0.1), _replica("r2", lag=1.5), _replica("r3", lag=30.0))
+    picked = [router.pick(user_id=7) for _ in range(4)]
+    assert picked == ["r1", "r2", "r1", "r2"]
+
+
+def test_primary_is_used_when_no_replica_is_usable():
+    assert _router().pick(user_id=7) is None
+    assert _router(_replica("r1", lag=None), _replica("r2", lag=3.0)).pick(user_id=7) is None
+
+
+def test_user_reads_their_own_writes_from_the_primary():
+    clock = FakeClock()
+    router = _router(_replica("r1", lag=0.0), clock=clock)
+    router.recent_writes.mark(7)
+
+    assert router.pick(user_id=7) is None
+    assert router.pick(user_id=8) == "r1"
+    assert router.pick(user_id=None) == "r1"
+
+    clock.now += 5
+    assert router.pick(user_id=7) == "r1"
+
+
+@pytest.mark.asyncio
+async def test_admin_lists_users_from_the_primary_after_blocking_one(monkeypatch):
+    router = _router(_replica("r1", lag=0.0))
+    published = []
+
+    async def _noop(*args):
+        return None
+
+    async def _publish(channel, message):
+        published.append(message)
+
+    for hook in ("bump_user_epoch", "publish_revocations", "revoke_all_sessions", "invalidate_principal"):
+        monkeypatch.setattr(user_events, hook, _noop)
+    monkeypatch.setattr(user_events, "recent_writes", router.recent_writes)
+    monkeypatch.setattr(principal_cache_module, "recent_writes", router.recent_writes)
+    monkeypatch.setattr(principal_cache_module.redis_cache, "publish", _publish)
+
+    token = request_user_id.set(1)  # The admin's request blocks user 42
+    try:
+        await user_events.user_security_changed(42)
+    finally:
+        request_user_id.reset(token)
+
+    assert router.pick(user_id=1) is None  # GET /users/ of the admin
+    assert router.pick(user_id=42) is None
+    assert router.pick(user_id=8) == "r1"
+    assert published == [f"{principal_cache_module.WRITER_PREFIX}1"]  # Other workers mark the admin too
+
+
+@pytest.mark.asyncio
+async def test_check_lag_takes_failed_replicas_out_of_rotation(monkeypatch):
+    healthy, broken = _replica("r1", lag=9.0), _replica("r2", lag=0.0)
+    router = _router(healthy, broken)
+
+    async def _measure(replica):
+        if replica is broken:
+            raise ConnectionRefusedError("replica is down")
+        return 0.25
+
+    monkeypatch.setattr(router, "_measure", _measure)
+    await router.check_lag(timeout=1.0)
+
+    assert healthy.lag == 0.25 and broken.lag is None
+    assert router.usable() == [healthy]
@@ -7,8 +7,12 @@ from fastapi_auth_service.app.utils.security import (
     hash_password,
     verify_password,
     create_access_token,
-    decode_access_token
+    create_refresh_token,
+    decode_access_token,
+    decode_refresh_token
 )
+from fastapi_auth_service.app.core.settings import settings
+from fastapi_auth_service.app.utils.passwords import build_password_context
 from datetime import timedelta
 import jwt
 
@@ -79,3 +83,54 @@ def test_decode_access_token_invalid():
     decoded = decode_access_token(token)
 
     assert decoded is None
+
+
+def test_argon2_context_verifies_and_migrates_bcrypt_hashes():
+    """
+    With "argon2,bcrypt" new hashes are Argon2id, old bcrypt hashes still verify
+    and are reported for rehash.
+    """
+    config = settings.model_copy(update={"PASSWORD_SCHEMES": "argon2,bcrypt", "BCRYPT_ROUNDS": 4})
+    context = build_password_context(config)
+
+    bcrypt_hash = build_password_context(
+        settings.model_copy(update={"BCRYPT_ROUNDS": 4})).hash("MyStrongPassword")
+    argon2_hash = context.hash("MyStrongPassword")
+
+    assert argon2_hash.startswith("$argon2id$")
+    assert context.verify("MyStrongPassword", bcrypt_hash)
+    assert context.needs_update(bcrypt_hash)
+    assert not context.needs_update(argon2_hash)
+
+
+def test_unknown_password_scheme_is_rejected():
+    config = settings.model_copy(update={"PASSWORD_SCHEMES": "md5_crypt"})
+    with pytest.raises(ValueError):
+        build_password_context(config)
+
+
+def test_verified_token_is_served_from_cache():
+    """
+    The second verification of a token skips the codec; callers get their own copy.
+    """
+    from unittest.mock import patch
+    from fastapi_auth_service.app.utils import security
+
+    token = create_access_token({"sub": "7"}, expires_delta=timedelta(minutes=1))
+    first = decode_access_token(token)
+    first["sub"] = "mutated"
+
+    with patch.object(security.jwt_codec, "decode", side_effect=AssertionError("not cached")):
+        second = decode_access_token(token)
+
+    assert second["sub"] == "7"
+
+
+def test_access_token_is_not_a_refresh_token():
+    """
+    Access and refresh tokens share the session id; only the refresh token decodes as one.
+    """
+    claims = {"sub": "7", "sid": "s1"}
+    refresh = decode_refresh_token(create_refresh_token(claims))
+    assert refresh["sid"] == "s1" and refresh["typ"] == "refresh"
+    assert decode_refresh_token(create_access_token(claims)) is None
@@ -1,10 +1,26 @@
 import pytest
 import asyncio
+import time
+from redis.crc import key_slot
+from fastapi_auth_service.app.core.redis import redis_cache
 from fastapi_auth_service.app.services.token_cache import (
     store_access_token,
+    access_token_key,
     is_access_token_valid,
     delete_access_token,
-    redis_cache
+    is_refresh_token_valid,
+    store_token_pair,
+    refresh_token_key,
+    user_sessions_key,
+)
+from fastapi_auth_service.app.services.user_epoch import bump_user_epoch, epoch_key, epoch_keys, get_user_epoch
+from fastapi_auth_service.app.services.keyspace_report import sample_token_keyspace
+from fastapi_auth_service.app.services.user_sessions import (
+    REFRESH_OK,
+    REFRESH_REVOKED,
+    REFRESH_TOKEN_MISSING,
+    list_sessions,
+    rotate_refresh_token,
 )
 from fastapi_auth_service.tests.db_waiter import wait_for_postgres  #
 
@@ -16,7 +32,7 @@ async def test_store_and_validate_access_token():
     user_id = 99
 
     await store_access_token(token, user_id)
-    result = await is_access_token_valid(token)
+    result = await is_access_token_valid(token, user_id)
     assert result is True
 
 
@@ -29,7 +45,7 @@ async def test_access_token_expiration():
     await redis_cache.set(f"access_token:{token}", user_id, ex=1)
     await asyncio.sleep(2)
 
-    result = await is_access_token_valid(token)
+    result = await is_access_token_valid(token, user_id)
     assert result is False
 
 
@@ -40,8 +56,8 @@ async def test_delete_access_token():
     user_id = 123
 
     await store_access_token(token, user_id)
-    await delete_access_token(token)
-    result = await is_access_token_valid(token)
+    await delete_access_token(token, user_id)
+    result = await is_access_token_valid(token, user_id)
     assert result is False
 
 
@@ -52,5 +68,183 @@ async def test_invalid_token_data():
 
     # Save a string instead of an ID, as if someone had replaced the Redis value
     await redis_cache.set(f"access_token:{token}", "not_a_number")
-    result = await is_access_token_valid(token)
+    result = await is_access_token_valid(token, 1)
     assert result is False
+
+
+@pytest.mark.asyncio
+async def test_store_token_pair_in_one_round_trip():
+    await wait_for_postgres()
+    await store_token_pair("pair_access", "pair_refresh", 77)
+
+    assert await is_access_token_valid("pair_access", 77) is True
+    assert await is_refresh_token_valid("pair_refresh", 77) is True
+
+
+@pytest.mark.asyncio
+async def test_refresh_script_checks_refresh_token_and_epoch():
+    """
+    A pair stored without a session (older tokens) is rotated into a new session;
+    missing refresh tokens and tokens of an older epoch are refused.
+    """
+    await wait_for_postgres()
+    user_id = 555001
+    await redis_cache.delete(*epoch_keys(user_id))
+    await store_token_pair("script_access", "script_refresh", user_id)
+    expires_at = int(time.time()) + 60
+
+    assert await rotate_refresh_token(
+        user_id, "script_sid", "script_refresh", 0, "script_new", "script_refresh_2", expires_at,
+        new_session=True) == REFRESH_OK
+    assert await is_access_token_valid("script_new", user_id) is True
+    assert await is_refresh_token_valid("script_refresh", user_id) is False
+    assert [s["sid"] for s in await list_sessions(user_id)] == ["script_sid"]
+
+    assert await rotate_refresh_token(
+        user_id, "other_sid", "missing_refresh", 0, "script_new_2", "missing_refresh_2", expires_at,
+        new_session=True) == REFRESH_TOKEN_MISSING
+    assert await is_access_token_valid("script_new_2", user_id) is False
+
+    await bump_user_epoch(user_id)
+    assert await rotate_refresh_token(
+        user_id, "script_sid", "script_refresh_2", 0, "script_new_3", "script_refresh_3", expires_at
+    ) == REFRESH_REVOKED
+    assert await is_access_token_valid("script_new_3", user_id) is False
+
+
+@pytest.mark.asyncio
+async def test_tokens_are_keyed_by_digest_with_legacy_fallback():
+    """
+    New tokens use a fixed-size key; tokens stored under the old layouts stay valid.
+    """
+    await wait_for_postgres()
+    token = "header." + "x" * 400 + ".signature"
+
+    await store_access_token(token, 5)
+    assert await redis_cache.exists(f"access_token:{token}") == 0
+    assert access_token_key(token, 5).startswith("at:{5}:")
+    assert len(access_token_key(token, 5)) == len("at:{5}:") + 22
+
+    legacy = "legacy." + "y" * 400 + ".signature"
+    await redis_cache.set(f"access_token:{legacy}", 5, ex=60)
+    await redis_cache.set(f"refresh_token:{legacy}", 5, ex=60)
+    assert await is_access_token_valid(legacy, 5) is True
+    assert await is_refresh_token_valid(legacy, 5) is True
+
+    await delete_access_token(legacy, 5)
+    assert await is_access_token_valid(legacy, 5) is False
+
+    untagged = "untagged." + "z" * 400 + ".signature"
+    await redis_cache.set(access_token_key(untagged, 5).replace("{5}:", ""), 5, ex=60)
+    assert await is_access_token_valid(untagged, 5) is True
+
+
+def test_keys_of_a_user_share_one_cluster_slot():
+    """
+    Tokens, session index and epoch of a user hash to one slot (pipelines and scripts in Redis Cluster).
+    """
+    slots = {
+        key_slot(key.encode())
+        for key in (
+            access_token_key("some.access.token", 42),
+            refresh_token_key("some.refresh.token", 42),
+            user_sessions_key(42),
+            epoch_key(42),
+        )
+    }
+    assert len(slots) == 1
+    # ...while different users still spread over the cluster
+    assert len({key_slot(user_sessions_key(user_id).encode()) for user_id in range(100)}) > 90
+
+
+@pytest.mark.asyncio
+async def test_keyspace_report_estimates_bytes_per_session():
+    class _Client:
+        """Minimal standalone client: RANDOMKEY cycles through fixed keys."""
+
+        def __init__(self, sizes, fields):
+            self.sizes, self.fields, self.keys = sizes, fields, list(sizes)
+
+        async def dbsize(self):
+            return 4 * len(self.keys)
+
+        def pipeline(self, transaction=False):
+            client, calls = self, []
+
+            class _Pipe:
+                def randomkey(self):
+                    calls.append(client.keys[len(calls) % len(client.keys)])
+
+                def memory_usage(self, key, samples=0):
+                    calls.append(client.sizes[key])
+
+                def hlen(self, key):
+                    calls.append(client.fields[key])
+
+                async def execute(self):
+                    return list(calls)
+
+            return _Pipe()
+
+    client = _Client(
+        {"at:a": 100, "rt:b": 110, "access_token:c": 600, "user_sessions:{1}": 300, "user_epoch:{1}": 80},
+        {"user_sessions:{1}": 2},
+    )
+    report = await sample_token_keyspace(client, samples=10)
+
+    assert report["prefixes"]["at:"]["estimated_keys"] == 4
+    # at + rt + one of the two hash fields + the epoch key shared by the user's 2 sessions
+    assert report["bytes_per_session"]["current"] == 100 + 110 + 150 + 40
+    assert report["bytes_per_session"]["legacy"] == 600
+
+
+@pytest.mark.asyncio
+async def test_epoch_honours_legacy_key_and_bumps_above_it():
+    """
+    The untagged epoch key of the previous layout still counts; a bump moves the tagged key past it.
+    """
+    user_id = 555002
+    await redis_cache.delete(*epoch_keys(user_id))
+    legacy_epoch = 10 ** 15  # Above the current time in ms
+    await redis_cache.set(f"user_epoch:{user_id}", legacy_epoch, ex=60)
+
+    assert await get_user_epoch(user_id) == legacy_epoch
+    assert await bump_user_epoch(user_id) == legacy_epoch + 1
+    assert await redis_cache.get(epoch_key(user_id)) == str(legacy_epoch + 1)
+
+
+@pytest.mark.asyncio
+async def test_sliding_session_extends_a_running_out_key_once(monkeypatch):
+    """
+    With sliding sessions a live key below the threshold is extended to the full
+    access lifetime, and only by the first of several concurrent checks.
+    """
+    from fastapi_auth_service.app.services import token_cache
+    from fastapi_auth_service.app.services.token_validity_cache import token_validity_cache
+
+    monkeypatch.setattr(token_cache.settings, "SESSION_SLIDING_ENABLED", True)
+    monkeypatch.setattr(token_validity_cache, "max_size", 0)  # every check goes to the store
+    extensions = []
+    original_slide = token_cache.token_store.slide
+
+    async def _counting_slide(keys, extend_below, ttl):
+        values, extended = await original_slide(keys, extend_below, ttl)
+        if extended:
+            extensions.append(keys[0])
+        return values, extended
+
+    monkeypatch.setattr(token_cache.token_store, "slide", _counting_slide)
+
+    token, user_id = f"sliding-{time.time_ns()}", 555003
+    await redis_cache.set(access_token_key(token, user_id), user_id, ex=30)
+    results = await asyncio.gather(*(is_access_token_valid(token, user_id) for _ in range(3)))
+
+    assert results == [True, True, True]
+    assert extensions == [access_token_key(token, user_id)]
+    assert await redis_cache.ttl(access_token_key(token, user_id)) > token_cache.SLIDING_EXTEND_BELOW_SECONDS
+
+    # Fresh keys are only read
+    fresh = f"sliding-fresh-{time.time_ns()}"
+    await store_access_token(fresh, user_id)
+    assert await is_access_token_valid(fresh, user_id) is True
+    assert len(extensions) == 1
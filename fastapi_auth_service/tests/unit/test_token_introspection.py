@@ -0,0 +1,99 @@
+"""
+Unit tests for batch token introspection.
+"""
+
+import uuid
+from datetime import timedelta
+
+import pytest
+from fastapi import HTTPException
+from redis.exceptions import ConnectionError as RedisConnectionError
+
+from fastapi_auth_service.app.core.settings import settings
+from fastapi_auth_service.app.routers import auth_routers
+from fastapi_auth_service.app.schemas.token import IntrospectionRequest
+from fastapi_auth_service.app.services import token_introspection
+from fastapi_auth_service.app.services.token_cache import (
+    access_token_key, delete_access_token, store_access_token
+)
+from fastapi_auth_service.app.services.user_epoch import bump_user_epoch
+from fastapi_auth_service.app.utils.security import build_token_claims, create_access_token
+
+
+def _issue(user_id: int, epoch: int = 0) -> str:
+    claims = build_token_claims(user_id, "user", f"{uuid.uuid4().hex[:6]}@test.com", epoch)
+    claims["nonce"] = uuid.uuid4().hex  # unique token per call
+    return create_access_token(claims, expires_delta=timedelta(minutes=5))
+
+
+@pytest.mark.asyncio
+async def test_introspect_batch_in_one_round_trip(monkeypatch):
+    """
+    Live, logged-out, revoked and forged tokens are resolved with a single MGET, in order.
+    """
+    live_user, revoked_user = 900_000 + uuid.uuid4().int % 1000, 901_000 + uuid.uuid4().int % 1000
+    live, logged_out, revoked = _issue(live_user), _issue(live_user), _issue(revoked_user)
+    for token, user_id in ((live, live_user), (logged_out, live_user), (revoked, revoked_user)):
+        await store_access_token(token, user_id)
+    await delete_access_token(logged_out, live_user)
+    await bump_user_epoch(revoked_user)
+
+    calls = []
+    original_get_many = token_introspection.token_store.get_many
+
+    async def _counting_get_many(*args, **kwargs):
+        calls.append(args)
+        return await original_get_many(*args, **kwargs)
+
+    monkeypatch.setattr(token_introspection.token_store, "get_many", _counting_get_many)
+
+    results = await token_introspection.introspect_tokens([live, logged_out, "not.a.token", revoked, live])
+
+    assert len(calls) == 1
+    assert [r["active"] for r in results] == [True, False, False, False, True]
+    assert results[0]["sub"] == str(live_user)
+    assert results[0]["role"] == "user"
+
+
+@pytest.mark.asyncio
+async def test_introspect_falls_back_to_signature_when_redis_is_down(monkeypatch):
+    """
+    Degraded mode: verified tokens are active, forged ones are not, nothing is cached locally.
+    With degraded mode off the Redis error propagates (503 in the app).
+    """
+    user_id = 902_000 + uuid.uuid4().int % 1000
+    token = _issue(user_id)
+
+    async def _failing_get_many(*args, **kwargs):
+        raise RedisConnectionError("Redis is down")
+
+    monkeypatch.setattr(token_introspection.token_store, "get_many", _failing_get_many)
+    monkeypatch.setattr(settings, "REDIS_DEGRADED_MODE", True)
+
+    results = await token_introspection.introspect_tokens([token, "not.a.token"])
+    assert [r["active"] for r in results] == [True, False]
+    assert not token_introspection.token_validity_cache.is_valid(access_token_key(token, user_id))
+
+    monkeypatch.setattr(settings, "REDIS_DEGRADED_MODE", False)
+    with pytest.raises(RedisConnectionError):
+        await token_introspection.introspect_tokens([token])
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("configured, sent, status_code", [(None, None, 404), (None, "guess", 404), ("s3cret", "guess", 401)])
+async def test_introspect_endpoint_requires_a_configured_key(monkeypatch, configured, sent, status_code):
+    monkeypatch.setattr(auth_routers.settings, "INTROSPECTION_API_KEY", configured)
+
+    with pytest.raises(HTTPException) as exc_info:
+        await auth_routers.introspect(IntrospectionRequest(tokens=[_issue(1)]), x_api_key=sent)
+
+    assert exc_info.value.status_code == status_code
+
+
+@pytest.mark.asyncio
+async def test_introspect_endpoint_with_the_key(monkeypatch):
+    monkeypatch.setattr(auth_routers.settings, "INTROSPECTION_API_KEY", "s3cret")
+
+    response = await auth_routers.introspect(IntrospectionRequest(tokens=["not.a.token"]), x_api_key="s3cret")
+
+    assert response["results"][0]["active"] is False
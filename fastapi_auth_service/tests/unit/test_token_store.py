@@ -0,0 +1,261 @@
+"""
+Conformance tests: every token store backend behaves the same.
+"""
+
+import asyncio
+import json
+import uuid
+from types import SimpleNamespace
+
+import pytest
+
+from fastapi_auth_service.app.core.metrics import metrics
+from fastapi_auth_service.app.core.redis import redis_cache
+from fastapi_auth_service.app.services.token_store import (
+    REFRESH_OK,
+    REFRESH_REUSED,
+    REFRESH_REVOKED,
+    REFRESH_TOKEN_MISSING,
+    MemoryTokenStore,
+    RedisTokenStore,
+    TokenStore,
+    build_token_store,
+)
+
+
+class FakeClock:
+    def __init__(self) -> None:
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+@pytest.fixture(params=["memory", "redis"])
+def backend(request):
+    """
+    (store, advance): `advance(seconds)` lets the store's time pass
+    (a fake clock for the memory store, a real sleep for Redis).
+    """
+    if request.param == "memory":
+        clock = FakeClock()
+        store = MemoryTokenStore(clock=clock)
+
+        async def advance(seconds: float) -> None:
+            clock.now += seconds
+    else:
+        store = RedisTokenStore(redis_cache)
+
+        async def advance(seconds: float) -> None:
+            await asyncio.sleep(seconds)
+    return store, advance
+
+
+def _user() -> str:
+    return f"{{{uuid.uuid4().hex[:8]}}}"
+
+
+def _entry(sid: str, access_key: str, refresh_key: str) -> str:
+    return json.dumps({"sid": sid, "access_key": access_key, "refresh_key": refresh_key})
+
+
+@pytest.mark.asyncio
+async def test_set_get_count_delete(backend):
+    store, _ = backend
+    user = _user()
+    await store.set_many({f"at:{user}:a": (42, 60), f"rt:{user}:a": ("42", 60)})
+
+    assert await store.get_many([f"at:{user}:a", f"at:{user}:missing", f"rt:{user}:a"]) == ["42", None, "42"]
+    assert await store.count([f"at:{user}:a", f"rt:{user}:a", f"rt:{user}:missing"]) == 2
+
+    await store.delete([f"at:{user}:a", f"at:{user}:missing"])
+    assert await store.get_many([f"at:{user}:a"]) == [None]
+    assert await store.count([f"rt:{user}:a"]) == 1
+
+
+@pytest.mark.asyncio
+async def test_keys_expire_after_their_ttl(backend):
+    store, advance = backend
+    user = _user()
+    await store.set_many({f"at:{user}:short": (1, 1), f"rt:{user}:long": (1, 60)})
+
+    await advance(1.2)
+    assert await store.get_many([f"at:{user}:short", f"rt:{user}:long"]) == [None, "1"]
+    assert await store.count([f"at:{user}:short"]) == 0
+
+
+@pytest.mark.asyncio
+async def test_get_with_ttl(backend):
+    store, _ = backend
+    user = _user()
+    await store.set_many({f"at:{user}:a": (42, 2)})
+
+    values, ttl = await store.get_with_ttl([f"at:{user}:a", f"at:{user}:legacy"])
+    assert values == ["42", None]
+    assert 0 < ttl <= 2
+    assert (await store.get_with_ttl([f"at:{user}:missing"]))[1] == -2
+
+
+@pytest.mark.asyncio
+async def test_slide_extends_only_a_running_out_key(backend):
+    store, advance = backend
+    user = _user()
+    await store.set_many({f"at:{user}:a": (42, 2), f"at:{user}:fresh": (7, 60)})
+
+    assert await store.slide([f"at:{user}:fresh"], 30, 60) == (["7"], False)
+    assert await store.slide([f"at:{user}:a", f"at:{user}:legacy"], 30, 60) == (["42", None], True)
+    assert await store.slide([f"at:{user}:a"], 30, 60) == (["42"], False)  # Already extended
+    assert await store.slide([f"at:{user}:missing"], 30, 60) == ([None], False)
+
+    await advance(2.2)
+    values, ttl = await store.get_with_ttl([f"at:{user}:a"])
+    assert values == ["42"] and ttl > 50
+    assert await store.count([f"at:{user}:missing"]) == 0
+
+
+@pytest.mark.asyncio
+async def test_session_index(backend):
+    store, _ = backend
+    user = _user()
+    key = f"user_sessions:{user}"
+    for sid in ("s1", "s2"):
+        await store.add_session(
+            key, sid, _entry(sid, f"at:{user}:{sid}", f"rt:{user}:{sid}"),
+            tokens={f"at:{user}:{sid}": (7, 60), f"rt:{user}:{sid}": (7, 120)}, ttl=120,
+        )
+
+    assert set(await store.get_sessions(key)) == {"s1", "s2"}
+    assert json.loads(await store.get_session(key, "s1"))["access_key"] == f"at:{user}:s1"
+    assert await store.get_session(key, "nope") is None
+
+    await store.remove_sessions(key, ["s1"], [f"at:{user}:s1", f"rt:{user}:s1"])
+    assert set(await store.get_sessions(key)) == {"s2"}
+    assert await store.count([f"at:{user}:s1", f"rt:{user}:s1", f"at:{user}:s2"]) == 1
+
+    await store.remove_sessions(key, ["s2"], [])
+    assert await store.get_sessions(key) == {}
+
+
+async def _rotate(store, user, sid, presented, new, token_epoch=0, new_entry=None, keep_presented=0):
+    return await store.rotate_refresh(
+        f"user_sessions:{user}", sid,
+        epoch_keys=[f"user_epoch:{user}"],
+        presented_keys=[f"rt:{user}:{presented}"],
+        access_key=f"at:{user}:{new}",
+        refresh_key=f"rt:{user}:{new}",
+        value=7, access_ttl=60, refresh_ttl=120,
+        token_epoch=token_epoch, new_entry=new_entry, channel="test_revocations",
+        keep_presented=keep_presented,
+    )
+
+
+@pytest.mark.asyncio
+async def test_rotation_and_reuse(backend):
+    store, _ = backend
+    user = _user()
+    await store.add_session(
+        f"user_sessions:{user}", "s", _entry("s", f"at:{user}:1", f"rt:{user}:1"),
+        tokens={f"at:{user}:1": (7, 60), f"rt:{user}:1": (7, 120)}, ttl=120,
+    )
+
+    assert await _rotate(store, user, "s", presented="1", new="2") == (REFRESH_OK, f"at:{user}:1")
+    assert await store.get_many([f"at:{user}:1", f"rt:{user}:1", f"at:{user}:2", f"rt:{user}:2"]) == [
+        None, None, "7", "7"]
+    assert json.loads(await store.get_session(f"user_sessions:{user}", "s"))["refresh_key"] == f"rt:{user}:2"
+
+    # The first refresh token again: the family is revoked
+    assert await _rotate(store, user, "s", presented="1", new="3") == (REFRESH_REUSED, f"at:{user}:2")
+    assert await store.count([f"at:{user}:2", f"rt:{user}:2", f"at:{user}:3"]) == 0
+    assert await store.get_sessions(f"user_sessions:{user}") == {}
+
+    assert (await _rotate(store, user, "s", presented="2", new="4"))[0] == REFRESH_TOKEN_MISSING
+
+
+@pytest.mark.asyncio
+async def test_rotation_can_keep_the_presented_token_for_a_while(backend):
+    store, _ = backend
+    user = _user()
+    await store.add_session(
+        f"user_sessions:{user}", "s", _entry("s", f"at:{user}:1", f"rt:{user}:1"),
+        tokens={f"at:{user}:1": (7, 60), f"rt:{user}:1": (7, 120)}, ttl=120,
+    )
+
+    assert (await _rotate(store, user, "s", presented="1", new="2", keep_presented=5))[0] == REFRESH_OK
+    values, ttl = await store.get_with_ttl([f"rt:{user}:1"])
+    assert values == ["7"] and 0 < ttl <= 5
+    assert (await _rotate(store, user, "s", presented="1", new="3", keep_presented=5))[0] == REFRESH_REUSED
+
+
+@pytest.mark.asyncio
+async def test_rotation_starts_a_family_and_checks_the_epoch(backend):
+    store, _ = backend
+    user = _user()
+    entry = _entry("s", f"at:{user}:2", f"rt:{user}:2")
+    assert (await _rotate(store, user, "s", presented="1", new="2", new_entry=entry))[0] == REFRESH_TOKEN_MISSING
+
+    await store.set_many({f"rt:{user}:1": (7, 120)})
+    assert await _rotate(store, user, "s", presented="1", new="2", new_entry=entry) == (REFRESH_OK, None)
+    assert set(await store.get_sessions(f"user_sessions:{user}")) == {"s"}
+
+    assert await store.bump_epoch([f"user_epoch:{user}"], 60) > 0
+    assert (await _rotate(store, user, "s", presented="2", new="3"))[0] == REFRESH_REVOKED
+    assert await store.count([f"rt:{user}:2"]) == 1
+
+
+@pytest.mark.asyncio
+async def test_bump_epoch_takes_the_max_of_all_keys(backend):
+    store, _ = backend
+    user = _user()
+    old_epoch = 10 ** 15  # Above the current time in ms
+    await store.set_many({f"user_epoch:{user}:old": (old_epoch, 60)})
+
+    assert await store.bump_epoch([f"user_epoch:{user}", f"user_epoch:{user}:old"], 60) == old_epoch + 1
+    assert await store.get_many([f"user_epoch:{user}"]) == [str(old_epoch + 1)]
+
+
+@pytest.mark.asyncio
+async def test_epoch_keeps_growing_after_its_key_expires(backend):
+    """
+    Tokens issued after a bump carry its epoch and outlive the key; the first
+    bump after the key expired must still be above that epoch.
+    """
+    store, advance = backend
+    user = _user()
+    key = f"user_epoch:{user}"
+    issued_epoch = await store.bump_epoch([key], 1)
+
+    await advance(1.2)
+    await asyncio.sleep(0.01)  # Epochs are in ms
+    assert await store.get_many([key]) == [None]
+
+    assert await store.bump_epoch([key], 1) > issued_epoch
+
+
+@pytest.mark.asyncio
+async def test_memory_store_frees_expired_keys():
+    clock = FakeClock()
+    store = MemoryTokenStore(clock=clock)
+    await store.set_many({f"at:{i}": (1, 10) for i in range(50)})
+    assert len(store) == 50
+
+    clock.now += 11
+    await store.set_many({"at:new": (1, 10)})
+    assert len(store) == 1
+
+
+def test_incomplete_backend_fails_at_instantiation():
+    class NoPublish(MemoryTokenStore):
+        publish = TokenStore.publish
+
+    with pytest.raises(TypeError):
+        NoPublish()
+
+
+@pytest.mark.asyncio
+async def test_only_the_configured_memory_store_is_measured():
+    configured = build_token_store(SimpleNamespace(TOKEN_STORE="memory"))
+    await configured.set_many({"at:a": (1, 60)})
+
+    MemoryTokenStore()  # E.g. a benchmark's own store
+
+    assert metrics.snapshot()["token_store.memory_keys"] == 1
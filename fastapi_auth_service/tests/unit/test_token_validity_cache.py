@@ -0,0 +1,57 @@
+"""
+Unit tests for the local token validity cache and the revocation filter.
+"""
+
+import uuid
+
+import pytest
+
+from fastapi_auth_service.app.services import token_cache
+from fastapi_auth_service.app.services.token_validity_cache import (
+    BloomFilter,
+    RotatingRevocationFilter,
+    TokenValidityCache,
+    user_revocation_item,
+)
+
+
+def test_bloom_filter_has_no_false_negatives_and_few_false_positives():
+    bloom = BloomFilter(capacity=1000, error_rate=0.01)
+    added = [f"at:{i}" for i in range(1000)]
+    for item in added:
+        bloom.add(item)
+
+    assert all(item in bloom for item in added)
+    false_positives = sum(f"other:{i}" in bloom for i in range(10000))
+    assert false_positives < 300
+
+
+def test_revoked_key_and_user_are_not_served_locally():
+    cache = TokenValidityCache(
+        max_size=10, ttl=60, revocations=RotatingRevocationFilter(1000, 0.01, rotate_after=900))
+    cache.remember("at:a")
+    cache.remember("at:b")
+    assert cache.is_valid("at:a", user_id=1)
+
+    cache.revoke(["at:a"])
+    assert not cache.is_valid("at:a", user_id=1)
+
+    cache.revoke([user_revocation_item(2)])
+    assert not cache.is_valid("at:b", user_id=2)
+
+
+@pytest.mark.asyncio
+async def test_validity_check_skips_redis_until_logout(monkeypatch):
+    token = f"l1-{uuid.uuid4().hex}"
+    await token_cache.store_access_token(token, 42)
+    assert await token_cache.is_access_token_valid(token, 42) is True
+
+    async def _no_redis(*args, **kwargs):
+        raise AssertionError("Redis must not be called")
+
+    monkeypatch.setattr(token_cache.token_store, "get_many", _no_redis)
+    assert await token_cache.is_access_token_valid(token, 42) is True
+    monkeypatch.undo()
+
+    await token_cache.delete_access_token(token, 42)
+    assert await token_cache.is_access_token_valid(token, 42) is False
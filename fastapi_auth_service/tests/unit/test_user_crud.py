@@ -73,6 +73,52 @@ async def test_get_user_by_id_not_found(async_session: AsyncSession):
     assert user is None
 
 
+@pytest.mark.asyncio
+async def test_prebuilt_statement_binds_each_call(async_session: AsyncSession):
+    """
+    The shared USER_BY_ID statement returns the user of each call's own id.
+    """
+    users = [
+        User(email=f"test_prebuilt_{uuid4().hex}@example.com", hashed_password="hashedpassword")
+        for _ in range(3)
+    ]
+    async_session.add_all(users)
+    await async_session.commit()
+
+    for user in reversed(users):
+        loaded = await user_crud.get_user_by_id(user.id, async_session)
+        assert loaded.email == user.email
+
+
+@pytest.mark.asyncio
+async def test_get_users_page_walks_the_full_listing(async_session: AsyncSession):
+    """
+    Keyset pages of a sort with duplicate values return every user of the
+    full listing exactly once and in the same order.
+    """
+    marker = f"Page{uuid4().hex[:8]}"
+    async_session.add_all(
+        User(email=f"test_page_{uuid4().hex}@example.com", hashed_password="hashedpassword",
+             first_name=marker, balance=i % 3)
+        for i in range(7)
+    )
+    await async_session.commit()
+
+    filters = {"first_name": marker}
+    expected = list(await user_crud.get_users_filtered_sorted(async_session, filters, "balance", "desc"))
+
+    seen, position = [], None
+    while True:
+        page, position = await user_crud.get_users_page(async_session, filters, "balance", "desc", 3, position)
+        seen.extend(page)
+        if position is None:
+            break
+    assert seen == expected
+
+    with pytest.raises(ValueError):
+        await user_crud.get_users_page(async_session, filters, "id", "asc", 3, {"sort": "balance:desc", "id": 1})
+
+
 @pytest.mark.asyncio
 async def test_get_balance_user_not_found(async_session: AsyncSession):
     """
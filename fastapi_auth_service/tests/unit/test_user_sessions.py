@@ -0,0 +1,86 @@
+"""
+Unit tests for the per-user session index.
+"""
+
+import time
+import uuid
+
+import pytest
+
+from fastapi_auth_service.app.services.token_cache import is_access_token_valid, is_refresh_token_valid
+from fastapi_auth_service.app.services.user_sessions import (
+    REFRESH_OK,
+    REFRESH_REUSED,
+    REFRESH_TOKEN_MISSING,
+    end_session,
+    list_sessions,
+    new_session_id,
+    revoke_all_sessions,
+    rotate_refresh_token,
+    start_session,
+)
+
+
+def _user_id() -> int:
+    return 700_000 + uuid.uuid4().int % 100_000
+
+
+@pytest.mark.asyncio
+async def test_sessions_are_listed_and_ended_one_by_one():
+    user_id = _user_id()
+    first, second = new_session_id(), new_session_id()
+    await start_session(user_id, first, f"a1-{first}", f"r1-{first}", ip="10.0.0.1", user_agent="curl")
+    await start_session(user_id, second, f"a2-{second}", f"r2-{second}")
+
+    sessions = await list_sessions(user_id)
+    assert {s["sid"] for s in sessions} == {first, second}
+    assert next(s for s in sessions if s["sid"] == first)["ip"] == "10.0.0.1"
+
+    assert await end_session(user_id, first) is True
+    assert await is_refresh_token_valid(f"r1-{first}", user_id) is False
+    assert await is_refresh_token_valid(f"r2-{second}", user_id) is True
+    assert [s["sid"] for s in await list_sessions(user_id)] == [second]
+    assert await end_session(user_id, first) is False
+
+
+@pytest.mark.asyncio
+async def test_revoke_all_sessions_deletes_refreshed_access_tokens():
+    """
+    A refresh points the session at the new access token, so revoking all sessions removes it too.
+    """
+    user_id = _user_id()
+    sid = new_session_id()
+    await start_session(user_id, sid, f"access-{sid}", f"refresh-{sid}")
+
+    result = await rotate_refresh_token(
+        user_id, sid, f"refresh-{sid}", 0, f"access2-{sid}", f"refresh2-{sid}", int(time.time()) + 60)
+    assert result == REFRESH_OK
+
+    assert await revoke_all_sessions(user_id) == 1
+    assert await is_access_token_valid(f"access2-{sid}", user_id) is False
+    assert await is_refresh_token_valid(f"refresh2-{sid}", user_id) is False
+    assert await list_sessions(user_id) == []
+
+
+@pytest.mark.asyncio
+async def test_rotation_replaces_the_pair_and_reuse_revokes_the_family():
+    user_id = _user_id()
+    sid = new_session_id()
+    expires_at = int(time.time()) + 60
+    await start_session(user_id, sid, f"a1-{sid}", f"r1-{sid}")
+
+    assert await rotate_refresh_token(user_id, sid, f"r1-{sid}", 0, f"a2-{sid}", f"r2-{sid}", expires_at) == REFRESH_OK
+    assert await is_access_token_valid(f"a1-{sid}", user_id) is False
+    assert await is_refresh_token_valid(f"r1-{sid}", user_id) is False
+    assert await is_access_token_valid(f"a2-{sid}", user_id) is True
+    session, = await list_sessions(user_id)
+    assert session["expires_at"] > expires_at  # the entry keeps the expiry of the login
+
+    # r1 is replayed: the current pair of the family is revoked too
+    assert await rotate_refresh_token(user_id, sid, f"r1-{sid}", 0, f"a3-{sid}", f"r3-{sid}", expires_at) == REFRESH_REUSED
+    assert await is_access_token_valid(f"a2-{sid}", user_id) is False
+    assert await is_refresh_token_valid(f"r2-{sid}", user_id) is False
+    assert await is_access_token_valid(f"a3-{sid}", user_id) is False
+    assert await list_sessions(user_id) == []
+    assert await rotate_refresh_token(
+        user_id, sid, f"r2-{sid}", 0, f"a4-{sid}", f"r4-{sid}", expires_at) == REFRESH_TOKEN_MISSING